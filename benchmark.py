@@ -0,0 +1,315 @@
+import os
+import sys
+import json
+import time
+import argparse
+import datetime
+import platform
+import tempfile
+import subprocess
+import numpy as np
+import pandas as pd
+import universe
+
+try:
+    import resource  # Windows 上没有，峰值内存记为 None
+except ImportError:
+    resource = None
+
+# ===========================
+# 1. 配置：合成数据 + 分阶段计时
+# ===========================
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULT_PATH = "./benchmark_results.json"
+
+# 各股票的时间窗口取股票池 (universe.csv) 的事件窗口；行情往前多留 60 天给事件研究估计窗口
+WINDOWS = {code: (conf['window_start'], conf['window_end'])
+           for code, conf in universe.select(need=['window_start', 'window_end']).items()}
+MARKET_LEAD_DAYS = 60
+
+# 股吧 : B站 行数比例 (B站视频远少于帖子)
+BILI_RATIO = 0.05
+
+# 标题片段：随机拼三段，重复率和真实股吧差不多 (有大量“一模一样”的水帖)
+HEADS = ['赛力斯', '问界', '华为', '小米', 'su7', '雷军', '九阳', '哈基米', '主力', '散户', '大盘', '今天',
+         '明天', '这票', '老铁们', '遥遥领先', '北向', '机构', '游资', '股友']
+BODIES = ['又涨停了', '跌麻了', '要起飞', '割肉了', '加仓', '满仓干', '明天高开', '出货了吗', '还能上车吗',
+          '稳住别慌', '利好出尽', '业绩炸裂', '订单爆了', '被套牢了', '做T成功', '走势很强', '洗盘而已',
+          '量能不够', '等回调', '冲冲冲']
+TAILS = ['', '', '！', '？', '。', '哈哈哈', '，懂的都懂', '，大家怎么看', '…', '!!!', '，稳了', '，吓死我了']
+
+STAGES = ['nlp', 'bili_clean', 'bilibili_nlp', 'processing', 'visualize']
+
+
+# ===========================
+# 2. 合成数据生成 (全部向量化，千万行也只要几十秒)
+# ===========================
+def _titles(rng, n):
+    h = np.asarray(HEADS)[rng.integers(0, len(HEADS), n)]
+    b = np.asarray(BODIES)[rng.integers(0, len(BODIES), n)]
+    t = np.asarray(TAILS)[rng.integers(0, len(TAILS), n)]
+    return np.char.add(np.char.add(h, b), t)
+
+
+def _dates(rng, n, start, end):
+    days = pd.date_range(start, end, freq='D')
+    # 越靠近窗口中段越热，模拟事件发酵
+    weights = np.exp(-((np.arange(len(days)) - len(days) / 2) / (len(days) / 4)) ** 2)
+    return days[rng.choice(len(days), n, p=weights / weights.sum())]
+
+
+def make_guba(rng, n, start, end):
+    """与 raw_601127.csv 同结构：date / title / read_count，按日期倒序 (和爬虫翻页顺序一致)"""
+    df = pd.DataFrame({
+        'date': _dates(rng, n, start, end).strftime('%Y-%m-%d'),
+        'title': _titles(rng, n),
+        'read_count': rng.lognormal(6, 1.2, n).astype(np.int64)
+    })
+    return df.sort_values('date', ascending=False, kind='stable')
+
+
+def _bili_count(values):
+    """数字转成 B站展示格式 ('103.5万' / '1.2亿' / '9876')"""
+    out = values.astype(str).astype(object)
+    wan = (values >= 10000) & (values < 100000000)
+    yi = values >= 100000000
+    out[wan] = [f"{v / 10000:.1f}万" for v in values[wan]]
+    out[yi] = [f"{v / 100000000:.1f}亿" for v in values[yi]]
+    return out
+
+
+def make_bili(rng, n, start, end):
+    """与 bili_raw_xxxx.csv 同结构，日期混合 'Y-M-D' / 'Y年M月D日' / 'M-D' / '昨天' / 'x小时前'"""
+    dates = _dates(rng, n, start, end)
+    raw_date = np.asarray([f"{d.year}-{d.month}-{d.day}" for d in dates], dtype=object)
+    kind = rng.random(n)
+    cn = kind < 0.2
+    raw_date[cn] = [f"{d.year}年{d.month}月{d.day}日" for d in dates[cn]]
+    raw_date[(kind >= 0.2) & (kind < 0.3)] = [f"{d.month}-{d.day}" for d in dates[(kind >= 0.2) & (kind < 0.3)]]
+    raw_date[(kind >= 0.3) & (kind < 0.32)] = '昨天'
+    raw_date[(kind >= 0.32) & (kind < 0.34)] = '3小时前'
+
+    views = rng.lognormal(10, 2, n).astype(np.int64)
+    return pd.DataFrame({
+        'raw_date': raw_date,
+        'title': _titles(rng, n),
+        'raw_views': _bili_count(views),
+        'raw_danmaku': _bili_count((views * rng.uniform(0.001, 0.02, n)).astype(np.int64)),
+        'keyword': 'benchmark'
+    })
+
+
+def make_market(rng, start, end):
+    """与 get_market_data 输出同结构：日线 + bench_ret + 简单 AR/CAR"""
+    days = pd.bdate_range(pd.Timestamp(start) - pd.Timedelta(days=MARKET_LEAD_DAYS), end)
+    bench = rng.normal(0, 0.01, len(days))
+    pct = 0.0005 + rng.uniform(0.6, 1.4) * bench + rng.normal(0, 0.02, len(days))
+    close = 10 * np.cumprod(1 + pct)
+    df = pd.DataFrame({
+        'date': days, 'open': close * (1 - pct / 2), 'high': close * 1.01, 'low': close * 0.99,
+        'close': close, 'volume': rng.integers(10 ** 5, 10 ** 7, len(days)).astype(float),
+        'pctChg': pct, 'bench_ret': bench
+    })
+    df['AR'] = df['pctChg'] - df['bench_ret']
+    df['CAR'] = df['AR'].cumsum()
+    return df
+
+
+def generate(workdir, rows, seed=0):
+    """在 workdir 下生成 raw_data_lake/ 与 real_data/ (行数按股票平均分)，返回各阶段输入行数"""
+    rng = np.random.default_rng(seed)
+    raw_dir = os.path.join(workdir, "raw_data_lake")
+    real_dir = os.path.join(workdir, "real_data")
+    for d in (raw_dir, real_dir):
+        if not os.path.exists(d): os.makedirs(d)
+
+    counts = {'guba': 0, 'bili': 0, 'market': 0}
+    per_code = max(rows // len(WINDOWS), 1)
+    for code, (start, end) in WINDOWS.items():
+        guba = make_guba(rng, per_code, start, end)
+        guba.to_csv(f"{raw_dir}/raw_{code}.csv", index=False, encoding='utf-8-sig')
+        bili = make_bili(rng, max(int(per_code * BILI_RATIO), 1), start, end)
+        bili.to_csv(f"{raw_dir}/bili_raw_{code}.csv", index=False, encoding='utf-8-sig')
+        market = make_market(rng, start, end)
+        market.to_csv(f"{real_dir}/market_{code}.csv", index=False)
+
+        counts['guba'] += len(guba)
+        counts['bili'] += len(bili)
+        counts['market'] += len(market)
+    return counts
+
+
+# ===========================
+# 3. 各阶段 (在子进程里跑，cwd 为合成数据目录)
+# ===========================
+def _stage_nlp():
+    import nlp
+    nlp.process_nlp()
+
+
+def _stage_bili_clean():
+    from script_loader import load_script
+    bili = load_script('bilibili_nlp')
+    for code in WINDOWS:
+        df = pd.read_csv(f"./raw_data_lake/bili_raw_{code}.csv")
+        df['raw_date'].apply(bili.clean_date)
+        df['raw_views'].apply(bili.clean_count)
+        df['raw_danmaku'].apply(bili.clean_count)
+
+
+def _stage_bilibili_nlp():
+    from script_loader import load_script
+    load_script('bilibili_nlp').main()
+
+
+def _stage_processing():
+    import processing
+    processing.process_final()
+
+
+def _stage_visualize():
+    # 基准要测真实出图耗时，忽略出图缓存
+    from script_loader import load_script
+    load_script('visualize').main(force=True)
+
+
+STAGE_FUNCS = {
+    'nlp': _stage_nlp,
+    'bili_clean': _stage_bili_clean,
+    'bilibili_nlp': _stage_bilibili_nlp,
+    'processing': _stage_processing,
+    'visualize': _stage_visualize,
+}
+
+# 每个阶段的吞吐量按哪类输入行数算
+STAGE_ROWS = {'nlp': 'guba', 'bili_clean': 'bili', 'bilibili_nlp': 'bili', 'processing': 'market',
+              'visualize': 'market'}
+
+
+def _peak_rss_mb():
+    """本进程与已回收子进程 (情感打分进程池) 的峰值常驻内存"""
+    if resource is None: return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # Linux 单位是 KB，macOS 是字节
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_stage(name, out_path):
+    """子进程入口：跑一个阶段，把耗时和峰值内存写到 out_path"""
+    sys.path.insert(0, BASE_DIR)
+    import instrument
+    # 埋点 trace 写到合成数据目录的 perf_traces/ 下
+    instrument.setup(f"bench_{name}")
+
+    error = None
+    start = time.perf_counter()
+    try:
+        with instrument.stage(name):
+            STAGE_FUNCS[name]()
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    wall = time.perf_counter() - start
+    with open(out_path, 'w', encoding='utf-8') as f:
+        json.dump({'wall_sec': wall, 'peak_rss_mb': _peak_rss_mb(), 'error': error}, f)
+
+
+# ===========================
+# 4. 主控：生成数据 -> 逐阶段起子进程 -> 写结果
+# ===========================
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except:
+        return None
+
+
+def run_benchmark(rows, stages=STAGES, workdir=None, seed=0, out=RESULT_PATH, quiet=True):
+    workdir = workdir or tempfile.mkdtemp(prefix="bench_")
+    print(f"🧪 生成合成数据: {rows} 行 -> {workdir}")
+    start = time.perf_counter()
+    counts = generate(workdir, rows, seed)
+    print(f"   ✅ 股吧 {counts['guba']} 行, B站 {counts['bili']} 行, 行情 {counts['market']} 天 "
+          f"({time.perf_counter() - start:.1f} 秒)")
+
+    results = []
+    env = dict(os.environ, MPLBACKEND='Agg')
+    for name in stages:
+        print(f"⏱️ 阶段 {name} ...")
+        fd, stat_path = tempfile.mkstemp(suffix=".json")
+        os.close(fd)
+        subprocess.run([sys.executable, os.path.abspath(__file__), '_stage', name, stat_path], cwd=workdir,
+                       env=env, stdout=subprocess.DEVNULL if quiet else None)
+        try:
+            with open(stat_path, encoding='utf-8') as f:
+                stat = json.load(f)
+        except:
+            stat = {'wall_sec': None, 'peak_rss_mb': None, 'error': '子进程异常退出'}
+        os.remove(stat_path)
+
+        n = counts[STAGE_ROWS[name]]
+        stat.update({'stage': name, 'rows': n,
+                     'rows_per_sec': n / stat['wall_sec'] if stat['wall_sec'] else None})
+        results.append(stat)
+
+        if stat['error']:
+            print(f"   ❌ {stat['error']}")
+        else:
+            rss = f"{stat['peak_rss_mb']:.0f} MB" if stat['peak_rss_mb'] is not None else "n/a"
+            print(f"   ✅ {stat['wall_sec']:.2f} 秒 | {stat['rows_per_sec']:.0f} 行/秒 | 峰值内存 {rss}")
+
+    report = {
+        'commit': _git_commit(),
+        'time': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'rows': rows, 'seed': seed, 'inputs': counts,
+        'stages': results
+    }
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=1)
+    print(f"\n📄 结果已写入 {out}")
+    return report
+
+
+def compare(old_path, new_path):
+    """对比两次结果 (例如两个 commit)，打印每个阶段的加速比"""
+    with open(old_path, encoding='utf-8') as f: old = json.load(f)
+    with open(new_path, encoding='utf-8') as f: new = json.load(f)
+    print(f"📊 {old['commit']} ({old['rows']} 行) -> {new['commit']} ({new['rows']} 行)")
+    before = {s['stage']: s for s in old['stages']}
+    for s in new['stages']:
+        o = before.get(s['stage'])
+        if not o or not o['wall_sec'] or not s['wall_sec']:
+            print(f"   {s['stage']:<14} 无可比数据")
+            continue
+        print(f"   {s['stage']:<14} {o['wall_sec']:8.2f}s -> {s['wall_sec']:8.2f}s  x{o['wall_sec'] / s['wall_sec']:.2f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '_stage':
+        run_stage(sys.argv[2], sys.argv[3])
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser(description="全流程性能基准：合成数据 + 分阶段计时")
+    sub = parser.add_subparsers(dest='cmd')
+    run = sub.add_parser('run', help="生成数据并计时")
+    run.add_argument('--rows', type=int, default=10000, help="股吧总行数 (10k ~ 10M)")
+    run.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES)
+    run.add_argument('--workdir', default=None, help="合成数据目录 (默认临时目录；复用时 NLP 缓存是热的)")
+    run.add_argument('--seed', type=int, default=0)
+    run.add_argument('--out', default=RESULT_PATH)
+    run.add_argument('--verbose', action='store_true', help="显示各阶段自身的输出")
+    cmp_parser = sub.add_parser('compare', help="对比两次结果")
+    cmp_parser.add_argument('old')
+    cmp_parser.add_argument('new')
+    args = parser.parse_args()
+
+    if args.cmd == 'compare':
+        compare(args.old, args.new)
+    elif args.cmd == 'run':
+        run_benchmark(args.rows, args.stages, args.workdir, args.seed, args.out, quiet=not args.verbose)
+    else:
+        parser.print_help()
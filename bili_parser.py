@@ -0,0 +1,97 @@
+from bs4 import BeautifulSoup
+import instrument
+import fast_html
+from fast_html import has_class, xpath
+
+# ===========================
+# B站搜索结果页解析 (纯函数，输出与 bilibili_crawl 原逻辑逐字段一致)
+# ===========================
+# 预编译的 XPath：与 BeautifulSoup 版的 CSS 选择器逐条对应 (select 只匹配后代，不含自身)
+CARDS = xpath(f"//*[{has_class('bili-video-card')}]")  # soup.select('.bili-video-card')
+CARDS_OLD = xpath(f"//*[{has_class('video-item')}]")  # 旧版类名 .video-item
+TITLE = xpath(".//h3")
+HEADLINE = xpath(f".//*[{has_class('headline')}]")
+DATE = xpath(f".//*[{has_class('bili-video-card__info--date')}]")
+TIME = xpath(f".//*[{has_class('time')}]")
+STATS = xpath(f".//*[{has_class('bili-video-card__stats--item')}]")
+
+# 'lxml' / 'bs4'；None 表示有 lxml 就用 lxml
+BACKEND = None
+
+
+def parse_bili_cards(html, keyword, backend=None):
+    """把一页搜索结果 HTML 解析成 [{'raw_date', 'title', 'raw_views', 'raw_danmaku', 'keyword'}, ...]"""
+    backend = backend or BACKEND or ('lxml' if fast_html.HAS_LXML else 'bs4')
+    with instrument.timer('bili.parse'):
+        rows = None
+        if backend == 'lxml':
+            try:
+                rows = _parse_lxml(html, keyword)
+            except Exception:
+                instrument.count('bili.parse_fallback')
+        if rows is None:
+            rows = _parse_soup(html, keyword)
+    instrument.observe('bili.cards_per_page', len(rows))
+    return rows
+
+
+def _row(title, date_str, stats, keyword):
+    return {
+        'raw_date': date_str.replace('·', '').strip(),
+        'title': title,
+        'raw_views': stats[0] if len(stats) >= 1 else "0",
+        'raw_danmaku': stats[1] if len(stats) >= 2 else "0",
+        'keyword': keyword
+    }
+
+
+def _first(card, *queries):
+    for q in queries:
+        found = q(card)
+        if found: return found[0]
+    return None
+
+
+def _parse_lxml(html, keyword):
+    root = fast_html.parse_document(html)
+    cards = CARDS(root)
+    if not cards: cards = CARDS_OLD(root)
+
+    rows = []
+    for card in cards:
+        title_tag = _first(card, TITLE, HEADLINE)
+        date_tag = _first(card, DATE, TIME)
+        rows.append(_row(
+            fast_html.stripped_text(title_tag) if title_tag is not None else "",
+            fast_html.stripped_text(date_tag) if date_tag is not None else "",
+            [fast_html.stripped_text(s) for s in STATS(card)[:2]],
+            keyword
+        ))
+    return rows
+
+
+def _parse_soup(html, keyword):
+    soup = BeautifulSoup(html, 'html.parser')
+
+    # 兼容新旧版B站类名
+    cards = soup.select('.bili-video-card')
+    if not cards: cards = soup.select('.video-item')
+
+    rows = []
+    for card in cards:
+        try:
+            # 标题
+            title_tag = card.select_one('h3') or card.select_one('.headline')
+            title = title_tag.get_text(strip=True) if title_tag else ""
+
+            # 日期
+            date_tag = card.select_one('.bili-video-card__info--date') or card.select_one('.time')
+            date_str = date_tag.get_text(strip=True) if date_tag else ""
+
+            # 数据 (播放/弹幕)
+            stats = [s.get_text(strip=True) for s in card.select('.bili-video-card__stats--item')[:2]]
+
+            rows.append(_row(title, date_str, stats, keyword))
+        except:
+            continue
+    return rows
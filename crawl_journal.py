@@ -0,0 +1,126 @@
+import os
+import json
+import threading
+import instrument
+
+# ===========================
+# 断点续爬：逐页日志 + 清单
+# ===========================
+# 每抓完一页就把解析结果追加进 pages.jsonl，崩溃后重跑只补缺页/失败页
+JOURNAL_DIR = "./raw_data_lake/journal"
+
+DONE, EMPTY, FAILED = 'done', 'empty', 'failed'
+
+
+class CrawlJournal:
+    def __init__(self, code, root=JOURNAL_DIR):
+        self.code = code
+        self.folder = os.path.join(root, str(code))
+        if not os.path.exists(self.folder): os.makedirs(self.folder)
+
+        self.journal_path = os.path.join(self.folder, "pages.jsonl")
+        self.manifest_path = os.path.join(self.folder, "manifest.json")
+        self.lock = threading.Lock()
+
+        # page -> (status, rows)，以日志里最后一次记录为准
+        self.pages = {}
+        self._replay()
+
+    def _replay(self):
+        if not os.path.exists(self.journal_path): return
+
+        with open(self.journal_path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except:
+                    # 崩溃时写了一半的最后一行，直接丢弃
+                    continue
+                self.pages[rec['page']] = (rec['status'], rec['rows'])
+
+    def record(self, page, rows):
+        """rows 为 None 表示该页失败；空列表表示页面正常但没有帖子"""
+        if rows is None:
+            status, rows = FAILED, []
+        else:
+            status = DONE if rows else EMPTY
+        instrument.count(f"pages.{status}")
+
+        line = json.dumps({'page': page, 'status': status, 'rows': rows}, ensure_ascii=False)
+        with self.lock:
+            with open(self.journal_path, 'a', encoding='utf-8') as f:
+                f.write(line + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self.pages[page] = (status, rows)
+            self._write_manifest()
+
+    def _write_manifest(self):
+        manifest = {s: sorted(p for p, (st, _) in self.pages.items() if st == s) for s in (DONE, EMPTY, FAILED)}
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        # 原子替换，避免清单写一半
+        os.replace(tmp, self.manifest_path)
+
+    def pending(self, pages):
+        """
+        返回还需要抓的页：从没抓过的 + 上次失败的 + 上次是空页的
+        (传进来的都是定位区间内的页，正常不会是空的，空页多半是拦截/限流页，不能当成抓完了)
+        """
+        return [p for p in pages if self.pages.get(p, (FAILED, None))[0] != DONE]
+
+    def rows(self, start_page, end_page):
+        """按页码顺序从日志重建该区间的全部行"""
+        out = []
+        for p in range(start_page, end_page + 1):
+            if p in self.pages: out.extend(self.pages[p][1])
+        return out
+
+    def rows_by_page(self, start_page, end_page):
+        """同上，但按页分组 [[行, ...], ...] (没抓到的页是空列表)"""
+        return [self.pages[p][1] if p in self.pages else [] for p in range(start_page, end_page + 1)]
+
+    def remap(self, shift):
+        """
+        页码整体挪了 shift 页 (新帖把老帖往后挤)：完成的页按偏移换成新页码，空页/失败页丢掉 (重跑会补)
+        偏移只准到一页以内，每段连续完成页的首尾两个新页码可能只覆盖了一部分：
+        首尾页的行并进相邻的内侧页，首尾页码空出来重抓 (不到 3 页的段整段重抓；多出来的重复帖由去重去掉)
+        返回保留的页数
+        """
+        with self.lock:
+            done = sorted(p for p, (st, _) in self.pages.items() if st == DONE)
+            runs = []
+            for p in done:
+                if runs and p == runs[-1][-1] + 1: runs[-1].append(p)
+                else: runs.append([p])
+
+            pages = {}
+            for run in runs:
+                if len(run) < 3: continue
+                for p in run[1:-1]: pages[p + shift] = list(self.pages[p][1])
+                pages[run[1] + shift] = self.pages[run[0]][1] + pages[run[1] + shift]
+                pages[run[-2] + shift] = pages[run[-2] + shift] + self.pages[run[-1]][1]
+            self.pages = {p: (DONE, rows) for p, rows in pages.items()}
+
+            tmp = self.journal_path + ".tmp"
+            with open(tmp, 'w', encoding='utf-8') as f:
+                for page, (status, rows) in self.pages.items():
+                    f.write(json.dumps({'page': page, 'status': status, 'rows': rows}, ensure_ascii=False) + "\n")
+            os.replace(tmp, self.journal_path)
+            self._write_manifest()
+        return len(self.pages)
+
+    def reset(self):
+        """清空日志 (页码整体挪动过，旧记录对不上新页码了)"""
+        with self.lock:
+            for path in (self.journal_path, self.manifest_path):
+                if os.path.exists(path): os.remove(path)
+            self.pages = {}
+
+    def summary(self, start_page, end_page):
+        counts = {DONE: 0, EMPTY: 0, FAILED: 0, 'missing': 0}
+        for p in range(start_page, end_page + 1):
+            counts[self.pages[p][0] if p in self.pages else 'missing'] += 1
+        return (f"完成 {counts[DONE]} 页 | 空页 {counts[EMPTY]} | 失败 {counts[FAILED]}"
+                f" | 未抓 {counts['missing']}")
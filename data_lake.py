@@ -0,0 +1,230 @@
+import os
+import sys
+import glob
+import shutil
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# ===========================
+# 1. 配置：列式数据湖 (Parquet，按股票代码 + 月份分区)
+# ===========================
+LAKE_DIR = "./data_lake"
+RAW_DIR = "./raw_data_lake"
+REAL_DIR = "./real_data"
+
+TS = pa.timestamp('ms')
+TITLE = pa.dictionary(pa.int32(), pa.string())  # 标题重复多，字典编码省空间
+
+# 每个数据集的强类型 schema (date 一律为分区外的普通列)；不在 schema 里的列 (如 final 的 kw_*) 按推断类型原样带上
+SCHEMAS = {
+    'raw': pa.schema([('date', TS), ('title', TITLE), ('read_count', pa.int64())]),
+    'sentiment': pa.schema([('date', TS), ('sentiment', pa.float32()), ('read_count', pa.int64()),
+                            ('weighted_score_raw', pa.float64()), ('weighted_score', pa.float32()),
+                            ('n', pa.int64())]),
+    'bilibili': pa.schema([('date', TS), ('bili_buzz', pa.int64()), ('sentiment', pa.float32()),
+                           ('video_num', pa.int64())]),
+    'market': pa.schema([('date', TS), ('open', pa.float64()), ('high', pa.float64()), ('low', pa.float64()),
+                         ('close', pa.float64()), ('volume', pa.float64()), ('pctChg', pa.float64()),
+                         ('bench_ret', pa.float64()), ('AR', pa.float64()), ('CAR', pa.float64())]),
+    'final': pa.schema([('date', TS), ('open', pa.float64()), ('high', pa.float64()), ('low', pa.float64()),
+                        ('close', pa.float64()), ('volume', pa.float64()), ('pctChg', pa.float64()),
+                        ('bench_ret', pa.float64()), ('AR', pa.float64()), ('CAR', pa.float64()),
+                        ('total_buzz', pa.float64()), ('guba_buzz', pa.float64()), ('bili_buzz', pa.float64()),
+                        ('cum_factor', pa.float64()), ('meme_heat', pa.float32())]),
+}
+
+# 目录结构 {dataset}/code={code}/month=YYYY-MM/；每只股票单独读写，code 从路径拼 (不让 '01810' 被推断成整数 1810)
+# 股票目录内部只按月分区，分区字段显式声明为字符串
+MONTHS = ds.partitioning(pa.schema([('month', pa.string())]), flavor='hive')
+
+# 旧 CSV -> 数据集 的对应关系 (用于一次性迁移)
+CSV_SOURCES = {
+    'raw': f"{RAW_DIR}/raw_*.csv",
+    'sentiment': f"{REAL_DIR}/sentiment_*.csv",
+    'bilibili': f"{REAL_DIR}/bilibili_*.csv",
+    'market': f"{REAL_DIR}/market_*.csv",
+    'final': f"{REAL_DIR}/final_*.csv",
+}
+
+
+# ===========================
+# 2. 类型规整
+# ===========================
+def _to_table(df, dataset):
+    """按 schema 把 DataFrame 转成 Arrow 表：日期显式解析、整数/浮点/字典列强转，缺列补空；多出来的列数值按 float64、其余按字符串"""
+    schema = SCHEMAS[dataset]
+    if 'date' in df.columns:
+        df = df.copy()
+    else:
+        # 日度表的日期在索引里
+        df = df.reset_index()
+        df = df.rename(columns={df.columns[0]: 'date'})
+
+    df['date'] = pd.to_datetime(df['date'], format='ISO8601', errors='coerce')
+    bad = df['date'].isna().sum()
+    if bad: print(f"   ⚠️ [{dataset}] 丢弃 {bad} 行无效日期")
+    df = df.dropna(subset=['date'])
+
+    cols = {}
+    for field in schema:
+        if field.name == 'date':
+            cols['date'] = df['date']
+        elif field.name not in df.columns:
+            cols[field.name] = pd.Series([None] * len(df), index=df.index, dtype=object)
+        elif pa.types.is_dictionary(field.type):
+            cols[field.name] = df[field.name].astype(str).where(df[field.name].notna(), None)
+        elif pa.types.is_integer(field.type):
+            cols[field.name] = pd.to_numeric(df[field.name], errors='coerce').round().astype('Int64')
+        else:
+            cols[field.name] = pd.to_numeric(df[field.name], errors='coerce')
+
+    for name in df.columns:
+        if name in cols or name in ('code', 'month'): continue
+        if pd.api.types.is_numeric_dtype(df[name]) or pd.api.types.is_bool_dtype(df[name]):
+            cols[name] = pd.to_numeric(df[name], errors='coerce').astype('float64')
+            schema = schema.append(pa.field(str(name), pa.float64()))
+        else:
+            cols[name] = df[name].astype(str).where(df[name].notna(), None)
+            schema = schema.append(pa.field(str(name), pa.string()))
+
+    return pa.Table.from_pandas(pd.DataFrame(cols), schema=schema, preserve_index=False)
+
+
+def _code_schema(dataset, code, root=LAKE_DIR):
+    """某只股票实际落盘的 schema = 固定 schema + 各月文件里多出来的列"""
+    files = glob.glob(os.path.join(root, dataset, f"code={code}", "month=*", "*.parquet"))
+    return pa.unify_schemas([SCHEMAS[dataset]] + [pq.read_schema(f) for f in files])
+
+
+# ===========================
+# 3. 读写接口
+# ===========================
+def save_frame(df, dataset, code, root=LAKE_DIR):
+    """
+    整只股票覆盖写入：先在临时目录按月份分区写好 Parquet，再换下旧目录
+    (临时目录以 . 开头，读的时候会被忽略；写到一半崩了旧数据还在)
+    """
+    table = _to_table(df, dataset)
+    months = pa.array(pd.DatetimeIndex(table.column('date').to_pandas()).strftime('%Y-%m'), pa.string())
+    table = table.append_column('month', months)
+
+    base = os.path.join(root, dataset)
+    code_dir = os.path.join(base, f"code={code}")
+    tmp_dir = os.path.join(base, f".tmp-code={code}-{os.getpid()}")
+    old_dir = os.path.join(base, f".old-code={code}-{os.getpid()}")
+    if os.path.exists(tmp_dir): shutil.rmtree(tmp_dir)
+
+    ds.write_dataset(table, tmp_dir, format='parquet', partitioning=MONTHS,
+                     existing_data_behavior='overwrite_or_ignore',
+                     basename_template='part-{i}.parquet')
+    if os.path.exists(code_dir): os.replace(code_dir, old_dir)
+    os.replace(tmp_dir, code_dir)
+    if os.path.exists(old_dir): shutil.rmtree(old_dir)
+    return len(table)
+
+
+def upsert_frame(df, dataset, code, root=LAKE_DIR):
+    """
+    只改写 df 涉及的月份分区：读出该月旧数据，同日期的行用 df 覆盖后整月重写
+    (实时监控每轮只动当月一个分区，开销与历史长短无关)
+    """
+    table = _to_table(df, dataset)
+    schema = pa.unify_schemas([_code_schema(dataset, code, root), table.schema])
+    new = table.to_pandas()
+    for month, part in new.groupby(new['date'].dt.strftime('%Y-%m')):
+        month_dir = os.path.join(root, dataset, f"code={code}", f"month={month}")
+        if os.path.exists(month_dir):
+            old = ds.dataset(month_dir, format='parquet', schema=schema).to_table().to_pandas()
+            part = pd.concat([old[~old['date'].isin(part['date'])], part]).sort_values('date', kind='stable')
+        else:
+            os.makedirs(month_dir)
+        # 先写临时文件再替换，中途被打断也不会丢掉整个月
+        tmp = os.path.join(month_dir, 'part-0.parquet.tmp')
+        part = part.reindex(columns=schema.names)
+        pq.write_table(pa.Table.from_pandas(part, schema=schema, preserve_index=False), tmp)
+        for name in os.listdir(month_dir):
+            if name.endswith('.parquet'): os.remove(os.path.join(month_dir, name))
+        os.replace(tmp, os.path.join(month_dir, 'part-0.parquet'))
+    return len(new)
+
+
+def has_frame(dataset, code, root=LAKE_DIR):
+    return os.path.exists(os.path.join(root, dataset, f"code={code}"))
+
+
+def load_frame(dataset, code, columns=None, start=None, end=None, root=LAKE_DIR):
+    """
+    读取某只股票的数据，返回以 date 为索引的 DataFrame
+    - columns: 只读需要的列 (列裁剪)
+    - start/end: 日期窗口，按月分区剪枝 + 行组谓词下推
+    """
+    schema = _code_schema(dataset, code, root)
+    dataset_obj = ds.dataset(os.path.join(root, dataset, f"code={code}"), format='parquet', partitioning=MONTHS,
+                             schema=schema.append(pa.field('month', pa.string())))
+
+    flt = ds.scalar(True)
+    if start is not None:
+        start = pd.Timestamp(start)
+        flt &= (ds.field('month') >= start.strftime('%Y-%m')) & (ds.field('date') >= pa.scalar(start, TS))
+    if end is not None:
+        end = pd.Timestamp(end)
+        flt &= (ds.field('month') <= end.strftime('%Y-%m')) & (ds.field('date') <= pa.scalar(end, TS))
+
+    # 与 CSV 回退一致：要的列这只股票没有就跳过
+    cols = ['date'] + [c for c in (columns or schema.names) if c != 'date' and c in schema.names]
+    df = dataset_obj.to_table(columns=cols, filter=flt).to_pandas()
+    return df.set_index('date').sort_index(kind='stable')
+
+
+def frame_mtime(dataset, code, root=LAKE_DIR):
+    """某只股票数据最后一次落盘的时间 (各月 Parquet 文件里最新的)，没有则为 None"""
+    files = glob.glob(os.path.join(root, dataset, f"code={code}", "month=*", "*.parquet"))
+    return max(os.path.getmtime(f) for f in files) if files else None
+
+
+def stage_exists(dataset, code, csv_path):
+    return has_frame(dataset, code) or os.path.exists(csv_path)
+
+
+def read_stage(dataset, code, csv_path, columns=None, start=None, end=None):
+    """
+    优先读数据湖；还没迁移的老数据回退到 CSV (保持旧流程可用)
+    写数据湖的脚本都是先写 CSV 再写湖，所以 CSV 反而更新时，说明后来有只写 CSV 的脚本 (如 get_sentiment_data) 覆盖过，读 CSV
+    """
+    lake_time = frame_mtime(dataset, code)
+    if lake_time is not None:
+        if not (os.path.exists(csv_path) and os.path.getmtime(csv_path) > lake_time):
+            return load_frame(dataset, code, columns=columns, start=start, end=end)
+        print(f"   ⚠️ [{dataset}] {csv_path} 比数据湖里的 code={code} 新，改读 CSV")
+
+    df = pd.read_csv(csv_path, index_col=0)
+    df.index = pd.to_datetime(df.index, errors='coerce')
+    df = df[df.index.notna()].sort_index()
+    if start is not None: df = df[df.index >= pd.Timestamp(start)]
+    if end is not None: df = df[df.index <= pd.Timestamp(end)]
+    if columns is not None: df = df[[c for c in columns if c in df.columns]]
+    return df
+
+
+# ===========================
+# 4. 旧 CSV 一次性迁移
+# ===========================
+def convert_csvs(root=LAKE_DIR):
+    print("🚀 迁移 CSV -> Parquet 数据湖...")
+    for dataset, pattern in CSV_SOURCES.items():
+        prefix = os.path.basename(pattern).split('*')[0]
+        for path in sorted(glob.glob(pattern)):
+            code = os.path.basename(path)[len(prefix):-len('.csv')]
+            df = pd.read_csv(path, dtype={'title': str})
+            n = save_frame(df, dataset, code, root=root)
+            print(f"   ✅ {path} -> {dataset}/code={code} ({n} 行)")
+    print("🎉 迁移完成！")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == 'convert':
+        convert_csvs()
+    else:
+        print("用法: python data_lake.py convert")
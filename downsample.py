@@ -0,0 +1,70 @@
+import numpy as np
+
+# ===========================
+# 长时间序列降采样 (画图用，保留形状：峰、谷、拐点都还在)
+# ===========================
+# lttb: Largest-Triangle-Three-Buckets，折线观感最接近原图
+# minmax: 每个桶保留最低点和最高点，尖峰一个都不丢，适合分钟级 / 多年日线
+METHODS = ('lttb', 'minmax')
+
+
+def _fill(y):
+    """只用于挑点：NaN 用均值顶上，不影响原数据"""
+    y = np.asarray(y, dtype=float)
+    if np.isnan(y).any():
+        y = np.where(np.isnan(y), np.nanmean(y) if (~np.isnan(y)).any() else 0.0, y)
+    return y
+
+
+def lttb_indices(y, n_out):
+    """LTTB 降采样：返回选中点的下标 (含首尾两点)，x 按等间距 (交易日序号) 处理"""
+    y = _fill(y)
+    n = len(y)
+    if n_out >= n or n_out < 3: return np.arange(n)
+
+    x = np.arange(n, dtype=float)
+    # 首尾之外的 n-2 个点均分成 n_out-2 个桶
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    out = np.empty(n_out, dtype=int)
+    out[0], out[-1] = 0, n - 1
+
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # 下一个桶的平均点 (最后一个桶的下一个就是终点)
+        nlo, nhi = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        avg_x, avg_y = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        # 与上一个选中点、下一桶平均点构成的三角形面积最大者入选
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        out[i + 1] = a
+    return out
+
+
+def minmax_indices(y, n_out):
+    """最小/最大值分桶：每桶保留最低点和最高点 (再加首尾)，全程向量化"""
+    y = _fill(y)
+    n = len(y)
+    if n_out >= n or n_out < 4: return np.arange(n)
+
+    n_buckets = (n_out - 2) // 2
+    bucket = np.arange(n) * n_buckets // n
+    # 先按桶、再按值排序：每个桶的第一个是最小值，最后一个是最大值
+    order = np.lexsort((y, bucket))
+    first = np.flatnonzero(np.r_[True, bucket[order][1:] != bucket[order][:-1]])
+    last = np.r_[first[1:] - 1, n - 1]
+    return np.unique(np.r_[0, order[first], order[last], n - 1])
+
+
+def downsample_frame(df, columns, max_points, method='lttb'):
+    """
+    行数超过 max_points 时按 columns 挑点 (各列挑出的下标取并集，共用同一条时间轴)
+    method 为 None / max_points 为空时原样返回
+    """
+    if not method or not max_points or len(df) <= max_points: return df
+    if method not in METHODS: raise ValueError(f"未知降采样方法: {method} (可选 {METHODS})")
+
+    pick = lttb_indices if method == 'lttb' else minmax_indices
+    budget = max(max_points // len(columns), 4)
+    idx = np.unique(np.concatenate([pick(df[c].to_numpy(), budget) for c in columns]))
+    return df.iloc[idx]
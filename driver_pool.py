@@ -0,0 +1,210 @@
+import time
+import queue
+import threading
+from contextlib import contextmanager
+from selenium import webdriver
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.edge.service import Service as EdgeService
+from selenium.webdriver.chrome.service import Service as ChromeService
+from webdriver_manager.microsoft import EdgeChromiumDriverManager
+from webdriver_manager.chrome import ChromeDriverManager
+from selenium.webdriver.chrome.options import Options as ChromeOptions
+from selenium.webdriver.edge.options import Options as EdgeOptions
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+import instrument
+
+# ===========================
+# 1. 配置
+# ===========================
+# Edge 优先，起不来再用 Chrome
+BROWSERS = ('edge', 'chrome')
+# 一个会话连续用这么多次就换新的，防止浏览器越跑越占内存
+MAX_USES = 500
+# 会话闲置超过这么久 (秒)，再拿出来时先体检
+IDLE_CHECK = 30
+
+# 每个进程只解析一次 driver 路径 (webdriver_manager 每次 install 都要查版本、可能联网)
+_DRIVER_PATHS = {}
+_PATH_LOCK = threading.Lock()
+
+
+# ===========================
+# 2. 驱动解析与启动
+# ===========================
+def resolve_driver(browser):
+    """返回 browser 对应的 driver 可执行文件路径，失败返回 None (结果缓存，不重复解析)"""
+    with _PATH_LOCK:
+        if browser not in _DRIVER_PATHS:
+            try:
+                with instrument.timer('driver.resolve'):
+                    manager = EdgeChromiumDriverManager() if browser == 'edge' else ChromeDriverManager()
+                    _DRIVER_PATHS[browser] = manager.install()
+            except Exception as e:
+                print(f"   ❌ {browser} 驱动解析失败: {e!r}")
+                _DRIVER_PATHS[browser] = None
+        return _DRIVER_PATHS[browser]
+
+
+def _options(browser, headless, fast):
+    options = EdgeOptions() if browser == 'edge' else ChromeOptions()
+    if headless: options.add_argument('--headless')  # 后台运行
+    options.add_argument('--disable-gpu')
+    if fast:
+        # 禁止图片加载 + DOM 就绪就返回，极大提升速度
+        options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+        options.page_load_strategy = 'eager'
+    options.add_experimental_option('excludeSwitches', ['enable-logging'])
+    return options
+
+
+def launch(headless=True, fast=True):
+    """按 Edge -> Chrome 的顺序启动一个浏览器，全部失败返回 None"""
+    for browser in BROWSERS:
+        path = resolve_driver(browser)
+        if not path: continue
+        try:
+            with instrument.timer('driver.start'):
+                if browser == 'edge':
+                    return webdriver.Edge(service=EdgeService(path), options=_options(browser, headless, fast))
+                return webdriver.Chrome(service=ChromeService(path), options=_options(browser, headless, fast))
+        except Exception as e:
+            print(f"   ❌ {browser} 启动失败: {e!r}")
+    return None
+
+
+def is_alive(driver):
+    """健康检查：浏览器崩溃 / 窗口被关掉后，任何 WebDriver 调用都会抛异常"""
+    try:
+        driver.current_window_handle
+        return True
+    except Exception:
+        return False
+
+
+# ===========================
+# 3. 会话池
+# ===========================
+class DriverPool:
+    """
+    常驻浏览器会话池：N 个会话在所有股票 / 关键词之间复用，崩掉的自动换新
+    用法: with pool.session() as driver: ...   (driver 为 None 表示浏览器起不来)
+    """
+
+    def __init__(self, size, headless=True, fast=True, max_uses=MAX_USES):
+        self.size = size
+        self.headless = headless
+        self.fast = fast
+        self.max_uses = max_uses
+        self._lock = threading.Lock()
+        self._uses = {}
+        self._last_used = {}
+        # 后进先出：优先复用刚用过的热会话；None 是空位，第一次用到时才真正启动浏览器
+        self._idle = queue.LifoQueue()
+        for _ in range(size): self._idle.put(None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @contextmanager
+    def session(self):
+        driver = self._acquire()
+        ok = False
+        try:
+            yield driver
+            ok = True
+        finally:
+            self._release(driver, ok)
+
+    def _acquire(self):
+        driver = self._idle.get()
+        if driver is not None and time.time() - self._last_used[driver] > IDLE_CHECK and not is_alive(driver):
+            self._retire(driver, 'dead')
+            driver = None
+
+        if driver is None:
+            driver = launch(self.headless, self.fast)
+            if driver is None:
+                self._idle.put(None)  # 空位还回去，下次再试
+                return None
+            with self._lock:
+                self._uses[driver] = 0
+                self._last_used[driver] = time.time()
+            instrument.count('pool.launched')
+        return driver
+
+    def _release(self, driver, ok):
+        if driver is None: return
+        with self._lock:
+            self._uses[driver] += 1
+            self._last_used[driver] = time.time()
+            worn_out = self._uses[driver] >= self.max_uses
+
+        # 用的时候出过错才体检，正常归还不多花一次往返
+        if not ok and not is_alive(driver):
+            self._retire(driver, 'dead')
+            driver = None
+        elif worn_out:
+            self._retire(driver, 'recycled')
+            driver = None
+        self._idle.put(driver)
+
+    def _retire(self, driver, reason):
+        try:
+            driver.quit()
+        except Exception:
+            pass
+        with self._lock:
+            self._uses.pop(driver, None)
+            self._last_used.pop(driver, None)
+        instrument.count(f'pool.{reason}')
+
+    def close(self):
+        """退出所有浏览器 (等所有任务结束后再调用)；之后再用会重新启动"""
+        with self._lock:
+            drivers = list(self._uses)
+        for driver in drivers:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+        with self._lock:
+            self._uses.clear()
+            self._last_used.clear()
+        while not self._idle.empty(): self._idle.get_nowait()
+        for _ in range(self.size): self._idle.put(None)
+
+
+# ===========================
+# 4. 条件等待 (代替固定 sleep)
+# ===========================
+def wait_for(driver, condition, timeout=10, poll=0.2):
+    """条件一满足立刻返回 True；超时返回 False，由调用方决定要不要继续"""
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=poll).until(condition)
+        return True
+    except TimeoutException:
+        return False
+
+
+def any_present(css):
+    """条件：页面上出现了匹配 css 的元素"""
+    return EC.presence_of_element_located((By.CSS_SELECTOR, css))
+
+
+def count_settled(css):
+    """条件：匹配 css 的元素数量 > 0，且连续两次轮询不再变化 (懒加载已加载完)"""
+    last = -1
+
+    def check(driver):
+        nonlocal last
+        n = len(driver.find_elements(By.CSS_SELECTOR, css))
+        settled = n > 0 and n == last
+        last = n
+        return settled
+
+    return check
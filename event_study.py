@@ -0,0 +1,129 @@
+import numpy as np
+import pandas as pd
+
+# ===========================
+# 1. 配置：市场模型事件研究
+# ===========================
+# 估计窗口 / 事件窗口：相对事件日 (第 0 个交易日) 的交易日偏移，闭区间
+EST_WINDOW = (-60, -6)
+EVENT_WINDOW = (-5, 30)
+# 估计窗口内至少要有这么多有效收益率才估 alpha/beta
+MIN_OBS = 20
+
+
+# ===========================
+# 2. 批量事件研究 (全部用数组运算，没有逐事件循环)
+# ===========================
+def _gather(matrix, rows, cols):
+    """按 (行下标矩阵, 列下标) 取值，越界位置返回 NaN"""
+    valid = (rows >= 0) & (rows < matrix.shape[0])
+    out = matrix[np.clip(rows, 0, matrix.shape[0] - 1), cols]
+    return np.where(valid, out, np.nan)
+
+
+def run_event_study(returns, bench, events, est_window=EST_WINDOW, min_obs=MIN_OBS):
+    """
+    市场模型: R_it = alpha_i + beta_i * R_mt + e_it
+    - returns: 宽表，index 为交易日，每列一只股票的日收益率 (小数)
+    - bench:   基准日收益率 Series (会按 returns 的交易日对齐，缺失记 0)
+    - events:  DataFrame，列 ticker / event_date，可选 start / end (事件窗口偏移，默认 EVENT_WINDOW)
+    返回 (summary, paths)
+    - summary: 每个事件一行 alpha / beta / n_est / CAR / BHAR
+    - paths:   长表 (event, offset, date, AR, CAR, BHAR)
+    """
+    dates = pd.DatetimeIndex(returns.index)
+    R = returns.to_numpy(dtype=float)
+    M = bench.reindex(dates).fillna(0).to_numpy(dtype=float)[:, None]
+
+    events = events.reset_index(drop=True)
+    n_events = len(events)
+    col = returns.columns.get_indexer(events['ticker'])
+    if (col < 0).any():
+        missing = events.loc[col < 0, 'ticker'].unique().tolist()
+        raise KeyError(f"returns 中没有这些股票: {missing}")
+
+    # 事件日落在非交易日时顺延到下一个交易日
+    t0 = dates.searchsorted(pd.DatetimeIndex(events['event_date']), side='left')
+    starts = events['start'].to_numpy(int) if 'start' in events else np.full(n_events, EVENT_WINDOW[0])
+    ends = events['end'].to_numpy(int) if 'end' in events else np.full(n_events, EVENT_WINDOW[1])
+    cols = col[:, None]
+
+    # --- 估计窗口：E x L 矩阵一次性估 alpha / beta ---
+    est_off = np.arange(est_window[0], est_window[1] + 1)
+    est_rows = t0[:, None] + est_off[None, :]
+    r_est = _gather(R, est_rows, cols)
+    m_est = _gather(M, est_rows, 0)
+    ok = ~np.isnan(r_est) & ~np.isnan(m_est)
+    r_est, m_est = np.where(ok, r_est, np.nan), np.where(ok, m_est, np.nan)
+
+    n_est = ok.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        m_mean = np.nanmean(m_est, axis=1)
+        r_mean = np.nanmean(r_est, axis=1)
+        dm = m_est - m_mean[:, None]
+        beta = np.nansum(dm * (r_est - r_mean[:, None]), axis=1) / np.nansum(dm ** 2, axis=1)
+    alpha = r_mean - beta * m_mean
+    enough = n_est >= min_obs
+    alpha, beta = np.where(enough, alpha, np.nan), np.where(enough, beta, np.nan)
+
+    # --- 事件窗口：统一按最宽窗口展开，窗口外的位置打掩码 ---
+    off = np.arange(starts.min(), ends.max() + 1)
+    ev_rows = t0[:, None] + off[None, :]
+    in_window = (off[None, :] >= starts[:, None]) & (off[None, :] <= ends[:, None]) & \
+                (ev_rows >= 0) & (ev_rows < len(dates))
+
+    r_ev = _gather(R, ev_rows, cols)
+    expected = alpha[:, None] + beta[:, None] * _gather(M, ev_rows, 0)
+    ar = np.where(in_window, r_ev - expected, np.nan)
+
+    # 停牌等缺失收益当 0 累加，窗口外保持 NaN
+    ar_filled = np.where(in_window & ~np.isnan(ar), ar, 0.0)
+    car = np.where(in_window, np.cumsum(ar_filled, axis=1), np.nan)
+    growth = np.where(in_window & ~np.isnan(r_ev), 1 + r_ev, 1.0)
+    growth_exp = np.where(in_window & ~np.isnan(expected), 1 + expected, 1.0)
+    bhar = np.where(in_window, np.cumprod(growth, axis=1) - np.cumprod(growth_exp, axis=1), np.nan)
+
+    # 每个事件窗口最后一个有效位置的累计值
+    last = in_window.shape[1] - 1 - np.argmax(in_window[:, ::-1], axis=1)
+    idx = np.arange(n_events)
+
+    summary = events.copy()
+    summary['alpha'] = alpha
+    summary['beta'] = beta
+    summary['n_est'] = n_est
+    summary['CAR'] = car[idx, last]
+    summary['BHAR'] = bhar[idx, last]
+
+    keep = in_window.ravel()
+    safe_rows = np.clip(ev_rows, 0, len(dates) - 1)
+    paths = pd.DataFrame({
+        'event': np.repeat(idx, len(off))[keep],
+        'offset': np.tile(off, n_events)[keep],
+        'date': dates.values[safe_rows].ravel()[keep],
+        'AR': ar.ravel()[keep],
+        'CAR': car.ravel()[keep],
+        'BHAR': bhar.ravel()[keep],
+    })
+    return summary, paths
+
+
+# ===========================
+# 3. 单只股票：整段行情的市场模型 CAR (供 processing 替换简单 CAR)
+# ===========================
+def market_model_car(df_m, event_date, est_window=EST_WINDOW, min_obs=MIN_OBS):
+    """
+    用 market_{code} 的 pctChg / bench_ret 估计市场模型，返回与 df_m 同索引的 CAR
+    事件窗口覆盖整段行情 (从第一天累加到最后一天)
+    返回 (CAR, alpha, beta)；估计窗口数据不足时 CAR 为 None
+    """
+    dates = df_m.index
+    t0 = dates.searchsorted(pd.Timestamp(event_date))
+    events = pd.DataFrame({'ticker': ['x'], 'event_date': [event_date],
+                           'start': [-t0], 'end': [len(dates) - 1 - t0]})
+    summary, paths = run_event_study(df_m[['pctChg']].rename(columns={'pctChg': 'x'}), df_m['bench_ret'], events,
+                                     est_window=est_window, min_obs=min_obs)
+    alpha, beta = summary.loc[0, 'alpha'], summary.loc[0, 'beta']
+    if np.isnan(beta): return None, alpha, beta
+
+    car = pd.Series(paths['CAR'].to_numpy(), index=pd.DatetimeIndex(paths['date']))
+    return car.reindex(dates), alpha, beta
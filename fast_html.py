@@ -0,0 +1,40 @@
+# ===========================
+# lxml 快速解析的公共小工具 (股吧 / B站 解析共用)
+# ===========================
+# 没装 lxml 时 HAS_LXML=False，解析函数自动退回 BeautifulSoup
+try:
+    from lxml import etree, html as lxml_html
+    HAS_LXML = True
+except ImportError:
+    HAS_LXML = False
+
+# BeautifulSoup 的 .text / get_text() 不含 <script>/<style>/<template> 里的内容和注释，这里保持一致
+_TEXT_NODES = ".//text()[not(ancestor::script) and not(ancestor::style) and not(ancestor::template)]"
+
+
+def has_class(name):
+    """XPath 谓词：class 属性里含有 name 这个类名 (等价于 CSS 的 .name)"""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+def xpath(expr):
+    """预编译 XPath (模块导入时编译一次，之后每页直接复用)"""
+    return etree.XPath(expr) if HAS_LXML else None
+
+
+TEXT_NODES = xpath(_TEXT_NODES)
+
+
+def parse_document(html):
+    """HTML 字符串 -> lxml 根节点；空文档等解析失败时抛异常，由调用方退回 BeautifulSoup"""
+    return lxml_html.document_fromstring(html)
+
+
+def text(el):
+    """等价于 BeautifulSoup 的 tag.text"""
+    return ''.join(TEXT_NODES(el))
+
+
+def stripped_text(el):
+    """等价于 BeautifulSoup 的 tag.get_text(strip=True)"""
+    return ''.join(s.strip() for s in TEXT_NODES(el) if s.strip())
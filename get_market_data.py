@@ -1,8 +1,11 @@
-import akshare as ak
-import baostock as bs  # 【必须有这一行】
 import pandas as pd
 import os
 import datetime
+import argparse
+from market_store import MarketStore, fixture_providers, STORE_DIR, MARKET_FIXTURES, MAX_WORKERS, RATE_PER_SEC
+from data_lake import save_frame
+import universe
+import instrument
 
 # ===========================
 # 0. 强制禁用代理 (保留防身)
@@ -13,108 +16,89 @@ os.environ['https_proxy'] = ''
 # ===========================
 # 1. 配置：真实时间窗口
 # ===========================
-today = datetime.datetime.now().strftime("%Y%m%d")
 today_dash = datetime.datetime.now().strftime("%Y-%m-%d")
 
-TASKS = {
-    '002242': {'type': 'A', 'start': '20251001', 'end': today},
-    '601127': {'type': 'A', 'start': '20230801', 'end': '20240131'},
-    '01810': {'type': 'HK', 'start': '20240201', 'end': '20240531'}
-}
+# 个股行情区间: universe.csv 的 market_start / market_end (留空则同事件窗口，填 today 取到今天)，市场 A / HK
+
+# 基准：沪深300 (Baostock 代码)
+BENCH = {'symbol': 'sh.000300', 'start': '2023-01-01'}
 
 DATA_DIR = "./real_data"
 if not os.path.exists(DATA_DIR): os.makedirs(DATA_DIR)
 
 
-def fetch_real_data():
-    print("🚀 启动 [Baostock + AkShare] 双引擎获取行情...")
+def fetch_real_data(offline=False, workers=MAX_WORKERS, rate=RATE_PER_SEC, codes=None, fixtures=None):
+    print(f"🚀 启动 [Baostock + AkShare] 双引擎获取行情{' (离线缓存模式)' if offline else ''}...")
+    # 本地行情仓库：已缓存的区间直接读，只补缺口
+    if fixtures:
+        # 样本替身代替 AkShare / Baostock，缓存单独放，不和真实行情混在一起
+        print(f"   🎞️ 使用行情样本: {fixtures}")
+        store = MarketStore(root=f"{STORE_DIR}_fixtures", providers=fixture_providers(fixtures), offline=offline, rate=0)
+    else:
+        store = MarketStore(offline=offline, rate=rate)
 
     # ==========================================
     # 第一步：用 Baostock 获取大盘基准 (最稳)
     # ==========================================
     print("📉 [引擎1] Baostock: 获取沪深300基准...")
 
-    # 登录 (必须在 import baostock as bs 之后)
-    lg = bs.login()
-    if lg.error_code != '0':
-        print(f"   ❌ Baostock 登录失败: {lg.error_msg}")
-        bench_df = pd.DataFrame()
-    else:
+    try:
         # 获取涵盖所有个股时间段的大盘数据
-        rs = bs.query_history_k_data_plus("sh.000300", "date,pctChg",
-                                          start_date='2023-01-01', end_date=today_dash, frequency="d")
-
-        data_list = []
-        while rs.next(): data_list.append(rs.get_row_data())
-
-        bench_df = pd.DataFrame(data_list, columns=rs.fields)
-        bench_df['date'] = pd.to_datetime(bench_df['date'])
-        # Baostock pctChg 是百分比，转小数
-        bench_df['bench_ret'] = bench_df['pctChg'].replace('', 0).astype(float) / 100
-        bench_df = bench_df.set_index('date')
-
+        with instrument.stage('market.bench'):
+            bench_df = store.get(BENCH['symbol'], 'INDEX', BENCH['start'], today_dash, adjust='none')
+        bench_df = bench_df.rename(columns={'pctChg': 'bench_ret'})
         print(f"   ✅ 基准获取成功 ({len(bench_df)}条)")
-        bs.logout()
+    except Exception as e:
+        print(f"   ❌ Baostock 获取失败: {e}")
+        bench_df = pd.DataFrame()
 
     # ==========================================
-    # 第二步：用 AkShare 获取个股 (支持港股)
+    # 第二步：用 AkShare 获取个股 (支持港股)，多只并发
     # ==========================================
     print("📉 [引擎2] AkShare: 获取个股数据...")
 
-    for code, conf in TASKS.items():
-        market_type = conf['type']
-        s_date = conf['start']
-        e_date = conf['end']
-
-        print(f"   -> 获取 [{code}]...")
-
-        try:
-            df = pd.DataFrame()
-
-            # --- A股 ---
-            if market_type == 'A':
-                df = ak.stock_zh_a_hist(symbol=code, period="daily", start_date=s_date, end_date=e_date, adjust="hfq")
-                df = df.rename(columns={'日期': 'date', '开盘': 'open', '收盘': 'close', '最高': 'high', '最低': 'low',
-                                        '成交量': 'volume', '涨跌幅': 'pctChg'})
-                df['pctChg'] = df['pctChg'] / 100
-
-            # --- 港股 ---
-            elif market_type == 'HK':
-                df = ak.stock_hk_hist(symbol=code, start_date=s_date, end_date=e_date, adjust="hfq")
-                df = df.rename(columns={'日期': 'date', '开盘': 'open', '收盘': 'close', '最高': 'high', '最低': 'low',
-                                        '成交量': 'volume', '涨跌幅': 'pctChg'})
-                df['pctChg'] = df['pctChg'] / 100
-
-            if df.empty:
-                print(f"      ⚠️ 数据为空")
-                continue
+    jobs = {code: (code, conf['market'], pd.Timestamp(conf['market_start']), pd.Timestamp(conf['market_end']), 'hfq')
+            for code, conf in universe.select(codes, need=['market', 'market_start', 'market_end']).items()}
+    with instrument.stage('market.tickers'):
+        results = store.get_many(jobs, max_workers=workers)
 
-            df['date'] = pd.to_datetime(df['date'])
-            df = df.set_index('date')
+    for code in jobs:
+        print(f"   -> 处理 [{code}]...")
+        df = results[code]
 
-            # 数值转换
-            cols = ['open', 'high', 'low', 'close', 'volume', 'pctChg']
-            for c in cols: df[c] = pd.to_numeric(df[c], errors='coerce')
+        if isinstance(df, Exception):
+            print(f"      ❌ 失败: {df}")
+            continue
 
-            # --- 计算 CAR ---
-            # 左连接：保留个股交易日
-            if not bench_df.empty:
-                m = pd.merge(df, bench_df[['bench_ret']], left_index=True, right_index=True, how='left')
-                m['bench_ret'] = m['bench_ret'].fillna(0)  # 港股假期对不齐的补0
-            else:
-                m = df.copy()
-                m['bench_ret'] = 0
+        if df.empty:
+            print(f"      ⚠️ 数据为空")
+            continue
 
-            m['AR'] = m['pctChg'] - m['bench_ret']
-            m['CAR'] = m['AR'].cumsum()
+        # --- 计算 CAR ---
+        # 左连接：保留个股交易日
+        if not bench_df.empty:
+            m = pd.merge(df, bench_df[['bench_ret']], left_index=True, right_index=True, how='left')
+            m['bench_ret'] = m['bench_ret'].fillna(0)  # 港股假期对不齐的补0
+        else:
+            m = df.copy()
+            m['bench_ret'] = 0
 
-            save_path = f"{DATA_DIR}/market_{code}.csv"
-            m.to_csv(save_path)
-            print(f"      ✅ 已保存: {save_path}")
+        m['AR'] = m['pctChg'] - m['bench_ret']
+        m['CAR'] = m['AR'].cumsum()
 
-        except Exception as e:
-            print(f"      ❌ 失败: {e}")
+        save_path = f"{DATA_DIR}/market_{code}.csv"
+        m.to_csv(save_path)
+        save_frame(m, 'market', code)
+        print(f"      ✅ 已保存: {save_path}")
 
 
 if __name__ == "__main__":
-    fetch_real_data()
+    parser = argparse.ArgumentParser(description="获取基准与个股行情 (带本地缓存)")
+    parser.add_argument('--offline', action='store_true', help="只读本地缓存，不联网")
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS, help="并发抓取线程数")
+    parser.add_argument('--rate', type=float, default=RATE_PER_SEC, help="每秒最多请求数")
+    parser.add_argument('--codes', nargs='+', help="只刷新这些股票 (默认股票池全部)")
+    parser.add_argument('--fixtures', nargs='?', const=MARKET_FIXTURES, help="用行情样本目录代替数据源 (默认 fixtures/market)")
+    args = parser.parse_args()
+    instrument.setup('get_market_data')
+    fetch_real_data(offline=args.offline, workers=args.workers, rate=args.rate, codes=args.codes, fixtures=args.fixtures)
@@ -1,144 +1,88 @@
 import pandas as pd
 import time
-import random
-import re
 import os
+import argparse
 import concurrent.futures
-from snownlp import SnowNLP
-from selenium import webdriver
-from selenium.webdriver.edge.service import Service as EdgeService
-from selenium.webdriver.chrome.service import Service as ChromeService
-from webdriver_manager.microsoft import EdgeChromiumDriverManager
-from webdriver_manager.chrome import ChromeDriverManager
-from bs4 import BeautifulSoup
-from selenium.webdriver.chrome.options import Options as ChromeOptions
-from selenium.webdriver.edge.options import Options as EdgeOptions
+from driver_pool import DriverPool, wait_for, any_present
+from guba_parser import parse_guba_page
+from sentiment_engine import batch_sentiment
+from crawl_journal import CrawlJournal
+from raw_loader import prepare_raw
+import page_locator
+import universe
+import instrument
 
 # ==========================================
-# 1. 你的“人工导航”坐标 (精准打击)
+# 1. 配置 (页码区间与 crawl 一样：universe.csv 手工填了就用，否则 page_locator 按事件窗口自动定位)
 # ==========================================
-CONFIG = {
-    '002242': {'name': '九阳股份', 'start': 173, 'end': 177, 'force_year': '2023'},
-    '601127': {'name': '赛力斯', 'start': 3208, 'end': 3654, 'force_year': '2023'},
-    '603178': {'name': '圣龙股份', 'start': 449, 'end': 699, 'force_year': '2023'}
-}
-
 DATA_DIR = "./real_data"
-# 开启 8 线程加速
+# 断点日志单独放，避免和 crawl.py 的同代码日志混在一起
+JOURNAL_DIR = f"{DATA_DIR}/journal"
+# 开启 8 线程加速；浏览器会话池同样大小，所有股票共用
 MAX_WORKERS = 8
+# 列表页最多等这么久 (秒)
+PAGE_WAIT = 8
 
 
 # ==========================================
-# 2. 极速版浏览器驱动
+# 2. 抓取逻辑
 # ==========================================
-def get_fast_driver():
-    try:
-        options = EdgeOptions()
-        options.add_argument('--headless')  # 后台运行
-        options.add_argument('--disable-gpu')
-        # 禁止图片和CSS
-        prefs = {"profile.managed_default_content_settings.images": 2}
-        options.add_experimental_option("prefs", prefs)
-        options.page_load_strategy = 'eager'
-        options.add_experimental_option('excludeSwitches', ['enable-logging'])
-
-        service = EdgeService(EdgeChromiumDriverManager().install())
-        driver = webdriver.Edge(service=service, options=options)
-        return driver
-    except:
+def worker_crawl(stock_code, pages, year, worker_id, journal, pool, base_url=page_locator.BASE_URL):
+    for i, page in enumerate(pages):
+        url = f"{base_url}/list,{stock_code}_{page}.html"
         try:
-            options = ChromeOptions()
-            options.add_argument('--headless')
-            options.add_argument('--disable-gpu')
-            prefs = {"profile.managed_default_content_settings.images": 2}
-            options.add_experimental_option("prefs", prefs)
-            options.page_load_strategy = 'eager'
-            options.add_experimental_option('excludeSwitches', ['enable-logging'])
-
-            service = ChromeService(ChromeDriverManager().install())
-            driver = webdriver.Chrome(service=service, options=options)
-            return driver
-        except:
-            return None
+            # 从共享会话池借一个热会话，出错的会话归还时体检，崩了自动换新
+            with pool.session() as driver:
+                # 驱动没起来就什么都不记，这些页下次重跑会自动补抓
+                if not driver: return
+                with instrument.timer('guba.page_load'):
+                    driver.get(url)
+                    # 列表一出来就解析，不再固定 sleep
+                    loaded = wait_for(driver, any_present('.listitem, tr'), timeout=PAGE_WAIT)
+                html = driver.page_source
+
+            # 与 crawl 共用同一个解析器 (先拼上年份，自动定位的区间抓完再按页重推)
+            rows = parse_guba_page(html, year)
+            if not rows:
+                # 多半是拦截页/验证码/限流页：记为失败，重跑时会再抓
+                print(f"   ⚠️ [分队-{worker_id}] 第 {page} 页{'加载超时且' if not loaded else ''}没有帖子，记为失败")
+                rows = None
+        except Exception as e:
+            print(f"   ❌ [分队-{worker_id}] 第 {page} 页失败: {e!r}")
+            rows = None
+
+        # 每页立刻落盘，失败页也记下来
+        journal.record(page, rows)
+
+        if i % 20 == 0:
+            print(f"   ⚡ [分队-{worker_id}] 推进至第 {page} 页...")
 
 
 # ==========================================
-# 3. 抓取逻辑
+# 3. 主程序
 # ==========================================
-def worker_crawl(stock_code, start_page, end_page, year, worker_id):
-    driver = get_fast_driver()
-    if not driver: return []
+def run_fast_crawl(codes=None, base_url=page_locator.BASE_URL):
+    if not os.path.exists(DATA_DIR): os.makedirs(DATA_DIR)
 
-    local_data = []
-    try:
-        for page in range(start_page, end_page + 1):
-            url = f"http://guba.eastmoney.com/list,{stock_code}_{page}.html"
-            try:
-                driver.get(url)
-                time.sleep(random.uniform(0.5, 1.0))
-
-                soup = BeautifulSoup(driver.page_source, 'html.parser')
-                items = soup.select('.listitem')
-                if not items: items = soup.find_all('tr')
-
-                for item in items:
-                    try:
-                        text = item.text
-                        # 找标题
-                        title_tag = item.select_one('.l3 a')
-                        if not title_tag:
-                            links = item.find_all('a')
-                            title_tag = max(links, key=lambda x: len(x.text)) if links else None
-
-                        title = title_tag.get('title') or title_tag.text if title_tag else ""
-                        title = title.strip()
-                        if not title or "公告" in title: continue
-
-                        # 找日期 (MM-DD)
-                        date_match = re.search(r'(\d{2})-(\d{2})', text)
-                        if date_match:
-                            mm_dd = date_match.group(0)
-                            full_date = f"{year}-{mm_dd}"  # 强制拼上2023
-
-                            read_count = 0
-                            nums = re.findall(r'\d+', text.replace('万', '0000'))
-                            if nums: read_count = int(nums[0])
-
-                            score = SnowNLP(title).sentiments
-
-                            local_data.append({
-                                'date': full_date,
-                                'title': title,
-                                'read_count': read_count,
-                                'sentiment': score
-                            })
-                    except:
-                        continue
-            except:
-                continue
-
-            if (page - start_page) % 20 == 0:
-                print(f"   ⚡ [分队-{worker_id}] 推进至第 {page} 页...")
+    total_start = time.time()
+    # 浏览器会话池：第一次用到时才启动，跨股票保持常驻，全部结束后统一关闭
+    pool = DriverPool(MAX_WORKERS)
 
+    try:
+        _crawl_all(pool, universe.select(codes, need=['window_start', 'window_end']), base_url)
     finally:
-        driver.quit()
-
-    return local_data
+        pool.close()
 
+    print(f"\n🏁 全部完成！耗时: {time.time() - total_start:.1f} 秒")
 
-# ==========================================
-# 4. 主程序
-# ==========================================
-def run_fast_crawl():
-    if not os.path.exists(DATA_DIR): os.makedirs(DATA_DIR)
-
-    total_start = time.time()
 
-    for code, conf in CONFIG.items():
+def _crawl_all(pool, stocks, base_url=page_locator.BASE_URL):
+    for code, conf in stocks.items():
         name = conf['name']
-        start = conf['start']
-        end = conf['end']
-        year = conf['force_year']
+        journal = CrawlJournal(code, root=JOURNAL_DIR)
+        rng = page_locator.page_range(code, conf, journal, base_url)
+        if not rng: continue
+        start, end, year = rng['start_page'], rng['end_page'], rng['year']
         total_pages = end - start + 1
 
         print(f"\n==============================================")
@@ -146,35 +90,48 @@ def run_fast_crawl():
         print(f"📄 页码: {start}-{end} (共 {total_pages} 页)")
         print(f"==============================================")
 
-        chunk_size = (total_pages // MAX_WORKERS) + 1
+        # 断点续爬：只抓没抓过的页和上次失败的页
+        pending = journal.pending(range(start, end + 1))
+        print(f"📒 断点记录: {journal.summary(start, end)} -> 本次需抓 {len(pending)} 页")
+
+        chunk_size = (len(pending) // MAX_WORKERS) + 1
         futures = []
-        all_results = []
 
-        with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        with instrument.stage(f"crawl.{code}"), \
+                concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
             for i in range(MAX_WORKERS):
-                c_start = start + i * chunk_size
-                c_end = min(start + (i + 1) * chunk_size - 1, end)
-                if c_start > end: break
-                futures.append(executor.submit(worker_crawl, code, c_start, c_end, year, i + 1))
+                chunk = pending[i * chunk_size:(i + 1) * chunk_size]
+                if not chunk: break
+                futures.append(executor.submit(worker_crawl, conf['url_code'], chunk, year, i + 1, journal, pool,
+                                               base_url))
 
             for future in concurrent.futures.as_completed(futures):
-                all_results.extend(future.result())
+                future.result()
+
+        # 从日志重建整段结果 (包括之前几次运行抓到的页)
+        print(f"📒 本次结束: {journal.summary(start, end)}")
+        all_results = page_locator.journal_rows(journal, rng)
 
         # 保存
         if all_results:
-            df = pd.DataFrame(all_results)
+            # 紧凑类型 + 去掉翻页时重复抓到的帖子，再打分
+            df = prepare_raw(pd.DataFrame(all_results), label=code)
+
+            # 抓完再统一多进程打分，不占用爬虫线程
+            df['sentiment'] = batch_sentiment(df['title'])
 
             # 【修复点】这里定义了列名 'weighted_score'
             df['weighted_score'] = df['sentiment'] * (df['read_count'] + 1)
 
             # 聚合计算
-            daily = df.groupby('date').apply(
-                lambda x: pd.Series({
-                    'avg_sentiment': x['sentiment'].mean(),
-                    'total_buzz': x['read_count'].sum(),
-                    'weighted_score': x['weighted_score'].sum() / (x['read_count'].sum() + 1)
-                })
-            )
+            with instrument.timer('pandas.groupby'):
+                daily = df.groupby('date').apply(
+                    lambda x: pd.Series({
+                        'avg_sentiment': x['sentiment'].mean(),
+                        'total_buzz': x['read_count'].sum(),
+                        'weighted_score': x['weighted_score'].sum() / (x['read_count'].sum() + 1)
+                    })
+                )
             # 排序并保存
             daily = daily.sort_index()
             path = f"{DATA_DIR}/sentiment_{code}.csv"
@@ -183,8 +140,12 @@ def run_fast_crawl():
         else:
             print(f"⚠️ {name} 未抓到数据")
 
-    print(f"\n🏁 全部完成！耗时: {time.time() - total_start:.1f} 秒")
-
 
 if __name__ == "__main__":
-    run_fast_crawl()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="股吧抓取 + 情感日度表 (浏览器)")
+    parser.add_argument('--codes', nargs='+', help="只抓这些股票 (默认股票池全部)")
+    parser.add_argument('--guba-base', default=page_locator.BASE_URL,
+                        help="股吧站点地址 (测试时指向 page_locator stub 替身服务器)")
+    args = parser.parse_args()
+    instrument.setup('get_sentiment_data')
+    run_fast_crawl(args.codes, args.guba_base)
\ No newline at end of file
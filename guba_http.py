@@ -0,0 +1,267 @@
+import os
+import json
+import glob
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import threading
+import aiohttp
+from guba_parser import parse_guba_page
+import instrument
+
+# ===========================
+# 1. 配置：纯 HTTP 抓取 (不开浏览器)
+# ===========================
+# 股吧列表页是静态 HTML，直接 GET 即可；测试时可换成本地替身服务器地址
+BASE_URL = "http://guba.eastmoney.com"
+# 同一站点最多同时在途的请求数
+MAX_PER_HOST = 8
+# 令牌桶：平均每秒请求数 / 允许的瞬时突发
+RATE_PER_SEC = 10
+BURST = 10
+# 失败重试次数与退避基数 (秒)
+MAX_RETRIES = 4
+BACKOFF_BASE = 0.5
+TIMEOUT_SEC = 15
+
+# 本地替身服务器：仓库自带的列表页样本 fixtures/guba/{url_code}_{page}.html
+# 同名 .json 是旧版 Selenium 路径 (BeautifulSoup 解析) 对该页录下的期望行，verify 以它为准
+STUB_FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "guba")
+STUB_PORT = 8767
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+                  '(KHTML, like Gecko) Chrome/120.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml',
+    'Accept-Language': 'zh-CN,zh;q=0.9',
+}
+
+
+class TokenBucket:
+    """异步令牌桶限速：rate 个/秒匀速补充，最多攒 burst 个"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def page_url(url_code, page, base_url=BASE_URL):
+    return f"{base_url}/list,{url_code}_{page}.html"
+
+
+# ===========================
+# 2. 单页抓取 (限速 + 重试退避)
+# ===========================
+async def fetch_page(session, bucket, url, retries=MAX_RETRIES):
+    """返回页面 HTML；重试耗尽后抛出最后一次的异常"""
+    for attempt in range(retries + 1):
+        await bucket.acquire()
+        try:
+            with instrument.timer('http.fetch'):
+                async with session.get(url) as resp:
+                    # 429/5xx 属于可重试错误，其余 4xx 直接放弃
+                    if resp.status == 429 or resp.status >= 500:
+                        raise aiohttp.ClientResponseError(resp.request_info, resp.history, status=resp.status)
+                    resp.raise_for_status()
+                    return await resp.text(errors='replace')
+        except aiohttp.ClientResponseError as e:
+            if e.status != 429 and e.status < 500: raise
+            if attempt == retries: raise
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            if attempt == retries: raise
+
+        # 指数退避 + 抖动，避免所有协程同时重试
+        instrument.count('http.retry')
+        await asyncio.sleep(BACKOFF_BASE * (2 ** attempt) * random.uniform(0.8, 1.2))
+
+
+async def fetch_pages(url_code, pages, year, base_url=BASE_URL, max_per_host=MAX_PER_HOST,
+                      rate=RATE_PER_SEC, burst=BURST, on_page=None):
+    """
+    并发抓取多页并解析
+    返回 {page: rows}；失败页的值为 None
+    on_page(page, rows_or_None) 在每页完成时回调 (用于进度/落盘)
+    """
+    bucket = TokenBucket(rate, burst)
+    # 连接池复用 keep-alive 连接，按站点限制并发
+    connector = aiohttp.TCPConnector(limit_per_host=max_per_host, keepalive_timeout=30)
+    timeout = aiohttp.ClientTimeout(total=TIMEOUT_SEC)
+    results = {}
+    loop = asyncio.get_running_loop()
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout, headers=HEADERS) as session:
+        async def one(page):
+            try:
+                html = await fetch_page(session, bucket, page_url(url_code, page, base_url))
+                # 解析是纯 CPU 活，放到线程池里，别卡住事件循环里其它页的收发
+                rows = await loop.run_in_executor(None, parse_guba_page, html, year)
+            except Exception as e:
+                print(f"   ❌ 第 {page} 页失败: {type(e).__name__} {e}")
+                rows = None
+            results[page] = rows
+            if on_page: on_page(page, rows)
+
+        await asyncio.gather(*(one(p) for p in pages))
+
+    return results
+
+
+# ===========================
+# 3. 同步入口 (与 Selenium 路径输出一致)
+# ===========================
+def crawl_http(url_code, pages, year, journal=None, **kwargs):
+    """
+    抓取给定页码列表，返回与 worker_crawl 相同结构的行列表 (按页码顺序)
+    传入 CrawlJournal 时每页完成即落盘
+    """
+    pages = list(pages)
+    done = [0]
+
+    def progress(page, rows):
+        if journal is not None: journal.record(page, rows)
+        done[0] += 1
+        if done[0] % 50 == 0:
+            print(f"   ⚡ [HTTP] {year}年数据 | 已完成 {done[0]}/{len(pages)} 页")
+
+    results = asyncio.run(fetch_pages(url_code, pages, year, on_page=progress, **kwargs))
+
+    failed = [p for p in pages if results.get(p) is None]
+    if failed: print(f"   ⚠️ {len(failed)} 页抓取失败: {failed[:10]}{' ...' if len(failed) > 10 else ''}")
+
+    return [row for p in sorted(pages) for row in (results.get(p) or [])]
+
+
+# ===========================
+# 4. 本地替身服务器 + 一致性校验 (HTTP 路径 vs Selenium 路径)
+# ===========================
+def load_stub_pages(fixture_dir=STUB_FIXTURES):
+    """{(url_code, page): html}"""
+    pages = {}
+    for path in sorted(glob.glob(os.path.join(fixture_dir, "*.html"))):
+        url_code, page = os.path.basename(path)[:-5].rsplit('_', 1)
+        with open(path, encoding='utf-8') as f:
+            pages[(url_code, int(page))] = f.read()
+    return pages
+
+
+def load_expected_rows(fixture_dir=STUB_FIXTURES):
+    """{(url_code, page): rows}，来自样本页旁录好的 .json"""
+    expected = {}
+    for path in sorted(glob.glob(os.path.join(fixture_dir, "*.json"))):
+        url_code, page = os.path.basename(path)[:-5].rsplit('_', 1)
+        with open(path, encoding='utf-8') as f:
+            expected[(url_code, int(page))] = json.load(f)
+    return expected
+
+
+def make_stub_app(fixture_dir=STUB_FIXTURES):
+    """/list,{url_code}_{page}.html -> 同名样本页；没有样本的页 404"""
+    from aiohttp import web
+    pages = load_stub_pages(fixture_dir)
+
+    async def guba(request):
+        try:
+            url_code, page = request.match_info['name'].rsplit('_', 1)
+            html = pages[(url_code, int(page))]
+        except (ValueError, KeyError):
+            raise web.HTTPNotFound()
+        return web.Response(text=html, content_type='text/html')
+
+    app = web.Application()
+    app.router.add_get('/list,{name}.html', guba)
+    return app
+
+
+def serve_in_thread(app, port=STUB_PORT):
+    """在后台线程起服务器 (抓取入口自己要 asyncio.run / 开浏览器，不能和服务器共用事件循环)，返回 stop()"""
+    from aiohttp import web
+    loop = asyncio.new_event_loop()
+    runner = web.AppRunner(app)
+    loop.run_until_complete(runner.setup())
+    loop.run_until_complete(web.TCPSite(runner, '127.0.0.1', port).start())
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+
+    def stop():
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.run_until_complete(runner.cleanup())
+        loop.close()
+
+    return stop
+
+
+def verify(selenium=False, port=STUB_PORT, fixture_dir=STUB_FIXTURES, year='2023'):
+    """
+    对着替身服务器抓一遍样本页，逐页和录好的期望行 (样本旁的 .json) 比对：
+    - HTTP 路径 (fetch_pages) 的行 == 期望行
+    - selenium=True 时再用 crawl 的浏览器路径 (worker_crawl + DriverPool) 抓同样的页，行也必须 == 期望行
+    期望行按 year='2023' 录制；缺 .json 的样本页算不一致
+    """
+    pages = load_stub_pages(fixture_dir)
+    recorded = load_expected_rows(fixture_dir)
+    base_url = f"http://127.0.0.1:{port}"
+    stop = serve_in_thread(make_stub_app(fixture_dir), port)
+    ok = True
+    try:
+        for url_code in sorted({code for code, _ in pages}):
+            nums = sorted(p for code, p in pages if code == url_code)
+            expected = {p: recorded.get((url_code, p)) for p in nums}
+            got = asyncio.run(fetch_pages(url_code, nums, year, base_url=base_url))
+            bad = [p for p in nums if got.get(p) != expected[p]]
+            ok &= not bad
+            print(f"{'✅' if not bad else '❌'} HTTP {url_code}: {len(nums)} 页 / {sum(len(r or []) for r in expected.values())} 行"
+                  f"{f', 不一致页: {bad}' if bad else ''}")
+
+            if selenium:
+                from script_loader import load_script
+                from driver_pool import DriverPool
+                from crawl_journal import CrawlJournal
+                crawl = load_script('crawl')
+                pool = DriverPool(1)
+                try:
+                    with tempfile.TemporaryDirectory() as tmp:
+                        journal = CrawlJournal(url_code, root=tmp)
+                        crawl.worker_crawl(url_code, nums, year, 1, journal, pool, base_url)
+                        bad = [p for p in nums if journal.pages.get(p, (None, None))[1] != expected[p]]
+                finally:
+                    pool.close()
+                ok &= not bad
+                print(f"{'✅' if not bad else '❌'} Selenium {url_code}: 与期望行逐页比对"
+                      f"{f', 不一致页: {bad}' if bad else ''}")
+    finally:
+        stop()
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="股吧 HTTP 抓取：本地替身服务器 / 与浏览器路径的一致性校验")
+    parser.add_argument('cmd', choices=['stub', 'verify'], nargs='?', default='verify')
+    parser.add_argument('--port', type=int, default=STUB_PORT)
+    parser.add_argument('--fixtures', default=STUB_FIXTURES, help="样本页目录")
+    parser.add_argument('--selenium', action='store_true', help="同时跑浏览器路径比对 (需要 selenium + Chrome/Edge)")
+    args = parser.parse_args()
+
+    if args.cmd == 'stub':
+        from aiohttp import web
+        print(f"🎞️ 替身股吧: http://127.0.0.1:{args.port} (样本目录 {args.fixtures})")
+        print(f"   python crawl --guba-base http://127.0.0.1:{args.port} ...")
+        web.run_app(make_stub_app(args.fixtures), host='127.0.0.1', port=args.port, print=None)
+    elif not verify(args.selenium, args.port, args.fixtures):
+        raise SystemExit(1)
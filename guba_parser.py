@@ -0,0 +1,113 @@
+import re
+from bs4 import BeautifulSoup
+import instrument
+import fast_html
+from fast_html import has_class, xpath
+
+# ===========================
+# 股吧列表页解析 (纯函数，浏览器/HTTP 两种抓取方式共用)
+# ===========================
+# 正则：只匹配 MM-DD
+DATE_PATTERN = re.compile(r'(0[1-9]|1[0-2])-(0[1-9]|[12]\d|3[01])')
+# 阅读数取文本里的第一串数字 ('万' 先换成 0000)
+NUM_PATTERN = re.compile(r'\d+')
+# 标题里带这些词的是官方公告/资讯，不算散户舆情
+SKIP_WORDS = ("公告", "资讯")
+
+# 预编译的 XPath：与 BeautifulSoup 版的 CSS 选择器逐条对应
+LIST_ITEMS = xpath(f"//*[{has_class('listitem')}]")  # soup.select('.listitem')
+TABLE_ROWS = xpath("//tr")  # soup.find_all('tr')
+TITLE_LINK = xpath(f".//a[ancestor::*[{has_class('l3')}]]")  # item.select_one('.l3 a')
+LINKS = xpath(".//a")  # item.find_all('a')
+
+# 'lxml' / 'bs4'；None 表示有 lxml 就用 lxml
+BACKEND = None
+
+
+def parse_guba_page(html, year, backend=None):
+    """
+    把一页股吧列表 HTML 解析成 [{'date', 'title', 'read_count'}, ...]
+    year 为 None 时 date 只保留 MM-DD (年份交给 page_locator 按页推断)
+    """
+    backend = backend or BACKEND or ('lxml' if fast_html.HAS_LXML else 'bs4')
+    with instrument.timer('guba.parse'):
+        rows = None
+        if backend == 'lxml':
+            try:
+                rows = _parse_lxml(html, year)
+            except Exception:
+                # 空页面 / 带编码声明的字符串等 lxml 不收的情况，交给 BeautifulSoup
+                instrument.count('guba.parse_fallback')
+        if rows is None:
+            rows = _parse_soup(html, year)
+    instrument.observe('guba.rows_per_page', len(rows))
+    return rows
+
+
+def _make_row(text, title, year):
+    """两种后端共用的字段提取：过滤公告、拼年份、取阅读数"""
+    title = title.strip()
+    if not title or any(w in title for w in SKIP_WORDS): return None
+
+    match = DATE_PATTERN.search(text)
+    if not match: return None
+
+    read_count = 0
+    num = NUM_PATTERN.search(text.replace('万', '0000'))
+    if num: read_count = int(num.group(0))
+
+    return {
+        'date': f"{year}-{match.group(0)}" if year else match.group(0),
+        'title': title,
+        'read_count': read_count
+    }
+
+
+def _parse_lxml(html, year):
+    root = fast_html.parse_document(html)
+    items = LIST_ITEMS(root)
+    if not items: items = TABLE_ROWS(root)
+
+    rows = []
+    for item in items:
+        text = fast_html.text(item).strip()
+
+        # 提取标题
+        found = TITLE_LINK(item)
+        title_tag = found[0] if found else None
+        if title_tag is None:
+            links = LINKS(item)
+            title_tag = max(links, key=lambda x: len(fast_html.text(x))) if links else None
+
+        title = title_tag.get('title') or fast_html.text(title_tag) if title_tag is not None else ""
+
+        row = _make_row(text, title, year)
+        if row: rows.append(row)
+
+    return rows
+
+
+def _parse_soup(html, year):
+    soup = BeautifulSoup(html, 'html.parser')
+    items = soup.select('.listitem')
+    if not items: items = soup.find_all('tr')
+
+    rows = []
+    for item in items:
+        try:
+            text = item.text.strip()
+
+            # 提取标题
+            title_tag = item.select_one('.l3 a')
+            if not title_tag:
+                links = item.find_all('a')
+                title_tag = max(links, key=lambda x: len(x.text)) if links else None
+
+            title = title_tag.get('title') or title_tag.text if title_tag else ""
+
+            row = _make_row(text, title, year)
+            if row: rows.append(row)
+        except:
+            continue
+
+    return rows
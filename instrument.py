@@ -0,0 +1,230 @@
+import os
+import io
+import json
+import time
+import random
+import atexit
+import pstats
+import cProfile
+import datetime
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+# ===========================
+# 1. 配置：轻量埋点 (计时器 / 计数器 / 直方图)
+# ===========================
+# 环境变量开关 (逗号分隔的阶段名，'all' 表示全部，前缀匹配：'nlp' 命中 'nlp.601127')
+#   PERF_PROFILE=nlp,processing   对这些阶段开 cProfile
+#   PERF_TRACEMALLOC=nlp          对这些阶段开 tracemalloc
+#   PERF=0                        退出时不打印摘要、不写 trace 文件
+PERF_DIR = os.environ.get('PERF_DIR', "./perf_traces")
+PROFILE_STAGES = [s for s in os.environ.get('PERF_PROFILE', '').split(',') if s]
+TRACEMALLOC_STAGES = [s for s in os.environ.get('PERF_TRACEMALLOC', '').split(',') if s]
+ENABLED = os.environ.get('PERF', '1') != '0'
+
+# 直方图最多保留的样本数 (超过后蓄水池抽样)，trace 最多保留的事件数
+MAX_SAMPLES = 10000
+MAX_EVENTS = 100000
+
+_LOCK = threading.Lock()
+_STATE = {'entry': None, 'wall_start': time.time(), 'perf_start': time.perf_counter(), 'profiling': False}
+COUNTERS = {}
+HISTOGRAMS = {}
+EVENTS = []
+MEMORY = {}
+
+
+class Histogram:
+    """记录次数/合计/极值，样本用蓄水池抽样估分位数"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.samples = []
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        if len(self.samples) < MAX_SAMPLES:
+            self.samples.append(value)
+        else:
+            i = random.randrange(self.count)
+            if i < MAX_SAMPLES: self.samples[i] = value
+
+    def merge(self, other):
+        """并入另一个进程导出的直方图 (snapshot(samples=True) 里的一项)"""
+        if not other['count']: return
+        self.count += other['count']
+        self.total += other['sum']
+        self.min = other['min'] if self.min is None else min(self.min, other['min'])
+        self.max = other['max'] if self.max is None else max(self.max, other['max'])
+        self.samples.extend(other.get('samples', []))
+        if len(self.samples) > MAX_SAMPLES: self.samples = random.sample(self.samples, MAX_SAMPLES)
+
+    def summary(self):
+        s = sorted(self.samples)
+        pick = lambda q: s[min(int(q * len(s)), len(s) - 1)] if s else None
+        return {'count': self.count, 'sum': self.total, 'mean': self.total / self.count if self.count else None,
+                'min': self.min, 'p50': pick(0.5), 'p95': pick(0.95), 'max': self.max}
+
+
+# ===========================
+# 2. 埋点接口 (线程安全，未 setup 时只记录不输出)
+# ===========================
+def count(name, n=1):
+    with _LOCK:
+        COUNTERS[name] = COUNTERS.get(name, 0) + n
+
+
+def observe(name, value):
+    with _LOCK:
+        HISTOGRAMS.setdefault(name, Histogram()).add(value)
+
+
+@contextmanager
+def timer(name):
+    """计时 (秒) 记进同名直方图，同时留一条 trace 事件"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        observe(name, end - start)
+        with _LOCK:
+            if len(EVENTS) < MAX_EVENTS:
+                EVENTS.append({'name': name, 'ph': 'X', 'pid': os.getpid(), 'tid': threading.get_ident(),
+                               'ts': (start - _STATE['perf_start']) * 1e6, 'dur': (end - start) * 1e6})
+
+
+def _selected(name, stages):
+    return any(s == 'all' or name == s or name.startswith(s + '.') for s in stages)
+
+
+@contextmanager
+def stage(name):
+    """
+    阶段计时 (记为 stage.<name>)；按环境变量对该阶段开 cProfile / tracemalloc
+    cProfile 只统计当前线程，嵌套阶段只有最外层生效
+    """
+    profiler = None
+    if _selected(name, PROFILE_STAGES) and not _STATE['profiling']:
+        profiler = cProfile.Profile()
+        _STATE['profiling'] = True
+        profiler.enable()
+
+    tracing = _selected(name, TRACEMALLOC_STAGES) and not tracemalloc.is_tracing()
+    if tracing: tracemalloc.start()
+
+    try:
+        with timer(f"stage.{name}"):
+            yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            _STATE['profiling'] = False
+            _dump_profile(profiler, name)
+        if tracing:
+            _record_memory(name)
+
+
+def _file_prefix():
+    if not os.path.exists(PERF_DIR): os.makedirs(PERF_DIR)
+    return f"{PERF_DIR}/{_STATE['entry'] or 'run'}"
+
+
+def _dump_profile(profiler, name):
+    path = f"{_file_prefix()}_{name}.prof"
+    profiler.dump_stats(path)
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(15)
+    print(f"\n🔬 [cProfile] {name} (完整结果: {path}，可用 snakeviz 打开)")
+    print(out.getvalue())
+
+
+def _record_memory(name):
+    _, peak = tracemalloc.get_traced_memory()
+    top = tracemalloc.take_snapshot().statistics('lineno')[:10]
+    tracemalloc.stop()
+    MEMORY[name] = {'peak_mb': peak / 1024 / 1024,
+                    'top': [{'where': str(s.traceback), 'size_mb': s.size / 1024 / 1024, 'count': s.count}
+                            for s in top]}
+    print(f"\n🧠 [tracemalloc] {name}: 峰值 {peak / 1024 / 1024:.1f} MB")
+    for item in MEMORY[name]['top'][:5]:
+        print(f"      {item['size_mb']:8.2f} MB  {item['where']}")
+
+
+# ===========================
+# 3. 退出时输出：摘要表 + JSON trace (可直接拖进 chrome://tracing / Perfetto)
+# ===========================
+def snapshot(samples=False):
+    """samples=True 时带上直方图样本 (子进程导出给父进程 merge 用)"""
+    with _LOCK:
+        return {
+            'entry': _STATE['entry'],
+            'start': datetime.datetime.fromtimestamp(_STATE['wall_start']).isoformat(timespec='seconds'),
+            'wall_sec': time.perf_counter() - _STATE['perf_start'],
+            'perf_start': _STATE['perf_start'],
+            'counters': dict(COUNTERS),
+            'histograms': {k: dict(h.summary(), samples=list(h.samples)) if samples else h.summary()
+                           for k, h in HISTOGRAMS.items()},
+            'tracemalloc': dict(MEMORY),
+            'traceEvents': list(EVENTS),
+        }
+
+
+def reset():
+    """清空已记录的埋点 (进程池子进程每个任务开始前调用，导出的就只是这个任务的增量)"""
+    with _LOCK:
+        COUNTERS.clear()
+        HISTOGRAMS.clear()
+        EVENTS.clear()
+        MEMORY.clear()
+
+
+def merge(snap):
+    """把子进程的 snapshot(samples=True) 并进本进程：计数相加、直方图合并、trace 事件换算到本进程的时间轴"""
+    # perf_counter 在同一台机器的各进程间是同一个单调时钟，差值就是两边起点的偏移
+    shift = (snap.get('perf_start', _STATE['perf_start']) - _STATE['perf_start']) * 1e6
+    with _LOCK:
+        for name, n in snap['counters'].items():
+            COUNTERS[name] = COUNTERS.get(name, 0) + n
+        for name, h in snap['histograms'].items():
+            HISTOGRAMS.setdefault(name, Histogram()).merge(h)
+        for event in snap['traceEvents'][:max(0, MAX_EVENTS - len(EVENTS))]:
+            EVENTS.append(dict(event, ts=event['ts'] + shift))
+        MEMORY.update(snap['tracemalloc'])
+
+
+def print_summary(snap=None):
+    snap = snap or snapshot()
+    print(f"\n📊 性能摘要 [{snap['entry']}] 总耗时 {snap['wall_sec']:.1f} 秒")
+    if snap['histograms']:
+        # 中文表头占两个字符宽，补齐时少填一半
+        print(f"   {'名称':<30}{'次数':>6}{'合计':>9}{'平均':>9}{'p50':>11}{'p95':>11}{'最大':>9}")
+        for name, h in sorted(snap['histograms'].items()):
+            print(f"   {name:<32}{h['count']:>8}{h['sum']:>11.3f}{h['mean']:>11.4f}"
+                  f"{h['p50']:>11.4f}{h['p95']:>11.4f}{h['max']:>11.4f}")
+    for name, n in sorted(snap['counters'].items()):
+        print(f"   # {name:<30}{n:>10}")
+
+
+def dump():
+    snap = snapshot()
+    path = f"{_file_prefix()}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(snap, f, ensure_ascii=False)
+    print_summary(snap)
+    print(f"   📄 trace: {path}")
+    return path
+
+
+def setup(entry):
+    """入口脚本调用一次：退出时自动打印摘要并写 trace"""
+    first = _STATE['entry'] is None
+    _STATE['entry'] = entry
+    if first and ENABLED: atexit.register(dump)
@@ -0,0 +1,302 @@
+import os
+import sys
+import json
+import time
+import datetime
+import argparse
+import tempfile
+import threading
+import concurrent.futures
+import pandas as pd
+import instrument
+
+# ===========================
+# 1. 配置：本地行情缓存
+# ===========================
+# 记录每个 (代码, 复权方式) 已经覆盖的日期区间，只补缺口
+STORE_DIR = "./real_data/market_cache"
+# 并发抓取的线程数 / 每秒请求上限 (AkShare 接口被刷太快会封 IP)
+MAX_WORKERS = 4
+RATE_PER_SEC = 2
+# 离线替身的行情样本：{symbol}.csv，列同真实数据源 (date + 价量 + 百分数 pctChg)
+MARKET_FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "market")
+
+PRICE_COLS = ['open', 'high', 'low', 'close', 'volume', 'pctChg']
+AK_RENAME = {'日期': 'date', '开盘': 'open', '收盘': 'close', '最高': 'high', '最低': 'low',
+             '成交量': 'volume', '涨跌幅': 'pctChg'}
+
+
+# ===========================
+# 2. 数据源 (可替换成测试用的离线替身)
+# ===========================
+def _ak_a(symbol, start, end, adjust):
+    import akshare as ak
+    df = ak.stock_zh_a_hist(symbol=symbol, period="daily", start_date=start.replace('-', ''),
+                            end_date=end.replace('-', ''), adjust=adjust)
+    return df.rename(columns=AK_RENAME)
+
+
+def _ak_hk(symbol, start, end, adjust):
+    import akshare as ak
+    df = ak.stock_hk_hist(symbol=symbol, start_date=start.replace('-', ''), end_date=end.replace('-', ''),
+                          adjust=adjust)
+    return df.rename(columns=AK_RENAME)
+
+
+def _bs_index(symbol, start, end, adjust):
+    import baostock as bs
+    lg = bs.login()
+    if lg.error_code != '0': raise RuntimeError(f"Baostock 登录失败: {lg.error_msg}")
+    try:
+        rs = bs.query_history_k_data_plus(symbol, "date,pctChg", start_date=start, end_date=end, frequency="d")
+        rows = []
+        while rs.next(): rows.append(rs.get_row_data())
+        df = pd.DataFrame(rows, columns=rs.fields)
+    finally:
+        bs.logout()
+    df['pctChg'] = df['pctChg'].replace('', 0)
+    return df
+
+
+# 市场类型 -> 抓取函数，统一签名 (symbol, 'YYYY-MM-DD', 'YYYY-MM-DD', adjust) -> DataFrame(date, ...)
+# 注意：pctChg 在这里仍是百分数，入库时统一转成小数
+PROVIDERS = {'A': _ak_a, 'HK': _ak_hk, 'INDEX': _bs_index}
+
+
+class FixtureProvider:
+    """离线替身：按 [start, end] 切样本 CSV 返回，签名同上；记下每次调用 (校验只补了缺口用)"""
+
+    def __init__(self, fixture_dir=MARKET_FIXTURES):
+        self.fixture_dir = fixture_dir
+        self.calls = []
+
+    def __call__(self, symbol, start, end, adjust):
+        self.calls.append((symbol, start, end))
+        path = os.path.join(self.fixture_dir, f"{symbol}.csv")
+        if not os.path.exists(path): raise FileNotFoundError(f"没有行情样本: {path}")
+        df = pd.read_csv(path, dtype={'date': str})
+        return df[(df['date'] >= start) & (df['date'] <= end)].reset_index(drop=True)
+
+
+def fixture_providers(fixture_dir=MARKET_FIXTURES):
+    """所有市场共用一个样本替身 (样本已是复权后的价格，adjust 忽略)"""
+    provider = FixtureProvider(fixture_dir)
+    return {market: provider for market in PROVIDERS}
+
+
+class RateLimiter:
+    """线程安全的令牌桶：所有抓取线程共享"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self.next_time = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if delay > 0: time.sleep(delay)
+
+
+# ===========================
+# 3. 区间工具
+# ===========================
+def _day(s):
+    return pd.Timestamp(s).normalize()
+
+
+def merge_ranges(ranges):
+    """合并重叠/相邻的 [start, end] 日期区间"""
+    out = []
+    for s, e in sorted((_day(s), _day(e)) for s, e in ranges):
+        if out and s <= out[-1][1] + pd.Timedelta(days=1):
+            out[-1][1] = max(out[-1][1], e)
+        else:
+            out.append([s, e])
+    return out
+
+
+def missing_ranges(covered, start, end):
+    """[start, end] 中还没被 covered 覆盖的缺口"""
+    gaps = []
+    cur = _day(start)
+    end = _day(end)
+    for s, e in merge_ranges(covered):
+        if e < cur: continue
+        if s > end: break
+        if s > cur: gaps.append((cur, s - pd.Timedelta(days=1)))
+        cur = max(cur, e + pd.Timedelta(days=1))
+    if cur <= end: gaps.append((cur, end))
+    return gaps
+
+
+# ===========================
+# 4. 行情仓库
+# ===========================
+class MarketStore:
+    def __init__(self, root=STORE_DIR, providers=None, offline=False, rate=RATE_PER_SEC):
+        self.root = root
+        if not os.path.exists(root): os.makedirs(root)
+        self.providers = providers or PROVIDERS
+        self.offline = offline
+        self.limiter = RateLimiter(rate)
+        self.manifest_path = os.path.join(root, "manifest.json")
+        self.lock = threading.Lock()
+        self.key_locks = {}
+
+        self.manifest = {}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, encoding='utf-8') as f:
+                self.manifest = json.load(f)
+
+    def _key(self, symbol, adjust):
+        return f"{symbol}|{adjust}"
+
+    def _path(self, symbol, adjust):
+        return os.path.join(self.root, f"{symbol}_{adjust}.parquet")
+
+    def _save_manifest(self):
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, indent=1)
+        os.replace(tmp, self.manifest_path)
+
+    def _load_rows(self, symbol, adjust):
+        path = self._path(symbol, adjust)
+        return pd.read_parquet(path) if os.path.exists(path) else pd.DataFrame()
+
+    @staticmethod
+    def _normalize(df):
+        if df is None or df.empty: return pd.DataFrame()
+        df = df.copy()
+        df['date'] = pd.to_datetime(df['date'])
+        for c in PRICE_COLS:
+            if c in df.columns: df[c] = pd.to_numeric(df[c], errors='coerce')
+        df['pctChg'] = df['pctChg'] / 100
+        return df[['date'] + [c for c in PRICE_COLS if c in df.columns]].set_index('date')
+
+    def get(self, symbol, market, start, end, adjust='hfq'):
+        """返回 [start, end] 的日线 (date 索引)；缺的区间先补抓再返回"""
+        key = self._key(symbol, adjust)
+        with self.lock:
+            key_lock = self.key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            covered = self.manifest.get(key, [])
+            gaps = missing_ranges(covered, start, end)
+            rows = self._load_rows(symbol, adjust)
+
+            if gaps and self.offline:
+                print(f"      📴 [离线] {symbol} 缺 {len(gaps)} 段数据，只返回缓存部分")
+            elif gaps:
+                fresh = []
+                for g_start, g_end in gaps:
+                    self.limiter.wait()
+                    print(f"      🌐 补抓 {symbol} ({adjust}) {g_start.date()} ~ {g_end.date()}")
+                    with instrument.timer('market.fetch'):
+                        fresh.append(self._normalize(
+                            self.providers[market](symbol, str(g_start.date()), str(g_end.date()), adjust)))
+
+                parts = [p for p in [rows] + fresh if not p.empty]
+                if parts:
+                    rows = pd.concat(parts)
+                    rows = rows[~rows.index.duplicated(keep='last')].sort_index()
+                    rows.to_parquet(self._path(symbol, adjust))
+
+                # 今天的行情可能还没收盘，覆盖区间只记到昨天，下次会重抓今天
+                yesterday = _day(datetime.date.today()) - pd.Timedelta(days=1)
+                done = [(s, min(e, yesterday)) for s, e in gaps if s <= yesterday]
+                with self.lock:
+                    self.manifest[key] = [[str(s.date()), str(e.date())] for s, e in merge_ranges(covered + done)]
+                    self._save_manifest()
+            else:
+                print(f"      📦 命中缓存 {symbol} ({adjust})")
+                instrument.count('market.cache_hit')
+
+        if rows.empty: return rows
+        return rows.loc[_day(start):_day(end)]
+
+    def get_many(self, jobs, max_workers=MAX_WORKERS):
+        """
+        并发获取多只股票：jobs 为 {name: (symbol, market, start, end, adjust)}
+        返回 {name: DataFrame 或 Exception}
+        """
+        results = {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(self.get, *args): name for name, args in jobs.items()}
+            for future in concurrent.futures.as_completed(futures):
+                name = futures[future]
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    results[name] = e
+        return results
+
+
+# ===========================
+# 5. 离线校验 (样本替身代替 AkShare / Baostock)
+# ===========================
+def _expected(fixture_dir, symbol, start, end):
+    df = MarketStore._normalize(pd.read_csv(os.path.join(fixture_dir, f"{symbol}.csv")))
+    return df.loc[_day(start):_day(end)]
+
+
+def verify(fixture_dir=MARKET_FIXTURES):
+    """
+    在临时目录里对着样本替身跑一遍仓库，检查：
+    - 首次取数 / 扩大区间只补缺口 / 重复取数命中缓存，返回的行都和样本切片一致
+    - offline=True 时一次都不调数据源，只返回已缓存的部分
+    - get_many 并发取多只 (含指数) 结果与样本一致
+    """
+    ok = True
+
+    def check(name, cond, detail=''):
+        nonlocal ok
+        ok &= bool(cond)
+        print(f"{'✅' if cond else '❌'} {name}{f' ({detail})' if detail else ''}")
+
+    def same(got, symbol, start, end):
+        want = _expected(fixture_dir, symbol, start, end)
+        return not want.empty and got.shape == want.shape and (got - want).abs().max().max() < 1e-9
+
+    with tempfile.TemporaryDirectory() as tmp:
+        providers = fixture_providers(fixture_dir)
+        calls = providers['A'].calls
+        store = MarketStore(root=tmp, providers=providers, rate=0)
+
+        got = store.get('601127', 'A', '2023-08-01', '2023-10-31')
+        check("首次取数", len(calls) == 1 and same(got, '601127', '2023-08-01', '2023-10-31'), f"{len(got)} 行")
+
+        got = store.get('601127', 'A', '2023-07-01', '2023-12-31')
+        gaps = [(s, e) for _, s, e in calls[1:]]
+        check("扩大区间只补两头缺口", gaps == [('2023-07-01', '2023-07-31'), ('2023-11-01', '2023-12-31')]
+              and same(got, '601127', '2023-07-01', '2023-12-31'), f"补抓 {gaps}")
+
+        n = len(calls)
+        got = store.get('601127', 'A', '2023-09-01', '2023-09-30')
+        check("子区间命中缓存", len(calls) == n and same(got, '601127', '2023-09-01', '2023-09-30'))
+
+        offline = MarketStore(root=tmp, providers=fixture_providers(fixture_dir), offline=True)
+        got = offline.get('601127', 'A', '2023-06-01', '2024-01-31')
+        check("离线只读缓存", not offline.providers['A'].calls and same(got, '601127', '2023-07-01', '2023-12-31'),
+              f"{len(got)} 行")
+
+        jobs = {'601127': ('601127', 'A', '2023-06-01', '2024-01-31', 'hfq'),
+                '01810': ('01810', 'HK', '2024-02-01', '2024-05-31', 'hfq'),
+                'bench': ('sh.000300', 'INDEX', '2023-06-01', '2024-01-31', 'none')}
+        results = store.get_many(jobs)
+        bad = [name for name, (symbol, _, start, end, _) in jobs.items()
+               if isinstance(results[name], Exception) or not same(results[name], symbol, start, end)]
+        check("并发取多只", not bad, f"不一致: {bad}" if bad else f"{len(jobs)} 只")
+
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本地行情缓存：用样本替身离线校验")
+    parser.add_argument('cmd', choices=['verify'])
+    parser.add_argument('--fixtures', default=MARKET_FIXTURES, help="行情样本目录")
+    args = parser.parse_args()
+    if not verify(args.fixtures): sys.exit(1)
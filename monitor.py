@@ -0,0 +1,677 @@
+import os
+import io
+import csv
+import json
+import time
+import asyncio
+import random
+import hashlib
+import argparse
+import tempfile
+import datetime
+from collections import OrderedDict
+from urllib.parse import quote
+import numpy as np
+import pandas as pd
+import aiohttp
+from guba_http import BASE_URL as GUBA_BASE, TokenBucket, fetch_page, fetch_pages, HEADERS, TIMEOUT_SEC
+from bili_parser import parse_bili_cards
+from sentiment_engine import batch_sentiment
+from nlp_cache import NLPCache
+from data_lake import LAKE_DIR, has_frame, load_frame, upsert_frame
+from trade_calendar import align_to_trade_days, aggregate_to_trade_days
+from page_locator import with_years
+from parse_bench import FIXTURE_DIR, load_fixtures
+from script_loader import load_script
+import universe
+import instrument
+
+# ===========================
+# 1. 配置：实时监控 (只盯最新几页，增量更新日度表和 meme_heat)
+# ===========================
+REAL_DIR = "./real_data"
+STATE_DIR = f"{REAL_DIR}/live"
+if not os.path.exists(STATE_DIR): os.makedirs(STATE_DIR)
+
+# 股吧只轮询前几页 (新帖都在最前面)，B站按发布时间排序只看第一页
+GUBA_PAGES = 3
+BILI_BASE = "https://search.bilibili.com"
+# 轮询间隔 (秒)
+INTERVAL = 60
+# 只维护最近几天的日度累计量 (今天 + 昨天)，更早的帖子算历史，交给批处理
+WINDOW_DAYS = 2
+# 每个平台最多记住这么多条帖子的上次阅读数/播放量 (超出按最久未见淘汰)，内存不随运行时长增长
+MAX_SEEN = 5000
+# 读 CSV 尾部时每次往回读的字节数 (不够再翻倍)；按行切块，字段里可以有引号和逗号，但不能有换行
+TAIL_BLOCK = 8192
+# 本地替身服务器默认端口
+REPLAY_PORT = 8765
+# 增量 vs 批处理 校验的随机种子
+VERIFY_SEED = 7
+
+DAILY_COLUMNS = {
+    'sentiment': ['date', 'sentiment', 'read_count', 'weighted_score_raw', 'weighted_score', 'n'],
+    'bilibili': ['date', 'bili_buzz', 'sentiment', 'video_num'],
+    'final': ['date', 'total_buzz', 'guba_buzz', 'bili_buzz', 'cum_factor', 'meme_heat'],
+}
+
+
+# ===========================
+# 2. CSV 尾部读写 (每轮只动最后几行，不重写历史)
+# ===========================
+def _num(text, default=0.0):
+    try:
+        return float(text) if text not in ('', None) else default
+    except ValueError:
+        return default
+
+
+def _split(line):
+    """一行 CSV (bytes) -> 字段列表，带引号的字段 (里面有逗号) 按 csv 规则拆"""
+    return next(csv.reader([line.decode('utf-8').rstrip('\r\n')]))
+
+
+def _join(rows, newline):
+    out = io.StringIO()
+    csv.writer(out, lineterminator=newline).writerows(rows)
+    return out.getvalue()
+
+
+def read_tail(path, since):
+    """
+    从文件尾部往回读，直到碰到 since 之前的一行
+    返回 (表头, 换行符, since 及之后各行的起始偏移, since 及之后的行 [dict], since 之前的最后一行 [dict 或 None])
+    """
+    with open(path, 'rb') as f:
+        head = f.readline()
+        newline = b'\r\n' if head.endswith(b'\r\n') else b'\n'
+        header = _split(head)
+        body = f.tell()
+        end = f.seek(0, 2)
+        block = TAIL_BLOCK
+        while True:
+            start = max(body, end - block)
+            f.seek(start)
+            data = f.read(end - start)
+            # 不是从正文开头读的，第一行可能不完整，跳过
+            skip = 0 if start == body else data.find(b'\n') + 1
+            if start > body and skip == 0:
+                block *= 2
+                continue
+
+            pos, cut, rows, prev, first_date = start + skip, end, [], None, None
+            for line in data[skip:].splitlines(keepends=True):
+                if line.strip():
+                    row = dict(zip(header, _split(line)))
+                    day = row[header[0]][:10]
+                    if first_date is None: first_date = day
+                    if day >= since:
+                        if not rows: cut = pos
+                        rows.append(row)
+                    else:
+                        prev = row
+                pos += len(line)
+
+            if start == body or (first_date is not None and first_date < since):
+                return header, newline.decode(), cut, rows, prev
+            block *= 2
+
+
+def upsert_tail(path, rows, columns):
+    """
+    rows: {date: {列: 值}}，按日期覆盖 / 追加到 CSV 末尾；已有行里 rows 没给的列 (如行情) 原样保留
+    只截断并重写 min(date) 之后的几行
+    """
+    if not rows: return
+    since = min(rows)
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        header, newline, cut, old = columns, os.linesep, None, []
+    else:
+        header, newline, cut, old, _ = read_tail(path, since)
+
+    merged = {r[header[0]][:10]: r for r in old}
+    for day, values in rows.items():
+        row = merged.setdefault(day, {header[0]: day})
+        row.update({k: v for k, v in values.items() if k in header})
+
+    text = _join(([merged[day].get(c) for c in header] for day in sorted(merged)), newline)
+
+    if cut is None:
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            f.write(_join([header], newline) + text)
+    else:
+        with open(path, 'r+b') as f:
+            f.truncate(cut)
+            f.seek(cut)
+            f.write(text.encode('utf-8'))
+
+
+def stored_rows(path, since):
+    """(since 及之后的已存行 {date: row}, since 之前的最后一行)"""
+    if not os.path.exists(path) or os.path.getsize(path) == 0: return {}, None
+    header, _, _, rows, prev = read_tail(path, since)
+    return {r[header[0]][:10]: r for r in rows}, prev
+
+
+def first_row(path):
+    """正文第一行 (meme_heat 归一化的起点)"""
+    if not os.path.exists(path): return None
+    with open(path, 'rb') as f:
+        header = _split(f.readline())
+        line = f.readline()
+    return dict(zip(header, _split(line))) if line.strip() else None
+
+
+# ===========================
+# 3. 单只股票的滚动状态
+# ===========================
+def post_key(*parts):
+    return hashlib.blake2b('|'.join(parts).encode('utf-8'), digest_size=8).hexdigest()
+
+
+def load_calendar(code, real_dir=REAL_DIR, lake=LAKE_DIR):
+    """交易日历 = 这只股票的行情索引 (processing 对齐用的同一份，A股/港股假期各自不同)；还没有行情时为空"""
+    path = f"{real_dir}/market_{code}.csv"
+    if has_frame('market', code, root=lake):
+        days = load_frame('market', code, columns=['close'], root=lake).index
+    elif os.path.exists(path):
+        days = pd.read_csv(path, index_col=0, usecols=[0]).index
+    else:
+        return pd.DatetimeIndex([])
+    return pd.DatetimeIndex(pd.to_datetime(days, errors='coerce')).dropna()
+
+
+def trade_day(day, calendar=()):
+    """
+    帖子日期 -> 当天或之后的第一个交易日，与批处理同一个函数 (trade_calendar.align_to_trade_days)
+    行情还没覆盖到的日期 (通常是今天) 只能先按工作日顺延，行情更新后重跑批处理会按真实日历对齐
+    """
+    if len(calendar):
+        aligned = align_to_trade_days([day], calendar)[0]
+        if not pd.isna(aligned): return aligned.strftime('%Y-%m-%d')
+    return str(np.busday_offset(np.datetime64(day, 'D'), 0, roll='forward'))
+
+
+class SeenPosts:
+    """有界的已见帖子表：键 -> (上次阅读数/播放量, 情感分)，超出容量淘汰最久没再出现的"""
+
+    def __init__(self, items=(), capacity=MAX_SEEN):
+        self.capacity = capacity
+        self.items = OrderedDict((k, tuple(v)) for k, v in items)
+
+    def get(self, key):
+        value = self.items.get(key)
+        if value is not None: self.items.move_to_end(key)
+        return value
+
+    def put(self, key, value, score):
+        self.items[key] = (value, score)
+        self.items.move_to_end(key)
+        while len(self.items) > self.capacity: self.items.popitem(last=False)
+
+    def __len__(self):
+        return len(self.items)
+
+
+class LiveStock:
+    """
+    一只股票的增量状态，每轮开销只与轮询页数有关
+    - guba / bili: 窗口内每天的累计量 (条数、情感和、热度和)，与 nlp / bilibili_nlp 的日度表一一对应
+    - final: 窗口内每个交易日的热度，以及窗口之前的累计值 base_cum
+    已存在于输出文件里的日期第一次被盯上时，从文件里读回累计量，并把这一轮看到的帖子只记作基线 (不重复计数)
+    """
+
+    def __init__(self, code, state_dir=STATE_DIR, real_dir=REAL_DIR, lake=LAKE_DIR):
+        self.code = code
+        self.real_dir = real_dir
+        self.lake = lake
+        # 交易日历启动时读一次 (运行中换日历会让已经按旧日历归好的交易日对不上)
+        self.calendar = load_calendar(code, real_dir, lake)
+        self.state_path = f"{state_dir}/state_{code}.json"
+        state = {}
+        if os.path.exists(self.state_path):
+            with open(self.state_path, encoding='utf-8') as f:
+                state = json.load(f)
+        self.seen = {kind: SeenPosts(state.get(f'seen_{kind}', [])) for kind in ('guba', 'bili')}
+        self.days = {kind: state.get(kind, {}) for kind in ('guba', 'bili')}
+        self.final = state.get('final', {})
+        self.base_cum = state.get('base_cum')
+        self.scale = state.get('scale')
+        self.baseline = {'guba': set(), 'bili': set()}
+
+    def path(self, dataset):
+        return f"{self.real_dir}/{dataset}_{self.code}.csv"
+
+    def trade_day(self, day):
+        return trade_day(day, self.calendar)
+
+    def save(self):
+        state = {f'seen_{kind}': [[k, list(v)] for k, v in seen.items.items()] for kind, seen in self.seen.items()}
+        state.update(self.days)
+        state.update({'final': self.final, 'base_cum': self.base_cum, 'scale': self.scale})
+        tmp = self.state_path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp, self.state_path)
+
+    # ---------- 窗口维护 ----------
+    def roll(self, start):
+        """滑出窗口的日期不再维护；滑出的交易日热度并入 base_cum"""
+        for kind in ('guba', 'bili'):
+            for day in [d for d in self.days[kind] if d < start]: del self.days[kind][day]
+        for day in sorted(d for d in self.final if d < self.trade_day(start)):
+            acc = self.final.pop(day)
+            self.base_cum = (self.base_cum or 0) + acc['guba_buzz'] + acc['bili_buzz']
+
+    def open_day(self, kind, day):
+        if day in self.days[kind]: return self.days[kind][day]
+        dataset = 'sentiment' if kind == 'guba' else 'bilibili'
+        row = stored_rows(self.path(dataset), day)[0].get(day)
+        if kind == 'guba':
+            acc = {'n': 0, 'sentiment_sum': 0.0, 'read_count': 0, 'weighted_score_raw': 0.0}
+            if row:
+                # 老版本日度表没有 n 列：条数按 0 起算，实时新帖进来之前沿用已存的日均情感
+                acc['n'] = int(_num(row.get('n')))
+                acc['sentiment'] = _num(row.get('sentiment'), None)
+                acc['sentiment_sum'] = _num(row.get('sentiment')) * acc['n']
+                acc['read_count'] = int(_num(row.get('read_count')))
+                acc['weighted_score_raw'] = _num(row.get('weighted_score_raw'))
+        else:
+            acc = {'n': 0, 'sentiment_sum': 0.0, 'bili_buzz': 0}
+            if row:
+                acc['n'] = int(_num(row.get('video_num')))
+                acc['sentiment_sum'] = _num(row.get('sentiment')) * acc['n']
+                acc['bili_buzz'] = int(_num(row.get('bili_buzz')))
+        if row: self.baseline[kind].add(day)
+        self.days[kind][day] = acc
+        return acc
+
+    def open_trade_day(self, day):
+        if day in self.final: return self.final[day]
+        path = self.path('final')
+        rows, prev = stored_rows(path, day)
+        row = rows.get(day)
+        acc = {'guba_buzz': _num(row.get('guba_buzz')) if row else 0.0,
+               'bili_buzz': _num(row.get('bili_buzz')) if row else 0.0}
+        if self.base_cum is None:
+            self.base_cum = _num(prev.get('cum_factor')) if prev else 0.0
+        if self.scale is None:
+            # 沿用批处理时的归一化尺度 (历史首日 ~ 历史最高)，实时值超过 1 表示热度已超过整段历史
+            first = first_row(path)
+            low = _num(first.get('cum_factor')) if first else 0.0
+            self.scale = [low, self.base_cum - low if self.base_cum > low else None]
+        self.final[day] = acc
+        return acc
+
+    # ---------- 增量更新 ----------
+    def update(self, kind, posts, cache):
+        """
+        posts: [(日期, 标题, 当前阅读数/B站热度)]
+        新帖打分后计入；见过的帖子只把热度的增量计入 (不重新打分)
+        返回新帖条数
+        """
+        seen = self.seen[kind]
+        # 同一帖子这一轮可能在相邻页 / 多个关键词下重复出现，只留热度最高的一次
+        latest = {}
+        for day, title, value in posts:
+            key = post_key(day, title)
+            if key not in latest or value > latest[key][2]: latest[key] = (day, title, value)
+
+        fresh, deltas = [], []
+        for key, (day, title, value) in latest.items():
+            old = seen.get(key)
+            if old is None:
+                fresh.append((key, day, title, value))
+            elif value > old[0]:
+                deltas.append((day, value - old[0], old[1]))
+                seen.put(key, value, old[1])
+
+        scores = batch_sentiment([t for _, _, t, _ in fresh], cache=cache, label=f"{kind} 新帖打分") if fresh else []
+        for (key, day, title, value), score in zip(fresh, scores):
+            seen.put(key, value, score)
+            acc = self.open_day(kind, day)
+            if day in self.baseline[kind]: continue
+            acc['n'] += 1
+            acc['sentiment_sum'] += score
+            self._add(kind, acc, day, value, score, new=True)
+
+        for day, delta, score in deltas:
+            self._add(kind, self.open_day(kind, day), day, delta, score, new=False)
+        return len(fresh)
+
+    def _add(self, kind, acc, day, value, score, new):
+        if kind == 'guba':
+            acc['read_count'] += value
+            # 与 nlp 一致：每帖加权分 = 情感 * (阅读数 + 1)，阅读数增长只补增量部分
+            acc['weighted_score_raw'] += score * (value + 1 if new else value)
+        else:
+            acc['bili_buzz'] += value
+        self.open_trade_day(self.trade_day(day))[f'{kind}_buzz'] += value
+
+    def end_tick(self):
+        self.baseline = {'guba': set(), 'bili': set()}
+
+    # ---------- 落盘 ----------
+    def frames(self):
+        sentiment = {}
+        for day, acc in self.days['guba'].items():
+            sentiment[day] = {
+                'sentiment': acc['sentiment_sum'] / acc['n'] if acc['n'] else acc.get('sentiment'),
+                'read_count': acc['read_count'],
+                'weighted_score_raw': acc['weighted_score_raw'],
+                'weighted_score': acc['weighted_score_raw'] / (acc['read_count'] + 1),
+                'n': acc['n'],
+            }
+        bili = {day: {'bili_buzz': acc['bili_buzz'],
+                      'sentiment': acc['sentiment_sum'] / acc['n'] if acc['n'] else None,
+                      'video_num': acc['n']}
+                for day, acc in self.days['bili'].items()}
+
+        final = {}
+        cum = self.base_cum or 0.0
+        for day in sorted(self.final):
+            acc = self.final[day]
+            total = acc['guba_buzz'] + acc['bili_buzz']
+            cum += total
+            low, denom = self.scale
+            if not denom and cum > low: self.scale[1] = denom = cum - low
+            final[day] = {'total_buzz': total, 'guba_buzz': acc['guba_buzz'], 'bili_buzz': acc['bili_buzz'],
+                          'cum_factor': cum, 'meme_heat': (cum - low) / denom if denom else 0.0}
+        return {'sentiment': sentiment, 'bilibili': bili, 'final': final}
+
+    def flush(self):
+        for dataset, rows in self.frames().items():
+            if not rows: continue
+            path = self.path(dataset)
+            upsert_tail(path, rows, DAILY_COLUMNS[dataset])
+            if has_frame(dataset, self.code, root=self.lake):
+                # 数据湖里也只重写当月分区 (下游优先读数据湖)；用合并后的整行，行情等列不会被清空
+                merged = stored_rows(path, min(rows))[0]
+                upsert_frame(pd.DataFrame(list(merged.values())), dataset, self.code, root=self.lake)
+        self.save()
+
+
+# ===========================
+# 4. 抓取 (股吧前几页 + B站最新视频)
+# ===========================
+async def fetch_bili(keywords, base_url=BILI_BASE):
+    """按发布时间排序搜索每个关键词第一页，返回解析后的卡片行"""
+    bucket = TokenBucket(2, 2)
+    timeout = aiohttp.ClientTimeout(total=TIMEOUT_SEC)
+    rows = []
+    async with aiohttp.ClientSession(timeout=timeout, headers=HEADERS) as session:
+        async def one(keyword):
+            url = f"{base_url}/all?keyword={quote(keyword)}&order=pubdate"
+            try:
+                return parse_bili_cards(await fetch_page(session, bucket, url), keyword)
+            except Exception as e:
+                print(f"   ❌ B站 [{keyword}] 失败: {type(e).__name__} {e}")
+                return []
+
+        for found in await asyncio.gather(*(one(k) for k in keywords)):
+            rows.extend(found)
+    return rows
+
+
+def guba_posts(pages, today):
+    """
+    股吧列表只有 MM-DD：和 page_locator 一样按页从新到旧推年份
+    (第 1 页不晚于今天，后一页不晚于前一页最早一帖；跨年、置顶老帖、02-29 都能落对)
+    """
+    rows = with_years([pages[p] or [] for p in sorted(pages)], today)
+    return [(row['date'], row['title'], int(row['read_count'])) for row in rows]
+
+
+def bili_posts(rows):
+    bili_nlp = load_script('bilibili_nlp')
+    posts = []
+    for row in rows:
+        day = bili_nlp.clean_date(row['raw_date'])
+        if not day: continue
+        # 与 bilibili_nlp 一致：B站热度 = 播放 + 弹幕 * 10
+        buzz = bili_nlp.clean_count(row['raw_views']) + bili_nlp.clean_count(row['raw_danmaku']) * 10
+        posts.append((day, row['title'], buzz))
+    return posts
+
+
+# ===========================
+# 5. 主循环
+# ===========================
+def apply_tick(live, guba, bili, today, cache):
+    """把一轮看到的帖子 [(日期, 标题, 热度)] 计入滚动状态并落盘，返回各平台新帖数"""
+    start = str(datetime.date.fromisoformat(today) - datetime.timedelta(days=WINDOW_DAYS - 1))
+    live.roll(start)
+    # 窗口内的交易日按时间顺序先建好，base_cum 才落在最早那天之前
+    for day in pd.date_range(start, today).strftime('%Y-%m-%d'): live.open_trade_day(live.trade_day(day))
+    new = {}
+    for kind, posts in (('guba', guba), ('bili', bili)):
+        # 窗口之前的帖子属于历史，由批处理负责
+        posts = [p for p in posts if start <= p[0] <= today]
+        new[kind] = live.update(kind, posts, cache)
+    live.end_tick()
+    live.flush()
+    return new
+
+
+async def tick(live, conf, cache, guba_base=GUBA_BASE, bili_base=BILI_BASE, pages=GUBA_PAGES):
+    today = datetime.date.today()
+    guba_pages, bili_rows = await asyncio.gather(
+        fetch_pages(conf['url_code'], range(1, pages + 1), None, base_url=guba_base),
+        fetch_bili(conf['keywords'], bili_base))
+    return apply_tick(live, guba_posts(guba_pages, today), bili_posts(bili_rows), str(today), cache)
+
+
+def run(codes=None, interval=INTERVAL, once=False, guba_base=GUBA_BASE, bili_base=BILI_BASE, pages=GUBA_PAGES):
+    # 股吧代码 / B站关键词来自 universe.csv
+    targets = universe.select(codes)
+    print(f"🛰️ 实时监控启动: {', '.join(conf['name'] for conf in targets.values())}"
+          f" | 股吧前 {pages} 页 + B站最新 | 每 {interval} 秒一轮")
+    cache = NLPCache()
+    lives = {code: LiveStock(code) for code in targets}
+    n_tick = 0
+    try:
+        while True:
+            n_tick += 1
+            started = time.monotonic()
+            for code, conf in targets.items():
+                live = lives[code]
+                with instrument.timer('live.tick'):
+                    new = asyncio.run(tick(live, conf, cache, guba_base, bili_base, pages))
+                instrument.count('live.new_posts', new['guba'] + new['bili'])
+                row = live.frames()['final']
+                heat = row[max(row)]['meme_heat'] if row else 0.0
+                print(f"   📡 [{n_tick}] {conf['name']}: 股吧新帖 {new['guba']} | B站新视频 {new['bili']}"
+                      f" | meme_heat {heat:.3f} | 已见 {len(live.seen['guba'])}/{len(live.seen['bili'])}")
+            if once: break
+            time.sleep(max(0.0, interval - (time.monotonic() - started)))
+    except KeyboardInterrupt:
+        print("\n🛑 已停止监控")
+    finally:
+        cache.close()
+
+
+# ===========================
+# 6. 本地替身服务器：回放录下来的页面 (测试用)
+# ===========================
+def make_replay_app(fixture_dir=FIXTURE_DIR):
+    """
+    /list,{url_code}_{page}.html -> guba/ 下同名样本 (crawl --save-html 录的)，没有就按请求次数轮换所有股吧样本
+    /all?keyword=...             -> 按请求次数轮换 bili/ 下的样本
+    每次请求换下一份样本，模拟列表页随时间更新
+    """
+    from aiohttp import web
+    pages = {kind: load_fixtures(kind, fixture_dir) for kind in ('guba', 'bili')}
+    hits = {}
+
+    def pick(kind, path, exact=None):
+        named = dict(pages[kind])
+        if exact and f"{exact}.html" in named: return named[f"{exact}.html"]
+        if not pages[kind]: return None
+        hits[path] = hits.get(path, 0) + 1
+        return pages[kind][(hits[path] - 1) % len(pages[kind])][1]
+
+    async def guba(request):
+        html = pick('guba', request.path, request.match_info['name'])
+        if html is None: raise web.HTTPNotFound()
+        return web.Response(text=html, content_type='text/html')
+
+    async def bili(request):
+        html = pick('bili', request.path_qs)
+        if html is None: raise web.HTTPNotFound()
+        return web.Response(text=html, content_type='text/html')
+
+    app = web.Application()
+    app.router.add_get('/list,{name}.html', guba)
+    app.router.add_get('/all', bili)
+    return app
+
+
+def replay(port=REPLAY_PORT, fixture_dir=FIXTURE_DIR):
+    from aiohttp import web
+    print(f"🎞️ 回放服务器: http://127.0.0.1:{port} (样本目录 {fixture_dir})")
+    print(f"   python monitor.py --guba-base http://127.0.0.1:{port} --bili-base http://127.0.0.1:{port}")
+    web.run_app(make_replay_app(fixture_dir), host='127.0.0.1', port=port, print=None)
+
+
+# ===========================
+# 7. 校验：实时增量 == 整批重算
+# ===========================
+VERIFY_WORDS = ['遥遥领先', '利好', '大涨', '跌停', '割肉', '看好', '垃圾', '起飞', '套牢', '稳了', '出货', '抄底']
+
+
+def _simulate(days, ticks, seed):
+    """
+    合成帖子流：每轮每个平台冒出几条新帖；窗口内 (今天、昨天) 的帖子每轮热度上涨，滑出窗口后不再变
+    (实时本来就只维护窗口内的日期)。每轮的列表页里还混着几天前的老帖和相邻页重复出现的帖子
+    返回 ([(today, guba 帖子, bili 帖子)], 所有帖子的最终状态)
+    """
+    rng = random.Random(seed)
+    posts = {'guba': {}, 'bili': {}}
+    rounds = []
+    for i, today in enumerate(days):
+        window = days[max(0, i - WINDOW_DAYS + 1):i + 1]
+        oldest = str(datetime.date.fromisoformat(today) - datetime.timedelta(days=4))
+        for _ in range(ticks):
+            shown = {}
+            for kind, table in posts.items():
+                for _ in range(rng.randint(0, 4)):
+                    title = f"{''.join(rng.sample(VERIFY_WORDS, 2))} {kind}{len(table)}"
+                    table[title] = [today, title, rng.randint(0, 500)]
+                rows = []
+                for post in table.values():
+                    if post[0] in window:
+                        post[2] += rng.randint(0, 300)
+                        rows.append(tuple(post))
+                    elif post[0] >= oldest and rng.random() < 0.5:
+                        rows.append(tuple(post))
+                rows += [(day, title, max(0, value - 10)) for day, title, value in rng.sample(rows, min(3, len(rows)))]
+                rng.shuffle(rows)
+                shown[kind] = rows
+            rounds.append((today, shown['guba'], shown['bili']))
+    return rounds, posts
+
+
+def _batch(posts, calendar):
+    """按 nlp / bilibili_nlp / processing 的口径，从帖子最终状态整批重算日度表和 final"""
+    def frame(kind):
+        df = pd.DataFrame(list(posts[kind].values()), columns=['date', 'title', 'value'])
+        df['sentiment'] = batch_sentiment(df['title'].tolist(), label=f"整批 {kind} 打分")
+        return df
+
+    g = frame('guba')
+    g['weighted_score_raw'] = g['sentiment'] * (g['value'] + 1)
+    sentiment = g.groupby('date').agg(sentiment=('sentiment', 'mean'), read_count=('value', 'sum'),
+                                      weighted_score_raw=('weighted_score_raw', 'sum'), n=('title', 'size'))
+    sentiment['weighted_score'] = sentiment['weighted_score_raw'] / (sentiment['read_count'] + 1)
+    b = frame('bili')
+    bili = b.groupby('date').agg(bili_buzz=('value', 'sum'), sentiment=('sentiment', 'mean'),
+                                 video_num=('title', 'size'))
+
+    social = pd.concat([sentiment['read_count'].rename('guba_buzz'), bili['bili_buzz']], axis=1).fillna(0)
+    social.index = pd.to_datetime(social.index)
+    social['total_buzz'] = social['guba_buzz'] + social['bili_buzz']
+    cols = ['total_buzz', 'guba_buzz', 'bili_buzz']
+    final = aggregate_to_trade_days(social, calendar, cols).reindex(calendar).fillna(0)
+    final['cum_factor'] = final['total_buzz'].cumsum()
+    final.index = final.index.strftime('%Y-%m-%d')
+    return {'sentiment': sentiment, 'bilibili': bili, 'final': final}
+
+
+def verify(start='2023-09-25', end='2023-10-12', ticks=3, seed=VERIFY_SEED):
+    """
+    用合成帖子流逐轮跑 apply_tick (不联网)，再从帖子最终状态整批重算，逐日比对三张表：
+    - sentiment / bilibili: 条数、阅读数/热度、加权分、日均情感
+    - final: 各平台热度、cum_factor (交易日历里挖掉 2023 年国庆休市，节前节后的帖子都要归到节后第一个交易日)
+    另外检查带引号逗号的字段经 upsert_tail 改写尾部后原样保留
+    """
+    ok = True
+
+    def check(name, cond, detail=''):
+        nonlocal ok
+        ok &= bool(cond)
+        print(f"{'✅' if cond else '❌'} {name}{f' ({detail})' if detail else ''}")
+
+    def diff(live, batch, cols):
+        common = live.index.intersection(batch.index)
+        missing = sorted(set(batch.index) - set(live.index))
+        worst = max((abs(live.loc[common, c].astype(float) - batch.loc[common, c]).max() for c in cols), default=0.0)
+        return missing, worst
+
+    code = 'verify'
+    days = [str(d.date()) for d in pd.date_range(start, end)]
+    calendar = pd.bdate_range(pd.Timestamp(start) - pd.Timedelta(days=7), pd.Timestamp(end) + pd.Timedelta(days=14))
+    calendar = calendar.difference(pd.date_range('2023-09-29', '2023-10-06'))
+    rounds, posts = _simulate(days, ticks, seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pd.DataFrame({'close': 1.0}, index=calendar.rename('date')).to_csv(f"{tmp}/market_{code}.csv")
+        live = LiveStock(code, state_dir=tmp, real_dir=tmp, lake=f"{tmp}/lake")
+        for today, guba, bili in rounds:
+            apply_tick(live, guba, bili, today, None)
+
+        batch = _batch(posts, calendar)
+        read = lambda dataset: pd.read_csv(live.path(dataset), index_col=0)
+
+        missing, worst = diff(read('sentiment'), batch['sentiment'],
+                              ['n', 'read_count', 'weighted_score_raw', 'weighted_score', 'sentiment'])
+        check("股吧日度表", not missing and worst < 1e-6, f"{len(batch['sentiment'])} 天, 最大误差 {worst:.2e}")
+        missing, worst = diff(read('bilibili'), batch['bilibili'], ['video_num', 'bili_buzz', 'sentiment'])
+        check("B站日度表", not missing and worst < 1e-6, f"{len(batch['bilibili'])} 天, 最大误差 {worst:.2e}")
+
+        final = read('final')
+        active = batch['final'][batch['final'].index >= days[0]]
+        active = active[active.index <= max(final.index)]
+        missing, worst = diff(final, active, ['guba_buzz', 'bili_buzz', 'total_buzz', 'cum_factor'])
+        holiday = [d for d in final.index if pd.Timestamp(d) not in calendar]
+        check("final 交易日热度与 cum_factor", not missing and not holiday and worst < 1e-6,
+              f"{len(active)} 个交易日, 最大误差 {worst:.2e}{f', 休市日: {holiday}' if holiday else ''}")
+
+        path = f"{tmp}/quoted.csv"
+        pd.DataFrame({'date': ['2023-10-09', '2023-10-10'], 'note': ['a,b', '"q", r'], 'v': [1, 2]}).to_csv(path, index=False)
+        upsert_tail(path, {'2023-10-10': {'v': 5}, '2023-10-11': {'v': 6}}, ['date', 'note', 'v'])
+        back = pd.read_csv(path, keep_default_na=False)
+        check("尾部改写保留带逗号的字段", back['note'].tolist() == ['a,b', '"q", r', ''] and back['v'].tolist() == [1, 5, 6])
+
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="实时监控：轮询最新帖子，增量更新日度表与 meme_heat")
+    parser.add_argument('cmd', choices=['run', 'replay', 'verify'], nargs='?', default='run')
+    parser.add_argument('--codes', nargs='+', help="只监控这些股票")
+    parser.add_argument('--interval', type=float, default=INTERVAL, help="轮询间隔 (秒)")
+    parser.add_argument('--pages', type=int, default=GUBA_PAGES, help="股吧轮询前几页")
+    parser.add_argument('--once', action='store_true', help="只跑一轮就退出")
+    parser.add_argument('--guba-base', default=GUBA_BASE, help="股吧站点地址 (测试时指向回放服务器)")
+    parser.add_argument('--bili-base', default=BILI_BASE, help="B站搜索地址 (测试时指向回放服务器)")
+    parser.add_argument('--port', type=int, default=REPLAY_PORT, help="回放服务器端口 (replay)")
+    parser.add_argument('--fixtures', default=FIXTURE_DIR, help="回放样本目录 (replay)")
+    args = parser.parse_args()
+
+    if args.cmd == 'replay':
+        replay(args.port, args.fixtures)
+    elif args.cmd == 'verify':
+        if not verify(): raise SystemExit(1)
+    else:
+        instrument.setup('monitor')
+        run(args.codes, args.interval, args.once, args.guba_base, args.bili_base, args.pages)
@@ -1,85 +1,185 @@
 import pandas as pd
 import numpy as np
 import os
-import jieba
-from snownlp import SnowNLP
+import argparse
+import functools
+from collections import Counter
 from wordcloud import WordCloud
+from sentiment_engine import batch_sentiment, batch_tokenize
+from nlp_cache import NLPCache
+from data_lake import save_frame
+from raw_loader import load_raw, compact, StreamDeduper, KEEP, KEEP_POLICIES, STREAM_KEEP_POLICIES
+from ticker_pool import map_codes, WORKERS
+import universe
+import instrument
 
 # 配置路径
 RAW_DIR = "./raw_data_lake"  # 来源
 REAL_DIR = "./real_data"  # 结果
 if not os.path.exists(REAL_DIR): os.makedirs(REAL_DIR)
 
-# 股票及停用词 (防止词云出现无关词)
-STOCKS = {
-    '002242': {'name': '九阳股份', 'stop': ['九阳', '股份', '股票', '今天', '主力', '什么']},
-    '601127': {'name': '赛力斯', 'stop': ['赛力斯', '汽车', '股票', '什么时候', '多少', '我们']},
-    '01810': {'name': '小米集团', 'stop': ['小米', '集团', '港股', '01810', '股价', '怎么']}
-}
+# 流式模式每块读取的行数
+CHUNK_ROWS = 50000
 
 
-def get_sentiment(text):
-    """计算情感分"""
-    try:
-        return SnowNLP(str(text)).sentiments
-    except:
-        return 0.5
-
-
-def process_nlp():
-    print("🚀 启动 NLP 分析工厂...")
-
-    for code, conf in STOCKS.items():
-        name = conf['name']
-        raw_path = f"{RAW_DIR}/raw_{code}.csv"
-
-        if not os.path.exists(raw_path):
-            print(f"⚠️ 跳过 {name}: 未找到 {raw_path}，请先运行 crawl.py")
-            continue
-
-        print(f"\n🔨 正在精炼: {name} ...")
-
-        # 1. 读取原始数据
-        df = pd.read_csv(raw_path)
-
-        # 2. 批量情感打分
-        print(f"   -> 正在计算 {len(df)} 条数据的情感分...")
-        df['sentiment'] = df['title'].apply(get_sentiment)
-
-        # 3. 生成词云图片
-        print(f"   -> 正在生成词云...")
-        text_content = " ".join(df['title'].astype(str).tolist())
-        words = jieba.lcut(text_content)
-        clean_words = [w for w in words if len(w) > 1 and w not in conf['stop']]
-
+def save_wordcloud(freq, code):
+    """用词频表画词云 (不需要拼出整段文本)"""
+    with instrument.timer('wordcloud'):
         wc = WordCloud(font_path="C:/Windows/Fonts/simhei.ttf",
                        background_color="white", width=800, height=500)
-        wc.generate(" ".join(clean_words))
+        wc.generate_from_frequencies(freq)
         wc.to_file(f"{REAL_DIR}/wc_{code}.png")
 
-        # 4. 聚合为日度数据
-        df['date'] = pd.to_datetime(df['date'], errors='coerce')
-        df = df.dropna(subset=['date'])
 
-        # 计算加权分：(情感 * 热度)
-        df['weighted_score_raw'] = df['sentiment'] * (df['read_count'] + 1)
-
-        daily = df.groupby('date').agg({
-            'sentiment': 'mean',  # 平均情感
-            'read_count': 'sum',  # 总热度 (Buzz)
-            'weighted_score_raw': 'sum'  # 总加权分
-        })
-
-        # 归一化日度加权情感
-        daily['weighted_score'] = daily['weighted_score_raw'] / (daily['read_count'] + 1)
+def stream_daily(raw_path, stop, cache, chunksize=CHUNK_ROWS, keep=KEEP):
+    """
+    分块读取原始 CSV：每块分词、打分后立刻折叠进
+    - 去停用词后的累计词频
+    - 日度累计量 (情感和、条数、热度和、加权分和)
+    内存只和“天数 + 词表大小”有关，与语料行数无关
+    跨页重复的帖子在打分前按 (标题, 日期, 阅读数) 去掉 (分块只能保留先出现的那条，去重键只留最近几天的)
+    """
+    freq = Counter()
+    acc = None
+    dedup = StreamDeduper(keep)
+
+    reader = pd.read_csv(raw_path, chunksize=chunksize, usecols=['date', 'title', 'read_count'])
+    for i, chunk in enumerate(reader):
+        chunk = dedup(compact(chunk))
+        print(f"   -> 第 {i + 1} 块: {len(chunk)} 条 (累计去重 {dedup.removed} 条, 在记的键 {len(dedup)} 个)")
+        instrument.observe('nlp.chunk_rows', len(chunk))
+        chunk['sentiment'] = batch_sentiment(chunk['title'], cache=cache)
+
+        for words in batch_tokenize(chunk['title'], cache=cache):
+            freq.update(w for w in words if len(w) > 1 and w not in stop)
+
+        chunk = chunk.dropna(subset=['date'])
+        chunk['weighted_score_raw'] = chunk['sentiment'] * (chunk['read_count'] + 1)
+
+        part = chunk.groupby('date').agg(
+            sentiment_sum=('sentiment', 'sum'),
+            n=('sentiment', 'count'),
+            read_count=('read_count', 'sum'),
+            weighted_score_raw=('weighted_score_raw', 'sum')
+        )
+        acc = part if acc is None else acc.add(part, fill_value=0)
+
+    instrument.count('raw.duplicates', dedup.removed)
+    if acc is None:
+        return pd.DataFrame(columns=['sentiment', 'read_count', 'weighted_score_raw', 'weighted_score', 'n']), freq
+
+    # 由累计量还原出与批量模式相同的日度表
+    daily = pd.DataFrame({
+        'sentiment': acc['sentiment_sum'] / acc['n'],
+        'read_count': acc['read_count'],
+        'weighted_score_raw': acc['weighted_score_raw']
+    }).sort_index()
+    daily['weighted_score'] = daily['weighted_score_raw'] / (daily['read_count'] + 1)
+    daily['n'] = acc['n'].astype(int)
+    return daily, freq
+
+
+def process_code(code, conf, stream=False, chunksize=CHUNK_ROWS, keep=KEEP, cache=None):
+    """单只股票：打分 + 词云 + 日度聚合，返回是否产出了结果 (可在进程池子进程里跑)"""
+    name = conf['name']
+    raw_path = f"{RAW_DIR}/raw_{code}.csv"
+
+    if not os.path.exists(raw_path):
+        print(f"⚠️ 跳过 {name}: 未找到 {raw_path}，请先运行 crawl.py")
+        return False
+
+    own_cache = cache is None
+    if own_cache: cache = NLPCache()
+    print(f"\n🔨 正在精炼: {name} ...")
+
+    with instrument.stage(f"nlp.{code}"):
+        if stream:
+            # 流式：分块打分/分词/聚合，最后用词频表出词云
+            daily, freq = stream_daily(raw_path, conf['stop'], cache, chunksize, keep)
+            print(f"   -> 正在生成词云...")
+            save_wordcloud(freq, code)
+        else:
+            # 1. 读取原始数据 (紧凑类型 + 跨页去重，重复帖不参与打分和热度)
+            df = load_raw(raw_path, keep=keep, label=code)
+
+            # 2. 批量情感打分
+            print(f"   -> 正在计算 {len(df)} 条数据的情感分...")
+            df['sentiment'] = batch_sentiment(df['title'], cache=cache)
+
+            # 3. 生成词云图片
+            print(f"   -> 正在生成词云...")
+            tokens = batch_tokenize(df['title'], cache=cache)
+            words = [w for title_words in tokens for w in title_words]
+            clean_words = [w for w in words if len(w) > 1 and w not in conf['stop']]
+
+            with instrument.timer('wordcloud'):
+                wc = WordCloud(font_path="C:/Windows/Fonts/simhei.ttf",
+                               background_color="white", width=800, height=500)
+                wc.generate(" ".join(clean_words))
+                wc.to_file(f"{REAL_DIR}/wc_{code}.png")
+
+            # 4. 聚合为日度数据
+            with instrument.timer('pandas.groupby'):
+                df = df.dropna(subset=['date'])
+
+                # 计算加权分：(情感 * 热度)
+                df['weighted_score_raw'] = df['sentiment'] * (df['read_count'] + 1)
+
+                daily = df.groupby('date').agg({
+                    'sentiment': 'mean',  # 平均情感
+                    'read_count': 'sum',  # 总热度 (Buzz)
+                    'weighted_score_raw': 'sum'  # 总加权分
+                })
+
+            # 归一化日度加权情感
+            daily['weighted_score'] = daily['weighted_score_raw'] / (daily['read_count'] + 1)
+            # 帖子条数：实时监控据此增量更新日均情感
+            daily['n'] = df.groupby('date').size()
 
         # 保存
         save_path = f"{REAL_DIR}/sentiment_{code}.csv"
-        daily.to_csv(save_path)
-        print(f"✅ {name} 处理完毕！已存入 {save_path}")
-
+        with instrument.timer('save'):
+            daily.to_csv(save_path)
+            save_frame(daily, 'sentiment', code)
+    print(f"✅ {name} 处理完毕！已存入 {save_path}")
+
+    if own_cache:
+        print(f"   📦 [{code}] {cache.summary()}")
+        cache.close()
+    return True
+
+
+def process_nlp(stream=False, chunksize=CHUNK_ROWS, codes=None, keep=KEEP, workers=WORKERS):
+    print(f"🚀 启动 NLP 分析工厂{' (流式分块模式)' if stream else ''}...")
+    if stream and keep not in STREAM_KEEP_POLICIES:
+        raise ValueError(f"流式模式只能保留先出现的重复帖或不去重 (keep 可选 {STREAM_KEEP_POLICIES})，不支持 keep={keep}")
+    stocks = universe.select(codes)
+
+    if workers <= 1 or len(stocks) <= 1:
+        # 顺序跑：所有股票共用一个缓存连接
+        cache = NLPCache()
+        for code, conf in stocks.items():
+            process_code(code, conf, stream, chunksize, keep, cache)
+        print(f"\n📦 {cache.summary()}")
+        cache.close()
+    else:
+        # 按股票分进程：每个子进程自己开缓存连接 (SQLite WAL 支持多进程读写)
+        task = functools.partial(process_code, stream=stream, chunksize=chunksize, keep=keep)
+        for code, result in map_codes(task, stocks, workers):
+            if isinstance(result, Exception): print(f"❌ {stocks[code]['name']} 失败: {result!r}")
     print("\n🎉 NLP 任务全部完成！")
 
 
 if __name__ == "__main__":
-    process_nlp()
+    parser = argparse.ArgumentParser(description="股吧文本 NLP：情感打分 + 词云 + 日度聚合")
+    parser.add_argument('--stream', action='store_true', help="分块流式处理，内存不随语料增长")
+    parser.add_argument('--chunksize', type=int, default=CHUNK_ROWS, help="流式模式每块行数")
+    parser.add_argument('--keep', choices=KEEP_POLICIES, default=KEEP,
+                        help="跨页重复帖保留哪一条 (first/last)，none 为不去重；--stream 时不支持 last")
+    parser.add_argument('--codes', nargs='+', help="只处理这些股票 (默认股票池全部)")
+    parser.add_argument('--workers', type=int, default=WORKERS, help="按股票并行的进程数 (1 为顺序跑)")
+    args = parser.parse_args()
+    if args.stream and args.keep not in STREAM_KEEP_POLICIES:
+        parser.error(f"--stream 只支持 --keep {'/'.join(STREAM_KEEP_POLICIES)} (分块读取没法知道哪条是最后一条)")
+    instrument.setup('nlp')
+    process_nlp(stream=args.stream, chunksize=args.chunksize, codes=args.codes, keep=args.keep, workers=args.workers)
@@ -0,0 +1,136 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import unicodedata
+from importlib import metadata
+
+# ===========================
+# 1. 配置：本地 NLP 结果缓存
+# ===========================
+CACHE_PATH = "./raw_data_lake/nlp_cache.sqlite"
+# 超过该体积后按“最久未使用”淘汰
+MAX_CACHE_MB = 512
+# 每次淘汰掉的比例
+EVICT_RATIO = 0.2
+# SQLite 单条语句的参数上限保守取值
+BATCH = 500
+
+
+def _pkg_version(name):
+    try:
+        return metadata.version(name)
+    except:
+        return "unknown"
+
+
+# 模型版本参与哈希：升级 SnowNLP / jieba 后旧结果自动失效
+# raw: 模型输入是原标题 (早先的缓存是拿规范化后的文本算的，换键作废)
+MODEL_VERSION = f"snownlp-{_pkg_version('snownlp')}|jieba-{_pkg_version('jieba')}|raw"
+
+
+def normalize_title(text):
+    """统一全半角、去掉首尾和重复空白，只用作去重和缓存的键 (送进模型的仍是原标题)"""
+    text = unicodedata.normalize('NFKC', str(text))
+    return " ".join(text.split())
+
+
+def title_key(norm_text):
+    return hashlib.sha1(f"{MODEL_VERSION}\x00{norm_text}".encode('utf-8')).hexdigest()
+
+
+# ===========================
+# 2. 缓存本体 (SQLite 单文件)
+# ===========================
+class NLPCache:
+    def __init__(self, path=CACHE_PATH, max_mb=MAX_CACHE_MB):
+        folder = os.path.dirname(path)
+        if folder and not os.path.exists(folder): os.makedirs(folder)
+
+        self.path = path
+        self.max_bytes = max_mb * 1024 * 1024
+        # 按股票分进程并行时多个进程同时写：遇到写锁最多等 30 秒
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS nlp ("
+            " key TEXT PRIMARY KEY, score REAL, tokens TEXT, last_used INTEGER)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON nlp(last_used)")
+        self.conn.commit()
+
+        # 命中统计 (按字段分开记)
+        self.stats = {'score_hit': 0, 'score_miss': 0, 'token_hit': 0, 'token_miss': 0, 'dup_saved': 0}
+
+    def _lookup(self, keys, column):
+        found = {}
+        for i in range(0, len(keys), BATCH):
+            part = keys[i:i + BATCH]
+            marks = ",".join("?" * len(part))
+            rows = self.conn.execute(
+                f"SELECT key, {column} FROM nlp WHERE key IN ({marks}) AND {column} IS NOT NULL", part
+            ).fetchall()
+            found.update(rows)
+
+        # 命中的记录刷新使用时间，淘汰时优先删冷数据
+        now = int(time.time())
+        self.conn.executemany("UPDATE nlp SET last_used=? WHERE key=?", [(now, k) for k in found])
+        return found
+
+    def get_scores(self, keys):
+        found = self._lookup(keys, 'score')
+        self.stats['score_hit'] += len(found)
+        self.stats['score_miss'] += len(keys) - len(found)
+        return found
+
+    def get_tokens(self, keys):
+        found = {k: json.loads(v) for k, v in self._lookup(keys, 'tokens').items()}
+        self.stats['token_hit'] += len(found)
+        self.stats['token_miss'] += len(keys) - len(found)
+        return found
+
+    def _store(self, items, column):
+        now = int(time.time())
+        self.conn.executemany(
+            f"INSERT INTO nlp (key, {column}, last_used) VALUES (?, ?, ?) "
+            f"ON CONFLICT(key) DO UPDATE SET {column}=excluded.{column}, last_used=excluded.last_used",
+            [(k, v, now) for k, v in items.items()]
+        )
+        self.conn.commit()
+        self.evict()
+
+    def put_scores(self, scores):
+        self._store(scores, 'score')
+
+    def put_tokens(self, tokens):
+        self._store({k: json.dumps(v, ensure_ascii=False) for k, v in tokens.items()}, 'tokens')
+
+    def size_bytes(self):
+        page_size = self.conn.execute("PRAGMA page_size").fetchone()[0]
+        pages = self.conn.execute("PRAGMA page_count").fetchone()[0]
+        free = self.conn.execute("PRAGMA freelist_count").fetchone()[0]
+        return (pages - free) * page_size
+
+    def evict(self):
+        """超出体积上限时删除最久未使用的一批记录 (空闲页会被后续写入复用)"""
+        if self.size_bytes() <= self.max_bytes: return 0
+
+        total = self.conn.execute("SELECT COUNT(*) FROM nlp").fetchone()[0]
+        n = max(1, int(total * EVICT_RATIO))
+        self.conn.execute(
+            "DELETE FROM nlp WHERE key IN (SELECT key FROM nlp ORDER BY last_used LIMIT ?)", (n,)
+        )
+        self.conn.commit()
+        print(f"   🧹 缓存超过 {self.max_bytes // 1024 // 1024}MB，已淘汰 {n} 条冷数据")
+        return n
+
+    def summary(self):
+        s = self.stats
+        return (f"缓存 {os.path.basename(self.path)} | 情感 命中 {s['score_hit']} / 未命中 {s['score_miss']}"
+                f" | 分词 命中 {s['token_hit']} / 未命中 {s['token_miss']}"
+                f" | 批内重复省去 {s['dup_saved']} 次")
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
@@ -0,0 +1,388 @@
+import os
+import json
+import math
+import random
+import asyncio
+import argparse
+import calendar
+import datetime
+from guba_parser import parse_guba_page
+import universe
+import instrument
+
+# ===========================
+# 1. 配置：按日期自动定位股吧页码 (代替手工翻页找 start_page / end_page / target_year)
+# ===========================
+# 列表页从新到旧排，只显示 MM-DD：先倍增找到窗口以外的一页，再二分出首末页，O(log N) 次请求
+# 年份靠已知页推：第 1 页不晚于今天，后面每页不晚于前一个已知页的最早一帖，跨年 (01-02 之后是 12-31) 自然退一年
+BASE_URL = "http://guba.eastmoney.com"
+# 定位结果存在断点日志目录里 (range.json)，这么多小时内重跑直接复用；页码会随新帖后移，隔久了重新定位 (断点日志按偏移换到新页码)
+LOCATE_TTL_HOURS = 12
+# 帖子顺序偶尔有几天的错位 (回复顶帖等)，推年份时的上界放宽这么多天
+SLACK_DAYS = 3
+# 倍增最多翻到这一页 (页面一直不空时防止无限翻)
+MAX_PAGE = 2 ** 17
+# 倍增时每跳大约不超过这么多天 (MM-DD 只能分辨一年以内，跳太远会少算一年)
+HOP_DAYS = 120
+# 空页可能是被拦截，重抓这么多次都空才认为翻过了最后一页
+EMPTY_RETRIES = 2
+# 二分是串行的，请求少，限速放慢一点
+RATE_PER_SEC = 2
+
+# 本地替身服务器 (合成分页数据，测试用)
+STUB_PORT = 8766
+STUB_PER_PAGE = 80
+
+
+# ===========================
+# 2. 年份推断
+# ===========================
+def _on(year, mmdd):
+    month, day = int(mmdd[:2]), int(mmdd[3:5])
+    # 02-29 落在平年 (或文本里混进 04-31 这种) 时按当月最后一天算
+    return datetime.date(year, month, min(day, calendar.monthrange(year, month)[1]))
+
+
+def date_rows(mmdds, upper):
+    """一页的 MM-DD 各取不晚于 upper 的最近一个日期 (一页跨度不到一年；置顶老帖也能落对年份)"""
+    out = []
+    for mmdd in mmdds:
+        day = _on(upper.year, mmdd)
+        if day > upper: day = _on(upper.year - 1, mmdd)
+        out.append(day)
+    return out
+
+
+def with_years(pages, upper):
+    """
+    连续若干页的行 (从新到旧，date 为 MM-DD 或随便拼的年份)，第一页不晚于 upper
+    逐页推出完整日期，返回拼好的行列表
+    """
+    rows = []
+    for page in pages:
+        if not page: continue
+        dates = date_rows([row['date'][-5:] for row in page], upper)
+        rows.extend(dict(row, date=day.isoformat()) for row, day in zip(page, dates))
+        upper = dates[-1] + datetime.timedelta(SLACK_DAYS)
+    return rows
+
+
+# ===========================
+# 3. 定位器：倍增 + 二分
+# ===========================
+class PageLocator:
+    def __init__(self, url_code, base_url=BASE_URL, today=None, rate=RATE_PER_SEC):
+        self.url_code = url_code
+        self.base_url = base_url
+        self.rate = rate
+        self.today = today or datetime.date.today()
+        # 已定好年份的页: page -> [date, ...]，空列表表示已经翻过最后一页
+        self.pages = {}
+        # 抓过的原始 MM-DD (跳太远退回来时不用重抓)
+        self.raw = {}
+        # page -> 推这一页年份时用的上界 (抓取后按页重推年份时从起始页的上界开始)
+        self.uppers = {}
+        self.fetches = 0
+
+    def _bottom(self, page):
+        # 第 1 页顶上可能有置顶老帖，取最后一帖；其余页取最早一帖，不怕小幅乱序
+        dates = self.pages[page]
+        return dates[-1] if page == 1 else min(dates)
+
+    def _date(self, page):
+        """只凭 MM-DD 推这一页的完整日期：不晚于今天 / 不晚于前面最近一个已知页的最早一帖"""
+        if page == 1:
+            upper = self.today
+        else:
+            newer = max(p for p in self.pages if p < page and self.pages[p])
+            upper = self._bottom(newer) + datetime.timedelta(SLACK_DAYS)
+        self.uppers[page] = upper
+        return date_rows(self.raw[page], upper) if self.raw[page] else []
+
+    async def _fetch(self, session, bucket, page):
+        from guba_http import fetch_page, page_url
+        if page in self.raw: return self.raw[page]
+
+        for attempt in range(EMPTY_RETRIES + 1):
+            self.fetches += 1
+            instrument.count('locate.fetch')
+            html = await fetch_page(session, bucket, page_url(self.url_code, page, self.base_url))
+            mmdds = [row['date'] for row in parse_guba_page(html, None)]
+            if mmdds: break
+            if attempt < EMPTY_RETRIES: await asyncio.sleep(1 / self.rate)
+
+        self.raw[page] = mmdds
+        return mmdds
+
+    async def probe(self, session, bucket, page):
+        """抓一页并定好年份 (同一页只抓一次)"""
+        if page not in self.pages:
+            await self._fetch(session, bucket, page)
+            self.pages[page] = self._date(page)
+        return self.pages[page]
+
+    async def _gallop(self, session, bucket, done):
+        """
+        从第 1 页往后倍增着跳，直到 done(page) (整页早于窗口或翻过头)，返回那一页
+        MM-DD 只能分辨一年以内：每跳按最近两跳的每页天数估计不超过 HOP_DAYS 天，
+        量出来隔了半年以上就退回一半重跳，保证相邻已知页不会隔一整年
+        """
+        prev, step, recent = 1, 1, [0.0]
+        while not done(prev) and prev < MAX_PAGE:
+            page = prev + step
+            await self._fetch(session, bucket, page)
+            dates = self._date(page)
+            gap = (self._bottom(prev) - min(dates)).days if dates else 0
+            if gap > 2 * HOP_DAYS and step > 1:
+                step //= 2
+                continue
+
+            self.pages[page] = dates
+            recent = [recent[-1], gap / step]
+            prev = page
+            days_per_page = max(recent)
+            step = step * 2 if not days_per_page else max(1, min(step * 2, int(HOP_DAYS / days_per_page)))
+        return prev
+
+    async def _first(self, session, bucket, lo, hi, pred):
+        """lo 页不满足、hi 页满足 pred(page)，二分出第一个满足的页"""
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            await self.probe(session, bucket, mid)
+            if pred(mid):
+                hi = mid
+            else:
+                lo = mid
+        return hi
+
+    async def locate(self, window_start, window_end):
+        """
+        事件窗口 [window_start, window_end] 的帖子落在哪几页
+        返回 {'start_page', 'end_page', 'upper'}；窗口里没有帖子 (或比整个吧都早) 返回 None
+        """
+        import aiohttp
+        from guba_http import TokenBucket, HEADERS, TIMEOUT_SEC
+        start = datetime.date.fromisoformat(window_start)
+        end = datetime.date.fromisoformat(window_end)
+        # 整页都比窗口新 / 整页都比窗口旧 (翻过头的空页两者都算旧)
+        reached_end = lambda page: not self.pages[page] or self._bottom(page) <= end
+        before_start = lambda page: not self.pages[page] or max(self.pages[page]) < start
+
+        bucket = TokenBucket(self.rate, self.rate)
+        timeout = aiohttp.ClientTimeout(total=TIMEOUT_SEC)
+        async with aiohttp.ClientSession(timeout=timeout, headers=HEADERS) as session:
+            if not await self.probe(session, bucket, 1): return None
+
+            hi = await self._gallop(session, bucket, before_start)
+            first = await self._first(session, bucket, 0, hi, reached_end)
+            last = await self._first(session, bucket, first - 1, hi, before_start) - 1
+
+        if last < first: return None
+        return {'start_page': first, 'end_page': last, 'upper': self.uppers[first].isoformat()}
+
+
+def locate(url_code, window_start, window_end, base_url=BASE_URL, today=None):
+    """同步入口：返回 (区间或 None, 请求次数)"""
+    locator = PageLocator(url_code, base_url, today)
+    found = asyncio.run(locator.locate(window_start, window_end))
+    return found, locator.fetches
+
+
+# ===========================
+# 4. 与抓取衔接：页码区间 + 年份
+# ===========================
+def page_range(code, conf, journal, base_url=BASE_URL):
+    """
+    universe 里手工填了 start_page / end_page / target_year 就用手工的 (upper 为 None，年份照旧拼 target_year)
+    否则按事件窗口自动定位；结果缓存在该股票的断点日志目录
+    同一窗口重新定位后页码挪了，断点日志按首页的偏移换成新页码接着抓 (隔天续爬不用从头来)；
+    窗口改了或者没有上次的记录 (日志可能是手工页码时抓的)，旧页号对不上，清掉旧日志
+    返回 {'start_page', 'end_page', 'year', 'upper'} 或 None
+    """
+    if conf.get('start_page') and conf.get('end_page') and conf.get('target_year'):
+        return {'start_page': conf['start_page'], 'end_page': conf['end_page'],
+                'year': conf['target_year'], 'upper': None}
+
+    window = [conf['window_start'], conf['window_end']]
+    path = os.path.join(journal.folder, "range.json")
+    saved = None
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            saved = json.load(f)
+        age = (datetime.datetime.now() - datetime.datetime.fromisoformat(saved['located'])).total_seconds()
+        if saved['window'] == window and age < LOCATE_TTL_HOURS * 3600:
+            print(f"🧭 沿用 {saved['located'][:16]} 的定位: 第 {saved['start_page']}-{saved['end_page']} 页")
+            return dict(saved, year=saved['upper'][:4])
+
+    with instrument.timer('locate'):
+        found, fetches = locate(conf['url_code'], *window, base_url=base_url)
+    if not found:
+        print(f"⚠️ {conf['name']} 在 {window[0]} ~ {window[1]} 没有帖子 (请求 {fetches} 次)")
+        return None
+    print(f"🧭 自动定位: {window[0]} ~ {window[1]} -> 第 {found['start_page']}-{found['end_page']} 页"
+          f" (请求 {fetches} 次)")
+
+    span = (found['start_page'], found['end_page'])
+    if saved and saved['window'] == window:
+        if (saved['start_page'], saved['end_page']) != span and journal.pages:
+            # 新帖把老帖整体往后挤：同一批帖子现在在 旧页码 + shift 页
+            shift = found['start_page'] - saved['start_page']
+            kept = journal.remap(shift)
+            print(f"   ♻️ 页码较上次定位挪了 {shift} 页，断点日志换成新页码: 保留 {kept} 页 (每段首尾页重抓)")
+    elif journal.pages:
+        was = f"窗口 {saved['window'][0]} ~ {saved['window'][1]}" if saved else "没有定位记录"
+        print(f"   ♻️ {was}，旧日志的页号对不上，清空断点日志")
+        journal.reset()
+
+    found.update(window=window, located=datetime.datetime.now().isoformat(timespec='seconds'))
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(found, f, ensure_ascii=False)
+    return dict(found, year=found['upper'][:4])
+
+
+def journal_rows(journal, rng):
+    """从断点日志取整段的行；自动定位的区间按页重推年份 (跨年的窗口不会全拼成同一年)"""
+    if not rng['upper']: return journal.rows(rng['start_page'], rng['end_page'])
+    return with_years(journal.rows_by_page(rng['start_page'], rng['end_page']),
+                      datetime.date.fromisoformat(rng['upper']))
+
+
+# ===========================
+# 5. 本地替身服务器：合成分页列表 (测试用)
+# ===========================
+def make_stub_pages(days=1200, per_day=40, seed=0, today=None, per_page=STUB_PER_PAGE):
+    """
+    合成一个股吧：从今天往前 days 天，每天帖子数随机起伏 (偶尔爆量、偶尔整段没人发)，新 -> 旧分页
+    顺序里掺一点相邻错位；第 1 页顶上放一条半年前的置顶帖
+    返回 [[date, ...], ...]，第 i 项是第 i + 1 页
+    """
+    rng = random.Random(seed)
+    today = today or datetime.date.today()
+    posts = []
+    for back in range(days):
+        n = rng.randint(0, per_day * 2)
+        if rng.random() < 0.03: n *= 20
+        if rng.random() < 0.02: n = 0
+        posts.extend([today - datetime.timedelta(back)] * n)
+    for i in range(1, len(posts)):
+        if rng.random() < 0.02: posts[i - 1], posts[i] = posts[i], posts[i - 1]
+
+    pages = [posts[i:i + per_page] for i in range(0, len(posts), per_page)]
+    if pages: pages[0].insert(0, today - datetime.timedelta(183))
+    return pages
+
+
+def _stub_html(dates, page):
+    rows = ''.join(
+        f'<tr class="listitem"><td><div class="read">{(page * 7 + i * 13) % 5000}</div></td>'
+        f'<td><div class="title"><a href="/news,0,{page}{i}.html" title="帖子{page}_{i}">帖子{page}_{i}</a></div></td>'
+        f'<td><div class="update">{day.strftime("%m-%d")} 12:{i % 60:02d}</div></td></tr>\n'
+        for i, day in enumerate(dates))
+    return (f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>股吧</title></head>'
+            f'<body><div id="mainlist"><table class="default_list"><tbody>{rows}</tbody></table></div></body></html>')
+
+
+def make_stub_app(pages):
+    """/list,{url_code}_{page}.html -> 第 page 页；翻过最后一页返回空列表 (所有股票代码共用同一份数据)"""
+    from aiohttp import web
+
+    async def guba(request):
+        try:
+            page = int(request.match_info['name'].rsplit('_', 1)[1])
+        except (IndexError, ValueError):
+            raise web.HTTPNotFound()
+        dates = pages[page - 1] if 1 <= page <= len(pages) else []
+        return web.Response(text=_stub_html(dates, page), content_type='text/html')
+
+    app = web.Application()
+    app.router.add_get('/list,{name}.html', guba)
+    return app
+
+
+def stub(port=STUB_PORT, days=1200, seed=0):
+    from aiohttp import web
+    pages = make_stub_pages(days, seed=seed)
+    print(f"🎞️ 替身股吧: http://127.0.0.1:{port} ({len(pages)} 页, 最早 {pages[-1][-1]})")
+    print(f"   python crawl --engine http --guba-base http://127.0.0.1:{port}")
+    web.run_app(make_stub_app(pages), host='127.0.0.1', port=port, print=None)
+
+
+# ===========================
+# 6. 自检：对着替身服务器定位，和逐页数出来的真值比对
+# ===========================
+def _truth(pages, start, end):
+    hit = [i + 1 for i, dates in enumerate(pages) if any(start <= d <= end for d in dates[1 if i == 0 else 0:])]
+    return (hit[0], hit[-1]) if hit else None
+
+
+async def _verify(pages, windows, port):
+    from aiohttp import web
+    runner = web.AppRunner(make_stub_app(pages))
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', port).start()
+    base_url = f"http://127.0.0.1:{port}"
+
+    ok = True
+    try:
+        for start, end in windows:
+            # 本地服务器不用限速
+            locator = PageLocator('000000', base_url, rate=1000)
+            found = await locator.locate(start.isoformat(), end.isoformat())
+            want = _truth(pages, start, end)
+            got = (found['start_page'], found['end_page']) if found else None
+
+            # 年份：区间内逐页重推的日期要和真实日期一致
+            years_ok = True
+            if found:
+                rows = [[{'date': d.strftime('%m-%d')} for d in pages[p - 1]] for p in range(got[0], got[1] + 1)]
+                dates = [datetime.date.fromisoformat(r['date']) for r in
+                         with_years(rows, datetime.date.fromisoformat(found['upper']))]
+                real = [d for p in range(got[0], got[1] + 1) for d in pages[p - 1]]
+                skip = 1 if got[0] == 1 else 0
+                years_ok = dates[skip:] == real[skip:]
+
+            good = got == want and years_ok
+            ok &= good
+            print(f"   {'✅' if good else '❌'} {start} ~ {end}: 定位 {got} | 真值 {want}"
+                  f" | 请求 {locator.fetches} 次{'' if years_ok else ' | 年份不对'}")
+    finally:
+        await runner.cleanup()
+    return ok
+
+
+def verify(days=1200, seed=0, port=STUB_PORT):
+    pages = make_stub_pages(days, seed=seed)
+    today = datetime.date.today()
+    print(f"🔍 替身股吧 {len(pages)} 页 (log2 ≈ {math.log2(len(pages)):.0f})，逐个窗口比对")
+    rng = random.Random(seed)
+    windows = [
+        (today - datetime.timedelta(10), today),  # 窗口到今天
+        (datetime.date(today.year - 1, 12, 1), datetime.date(today.year, 1, 31)),  # 跨年
+        (today - datetime.timedelta(days + 100), today - datetime.timedelta(days + 30)),  # 比整个吧都早
+        (today - datetime.timedelta(days - 20), today - datetime.timedelta(days - 80)),  # 最后几页
+    ]
+    for _ in range(6):
+        back = rng.randint(30, days - 30)
+        start = today - datetime.timedelta(back)
+        windows.append((start, start + datetime.timedelta(rng.randint(1, 150))))
+    return asyncio.run(_verify(pages, windows, port))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="按事件窗口自动定位股吧页码")
+    parser.add_argument('cmd', choices=['locate', 'stub', 'verify'], nargs='?', default='locate')
+    parser.add_argument('--codes', nargs='+', help="只定位这些股票 (locate)")
+    parser.add_argument('--guba-base', default=BASE_URL, help="股吧站点地址 (测试时指向替身服务器)")
+    parser.add_argument('--port', type=int, default=STUB_PORT, help="替身服务器端口 (stub / verify)")
+    parser.add_argument('--days', type=int, default=1200, help="替身股吧往前合成多少天 (stub / verify)")
+    parser.add_argument('--seed', type=int, default=0, help="替身股吧的随机种子 (stub / verify)")
+    args = parser.parse_args()
+
+    if args.cmd == 'stub':
+        stub(args.port, args.days, args.seed)
+    elif args.cmd == 'verify':
+        if not verify(args.days, args.seed, args.port): raise SystemExit(1)
+    else:
+        for code, conf in universe.select(args.codes, need=['window_start', 'window_end']).items():
+            found, fetches = locate(conf['url_code'], conf['window_start'], conf['window_end'], args.guba_base)
+            print(f"{code} {conf['name']}: {conf['window_start']} ~ {conf['window_end']} -> {found} (请求 {fetches} 次)")
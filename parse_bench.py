@@ -0,0 +1,166 @@
+import os
+import sys
+import glob
+import time
+import random
+import argparse
+from guba_parser import parse_guba_page
+from bili_parser import parse_bili_cards
+
+# ===========================
+# 1. 配置：HTML 样本库 (一致性校验 + 解析速度基准)
+# ===========================
+# 真实页面：python crawl --save-html 会把抓到的列表页存进 guba/；B站页面可手动另存到 bili/
+FIXTURE_DIR = "./raw_data_lake/html_fixtures"
+KINDS = {
+    'guba': lambda html, backend: parse_guba_page(html, '2023', backend=backend),
+    'bili': lambda html, backend: parse_bili_cards(html, 'fixture', backend=backend),
+}
+
+# 合成样本：故意带上真实页面里见过的各种毛刺 (注释、脚本、实体、公告、缺 title 属性、旧版表格)
+TITLES = ['遥遥领先！', '赛力斯又涨停了', '问界M7订单爆了 &amp; 加仓', '公告：关于股东减持', '哈基米 🐱 冲冲冲',
+          '主力出货了吗？', '  前后有空格  ', '资讯：今日盘面', '雷军 &lt;SU7&gt; 发布会', '']
+
+
+def save_fixture(kind, name, html):
+    """抓取时顺手把页面存成样本"""
+    path = f"{FIXTURE_DIR}/{kind}/{name}.html"
+    if not os.path.exists(os.path.dirname(path)): os.makedirs(os.path.dirname(path))
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(html)
+
+
+def _guba_item(rng, i):
+    title = rng.choice(TITLES)
+    reads = rng.choice([str(rng.randint(0, 9999)), f"{rng.randint(1, 99) / 10}万"])
+    title_attr = f' title="{title}"' if rng.random() < 0.8 else ''
+    date = f"{rng.randint(1, 12):02d}-{rng.randint(1, 31):02d} {rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}"
+    extra = rng.choice(['', '<!-- ad 12-25 -->', '<script>var t="01-01";</script>', '<em class="hot">热</em>'])
+    return (f'<tr class="listitem{" top" if i == 0 else ""}">'
+            f'<td><div class="read">{reads}</div></td><td><div class="reply">{rng.randint(0, 300)}</div></td>'
+            f'<td><div class="title">{extra}<a href="/news,601127,{rng.randint(10 ** 8, 10 ** 9)}.html"{title_attr}>'
+            f'{title}</a></div></td>'
+            f'<td><div class="author"><a href="//i.eastmoney.com/{i}">股友{rng.randint(1000, 9999)}</a></div></td>'
+            f'<td><div class="update">{date}</div></td></tr>\n')
+
+
+def _guba_page(rng):
+    layout = rng.random()
+    if layout < 0.7:
+        body = ''.join(_guba_item(rng, i) for i in range(80))
+        body = f'<table class="default_list"><tbody>{body}</tbody></table>'
+    elif layout < 0.9:
+        # 旧版：没有 .listitem，只能退到 <tr>，且标题在 .l3 里
+        body = ''.join(
+            f'<tr><td class="l1">{rng.randint(0, 9999)}</td><td class="l3"><a href="#">{rng.choice(TITLES)}</a>'
+            f'<a href="#">短</a></td><td class="l5">{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}</td></tr>\n'
+            for _ in range(80))
+        body = f'<table>{body}</table>'
+    else:
+        # 被拦截 / 空列表页
+        body = '<div class="error">访问过于频繁，请稍后再试</div>'
+    return (f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>股吧</title>'
+            f'<script>window.x = "<tr>";</script><style>.listitem{{color:red}}</style></head>'
+            f'<body><div id="mainlist">{body}</div></body></html>')
+
+
+def _bili_card(rng):
+    title = rng.choice(TITLES).replace('公告：', '') or '无标题'
+    views = rng.choice([str(rng.randint(0, 9999)), f"{rng.randint(1, 999) / 10}万"])
+    date = rng.choice(['2023-9-12', '9-12', '昨天', '3小时前', '2024年3月28日'])
+    stats = ''.join(f'<span class="bili-video-card__stats--item"><svg></svg><span>{v}</span></span>'
+                    for v in [views, str(rng.randint(0, 999))][:rng.randint(0, 2)])
+    return (f'<div class="bili-video-card"><div class="bili-video-card__wrap">'
+            f'<div class="bili-video-card__stats">{stats}</div>'
+            f'<div class="bili-video-card__info"><h3 class="bili-video-card__info--tit" title="{title}">'
+            f' {title} <!-- x --></h3>'
+            f'<span class="bili-video-card__info--author">UP主</span>'
+            f'<span class="bili-video-card__info--date"> · {date}</span></div></div></div>\n')
+
+
+def _bili_page(rng):
+    if rng.random() < 0.8:
+        body = ''.join(_bili_card(rng) for _ in range(42))
+    else:
+        body = ''.join(f'<li class="video-item matrix"><a class="title" title="t">{rng.choice(TITLES)}</a>'
+                       f'<span class="so-icon time"> {rng.choice(["2023-09-12", "9-12"])} </span></li>'
+                       for _ in range(20))
+    return f'<html><body><div class="video-list">{body}</div><script>var c="bili-video-card"</script></body></html>'
+
+
+def make_fixtures(pages=50, seed=0):
+    rng = random.Random(seed)
+    for i in range(pages):
+        save_fixture('guba', f"synthetic_{i:03d}", _guba_page(rng))
+        save_fixture('bili', f"synthetic_{i:03d}", _bili_page(rng))
+    print(f"🧪 已生成合成样本: 股吧/B站 各 {pages} 页 -> {FIXTURE_DIR}")
+
+
+def load_fixtures(kind, fixture_dir=FIXTURE_DIR):
+    pages = []
+    for path in sorted(glob.glob(f"{fixture_dir}/{kind}/*.html")):
+        with open(path, encoding='utf-8', errors='replace') as f:
+            pages.append((os.path.basename(path), f.read()))
+    return pages
+
+
+def _parse(kind, html, backend):
+    return KINDS[kind](html, backend)
+
+
+# ===========================
+# 2. 一致性校验：lxml 快速路径必须与 BeautifulSoup 结果逐条一致
+# ===========================
+def verify():
+    ok = True
+    for kind in KINDS:
+        pages = load_fixtures(kind)
+        bad = 0
+        for name, html in pages:
+            expected, got = _parse(kind, html, 'bs4'), _parse(kind, html, 'lxml')
+            if expected != got:
+                bad += 1
+                diff = next((i for i, (a, b) in enumerate(zip(expected, got)) if a != b), min(len(expected), len(got)))
+                print(f"   ❌ {kind}/{name}: bs4 {len(expected)} 行, lxml {len(got)} 行, 第 {diff} 行起不同")
+                if diff < len(expected): print(f"      bs4 : {expected[diff]}")
+                if diff < len(got): print(f"      lxml: {got[diff]}")
+        rows = sum(len(_parse(kind, html, 'lxml')) for _, html in pages)
+        print(f"{'✅' if not bad else '❌'} {kind}: {len(pages)} 页 / {rows} 行, 不一致 {bad} 页")
+        ok = ok and not bad
+    return ok
+
+
+# ===========================
+# 3. 速度基准：每秒能解析多少页
+# ===========================
+def bench(repeat=3):
+    results = {}
+    for kind in KINDS:
+        pages = load_fixtures(kind)
+        if not pages: continue
+        for backend in ('bs4', 'lxml'):
+            start = time.perf_counter()
+            for _ in range(repeat):
+                for _, html in pages:
+                    _parse(kind, html, backend)
+            cost = time.perf_counter() - start
+            results[(kind, backend)] = len(pages) * repeat / cost
+        speedup = results[(kind, 'lxml')] / results[(kind, 'bs4')]
+        print(f"⏱️ {kind}: bs4 {results[(kind, 'bs4')]:.0f} 页/秒 | lxml {results[(kind, 'lxml')]:.0f} 页/秒"
+              f" | x{speedup:.1f}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HTML 解析：样本一致性校验 + 速度基准")
+    parser.add_argument('cmd', choices=['make', 'verify', 'bench', 'all'], nargs='?', default='all')
+    parser.add_argument('--pages', type=int, default=50, help="合成样本页数 (make)")
+    parser.add_argument('--repeat', type=int, default=3, help="基准重复轮数 (bench)")
+    args = parser.parse_args()
+
+    if args.cmd == 'make' or (args.cmd == 'all' and not load_fixtures('guba')):
+        make_fixtures(args.pages)
+    if args.cmd in ('verify', 'all'):
+        if not verify(): sys.exit(1)
+    if args.cmd in ('bench', 'all'):
+        bench(args.repeat)
@@ -0,0 +1,300 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import concurrent.futures
+from script_loader import load_script, BASE_DIR
+import universe
+import instrument
+
+# ===========================
+# 1. 配置：流水线各阶段 (按真实的输入/输出文件建依赖图)
+# ===========================
+RAW_DIR = "./raw_data_lake"
+REAL_DIR = "./real_data"
+STATE_PATH = "./pipeline_state.json"
+
+# 默认跑股票池 (universe.csv) 里的全部股票
+CODES = universe.codes()
+
+# 互不依赖的分支 (股吧 NLP / B站 NLP / 行情) 最多同时跑几个
+MAX_WORKERS = 3
+
+# 每个阶段:
+# - run:      (脚本名, 函数名)，函数接收 codes=[...] 只处理这些股票 (per_code=False 的阶段不传)
+# - deps:     上游阶段，全部结束后才判断本阶段是否过期
+# - inputs:   (路径模板, 是否必需)，{code} 会替换成股票代码；缺了必需输入的股票跳过
+# - outputs:  路径模板，任一缺失即视为过期
+# - code:     影响结果的源码文件，内容变了也算过期
+# - network:  联网抓取的阶段只在输出缺失或 --refresh 点名时才跑
+STAGES = {
+    'crawl': {
+        'run': ('crawl', 'run_scraper'), 'deps': [], 'network': True,
+        'inputs': [],
+        'outputs': [f"{RAW_DIR}/raw_{{code}}.csv"],
+        'code': ['crawl', 'guba_parser.py', 'guba_http.py', 'crawl_journal.py', 'page_locator.py'],
+    },
+    'bilibili_crawl': {
+        'run': ('bilibili_crawl', 'main'), 'deps': [], 'network': True,
+        'inputs': [],
+        'outputs': [f"{RAW_DIR}/bili_raw_{{code}}.csv"],
+        'code': ['bilibili_crawl'],
+    },
+    'market': {
+        'run': ('get_market_data', 'fetch_real_data'), 'deps': [], 'network': True,
+        'inputs': [],
+        'outputs': [f"{REAL_DIR}/market_{{code}}.csv"],
+        'code': ['get_market_data.py', 'market_store.py'],
+    },
+    'nlp': {
+        'run': ('nlp', 'process_nlp'), 'deps': ['crawl'],
+        'inputs': [(f"{RAW_DIR}/raw_{{code}}.csv", True)],
+        'outputs': [f"{REAL_DIR}/sentiment_{{code}}.csv", f"{REAL_DIR}/wc_{{code}}.png"],
+        'code': ['nlp.py', 'raw_loader.py', 'sentiment_engine.py', 'nlp_cache.py', 'data_lake.py'],
+    },
+    'bilibili_nlp': {
+        'run': ('bilibili_nlp', 'main'), 'deps': ['bilibili_crawl'],
+        'inputs': [(f"{RAW_DIR}/bili_raw_{{code}}.csv", True)],
+        'outputs': [f"{REAL_DIR}/bilibili_{{code}}.csv"],
+        'code': ['bilibili_nlp', 'sentiment_engine.py', 'nlp_cache.py', 'data_lake.py'],
+    },
+    'token_index': {
+        'run': ('token_index', 'build_all'), 'deps': ['crawl', 'bilibili_crawl'],
+        'inputs': [(f"{RAW_DIR}/raw_{{code}}.csv", True), (f"{RAW_DIR}/bili_raw_{{code}}.csv", False)],
+        'outputs': [f"{RAW_DIR}/token_index/guba_{{code}}.npz"],
+        'code': ['token_index.py', 'raw_loader.py', 'sentiment_engine.py', 'bilibili_nlp'],
+    },
+    'processing': {
+        'run': ('processing', 'process_final'), 'deps': ['nlp', 'bilibili_nlp', 'market', 'token_index'],
+        'inputs': [(f"{REAL_DIR}/market_{{code}}.csv", True), (f"{REAL_DIR}/sentiment_{{code}}.csv", False),
+                   (f"{REAL_DIR}/bilibili_{{code}}.csv", False),
+                   (f"{RAW_DIR}/token_index/guba_{{code}}.npz", False),
+                   (f"{RAW_DIR}/token_index/bili_{{code}}.npz", False)],
+        'outputs': [f"{REAL_DIR}/final_{{code}}.csv", f"{REAL_DIR}/stats.csv", f"{REAL_DIR}/stats_lags.csv"],
+        'code': ['processing.py', 'trade_calendar.py', 'event_study.py', 'significance.py', 'token_index.py',
+                 'data_lake.py'],
+    },
+    'visualize': {
+        'run': ('visualize', 'main'), 'deps': ['processing'], 'per_code': False,
+        'inputs': [(f"{REAL_DIR}/final_{{code}}.csv", False), (f"{REAL_DIR}/stats.csv", False)],
+        'outputs': [f"{REAL_DIR}/1_Conclusion_Diverging_Bars.png", f"{REAL_DIR}/4_Violin_Distribution.png"],
+        'code': ['visualize', 'significance.py', 'downsample.py', 'data_lake.py'],
+    },
+}
+
+ALL = '*'
+
+
+# ===========================
+# 2. 子进程入口：每个阶段一个新进程 (模块状态干净，改过的代码立即生效)
+# ===========================
+def _run_stage(name, codes):
+    module_name, func_name = STAGES[name]['run']
+    func = getattr(load_script(module_name), func_name)
+    if STAGES[name].get('per_code', True):
+        func(codes=codes)
+    else:
+        func()
+
+
+# ===========================
+# 3. 指纹 (内容哈希) 与状态
+# ===========================
+class Pipeline:
+    def __init__(self, codes=CODES, state_path=STATE_PATH, force=False, refresh=(), offline=False):
+        self.codes = list(codes)
+        self.state_path = state_path
+        self.force = force
+        self.refresh = set(refresh)
+        self.offline = offline
+
+        self.state = {'fingerprints': {}, 'files': {}}
+        if os.path.exists(state_path):
+            with open(state_path, encoding='utf-8') as f:
+                self.state = json.load(f)
+
+    def _save_state(self):
+        tmp = self.state_path + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.state_path)
+
+    def file_hash(self, path):
+        """文件内容 sha1；大小和修改时间都没变时直接用上次算的结果"""
+        if not os.path.exists(path): return None
+        st = os.stat(path)
+        cached = self.state['files'].get(path)
+        if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns: return cached[2]
+
+        h = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+        self.state['files'][path] = [st.st_size, st.st_mtime_ns, h.hexdigest()]
+        return h.hexdigest()
+
+    def _paths(self, template, code):
+        codes = self.codes if code == ALL else [code]
+        return sorted({template.format(code=c) for c in codes})
+
+    def fingerprint(self, name, code):
+        conf = STAGES[name]
+        h = hashlib.sha1(name.encode())
+        for src in conf['code']:
+            path = os.path.join(BASE_DIR, src)
+            h.update(f"{src}={self.file_hash(path)}".encode())
+        for template, _ in conf['inputs']:
+            for path in self._paths(template, code):
+                h.update(f"{path}={self.file_hash(path)}".encode())
+        # 股票池里这只股票的配置 (窗口、关键词、页码…) 改了也算过期，别的股票不受影响
+        for c in (self.codes if code == ALL else [code]):
+            h.update(f"universe:{c}={universe.row_hash(c)}".encode())
+        return h.hexdigest()
+
+    def _units(self, name):
+        return self.codes if STAGES[name].get('per_code', True) else [ALL]
+
+    def _missing_outputs(self, name, code):
+        return [p for t in STAGES[name]['outputs'] for p in self._paths(t, code) if not os.path.exists(p)]
+
+    def _missing_inputs(self, name, code):
+        return [p for t, required in STAGES[name]['inputs'] if required
+                for p in self._paths(t, code) if not os.path.exists(p)]
+
+    def stale(self, name):
+        """返回 (需要重跑的代码, {代码: 原因})"""
+        conf = STAGES[name]
+        todo, reasons = [], {}
+        for code in self._units(name):
+            key = f"{name}:{code}"
+            missing_in = self._missing_inputs(name, code)
+            missing_out = self._missing_outputs(name, code)
+
+            if conf.get('network'):
+                if self.offline:
+                    if missing_out: reasons[code] = "离线模式，缺输出但不联网"
+                    continue
+                if name in self.refresh:
+                    reason = "--refresh"
+                elif missing_out:
+                    reason = f"缺输出 {os.path.basename(missing_out[0])}"
+                else:
+                    continue
+            elif missing_in:
+                reasons[code] = f"缺输入 {os.path.basename(missing_in[0])}，跳过"
+                continue
+            elif self.force:
+                reason = "--force"
+            elif missing_out:
+                reason = f"缺输出 {os.path.basename(missing_out[0])}"
+            elif self.state['fingerprints'].get(key) != self.fingerprint(name, code):
+                reason = "输入或代码有变化"
+            else:
+                continue
+
+            todo.append(code)
+            reasons[code] = reason
+        return todo, reasons
+
+    def _commit(self, name, codes):
+        """阶段跑完后，只给真正产出了结果的代码记指纹"""
+        done = []
+        for code in codes:
+            if self._missing_outputs(name, code): continue
+            self.state['fingerprints'][f"{name}:{code}"] = self.fingerprint(name, code)
+            done.append(code)
+        self._save_state()
+        return done
+
+    # ===========================
+    # 4. 调度：依赖满足的阶段就绪即判断过期，过期的丢进进程池并行跑
+    # ===========================
+    def run(self, stages=None, workers=MAX_WORKERS, dry_run=False):
+        selected = [s for s in STAGES if stages is None or s in stages]
+        finished, failed, planned = set(), set(), set()
+        running = {}  # future -> (阶段, 进程池, 代码, 开始时间)
+        report = []
+
+        print(f"🚀 流水线启动: {len(selected)} 个阶段 | 股票 {self.codes} | 并行 {workers}")
+        pipeline_start = time.time()
+
+        while len(finished) + len(failed) < len(selected):
+            for name in selected:
+                if name in finished or name in failed or name in {job[0] for job in running.values()}: continue
+                deps = [d for d in STAGES[name]['deps'] if d in selected]
+                if any(d in failed for d in deps):
+                    print(f"   ⛔ {name}: 上游失败，跳过")
+                    failed.add(name)
+                    continue
+                if not all(d in finished for d in deps): continue
+                if len(running) >= workers: break
+
+                if dry_run and any(d in planned for d in deps):
+                    # 上游还没真跑，产物未知：照最坏情况算
+                    print(f"   🔁 {name}: 上游将重跑，届时再按指纹判断")
+                    planned.add(name)
+                    finished.add(name)
+                    report.append({'stage': name, 'codes': self._units(name), 'status': 'planned'})
+                    continue
+
+                todo, reasons = self.stale(name)
+                for code, reason in reasons.items():
+                    mark = "🔁" if code in todo else "⚠️"
+                    print(f"   {mark} {name}[{code}]: {reason}")
+                if not todo or dry_run:
+                    if todo: planned.add(name)
+                    else: print(f"   ✅ {name}: 全部最新，跳过")
+                    report.append({'stage': name, 'codes': todo, 'status': 'planned' if todo else 'fresh'})
+                    finished.add(name)
+                    continue
+
+                print(f"   ▶️ {name}: 重跑 {todo if todo != [ALL] else '全部'}")
+                executor = concurrent.futures.ProcessPoolExecutor(max_workers=1)
+                future = executor.submit(_run_stage, name, todo if todo != [ALL] else None)
+                running[future] = (name, executor, todo, time.time())
+
+            if not running: continue
+
+            done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                name, executor, codes, start = running.pop(future)
+                executor.shutdown()
+                cost = time.time() - start
+                instrument.observe(f"pipeline.{name}", cost)
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"   ❌ {name} 失败 ({cost:.1f} 秒): {type(e).__name__}: {e}")
+                    failed.add(name)
+                    report.append({'stage': name, 'codes': codes, 'status': 'failed', 'sec': cost})
+                    continue
+
+                ok = self._commit(name, codes)
+                lost = [c for c in codes if c not in ok]
+                print(f"   ✅ {name} 完成 ({cost:.1f} 秒){f' | 未产出: {lost}' if lost else ''}")
+                finished.add(name)
+                report.append({'stage': name, 'codes': codes, 'status': 'ran', 'sec': cost})
+
+        print(f"\n🏁 流水线结束，耗时 {time.time() - pipeline_start:.1f} 秒"
+              f"{f' | 失败: {sorted(failed)}' if failed else ''}")
+        return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="增量流水线：只重跑输入或代码变了的阶段/股票")
+    parser.add_argument('--codes', nargs='+', default=CODES, help="只处理这些股票")
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), help="只跑这些阶段 (默认全部)")
+    parser.add_argument('--force', action='store_true', help="忽略指纹，本地阶段全部重跑")
+    parser.add_argument('--refresh', nargs='+', default=[], choices=[s for s in STAGES if STAGES[s].get('network')],
+                        help="强制重新联网抓取这些阶段")
+    parser.add_argument('--offline', action='store_true', help="从不运行联网阶段")
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS, help="同时运行的阶段数")
+    parser.add_argument('--dry-run', action='store_true', help="只打印哪些阶段过期，不执行")
+    args = parser.parse_args()
+
+    instrument.setup('pipeline')
+    pipe = Pipeline(codes=args.codes, force=args.force, refresh=args.refresh, offline=args.offline)
+    report = pipe.run(stages=args.stages, workers=args.workers, dry_run=args.dry_run)
+    sys.exit(1 if any(r['status'] == 'failed' for r in report) else 0)
@@ -4,144 +4,190 @@ import os
 from scipy.stats import pearsonr
 from wordcloud import WordCloud
 import matplotlib.pyplot as plt
+from trade_calendar import aggregate_to_trade_days
+from data_lake import read_stage, stage_exists, save_frame
+import token_index
+from event_study import market_model_car
+import significance
+from ticker_pool import map_codes, WORKERS
+import universe
+import instrument
 
 plt.rcParams['font.sans-serif'] = ['SimHei']
 plt.rcParams['axes.unicode_minus'] = False
 DATA_DIR = "./real_data"
 
-# 股票清单
-STOCKS = {
-    '002242': {'name': '九阳股份', 'type': 'noise'},
-    '601127': {'name': '赛力斯', 'type': 'value'},
-    '01810': {'name': '小米集团', 'type': 'value'}
-}
-
-
-def process_final():
-    print("🚀 启动跨平台舆情融合引擎 (Guba + Bilibili)...")
-    stats_list = []
-
-    for code, info in STOCKS.items():
-        name = info['name']
-
-        # 1. 定义文件路径
-        guba_path = f"{DATA_DIR}/sentiment_{code}.csv"
-        bili_path = f"{DATA_DIR}/bilibili_{code}.csv"
-        market_path = f"{DATA_DIR}/market_{code}.csv"
-
-        # 检查市场数据 (必须有)
-        if not os.path.exists(market_path):
-            print(f"⚠️ 跳过 {name}: 缺股价数据")
-            continue
-
-        # 2. 读取各路数据
-        df_m = pd.read_csv(market_path, index_col=0)
-        df_m.index = pd.to_datetime(df_m.index, errors='coerce')
-
-        # 读取股吧
-        if os.path.exists(guba_path):
-            df_guba = pd.read_csv(guba_path, index_col=0)
-            df_guba.index = pd.to_datetime(df_guba.index, errors='coerce')
-            df_guba = df_guba.rename(columns={'read_count': 'guba_buzz'})
-            # 确保列存在
-            if 'guba_buzz' in df_guba.columns:
-                df_guba = df_guba[['guba_buzz']]
-            else:
-                df_guba['guba_buzz'] = 0
+# 股票清单统一在 universe.csv，本阶段用到的列：
+# terms: 额外的关键词热度因子 (需先运行 python token_index.py build)
+# event: 事件日 (市场模型以此为界：之前估 alpha/beta，整段累加异常收益)
+
+
+def save_table(df, path, codes=None):
+    """按股票合并保存：只替换 codes 这几只股票的行，其余 (没重跑的、本次失败的) 保留上次的结果"""
+    if codes is not None and os.path.exists(path):
+        old = pd.read_csv(path, dtype={'code': str})
+        df = pd.concat([old[~old['code'].isin(codes)], df], ignore_index=True)
+    df.to_csv(path, index=False)
+
+
+def process_code(code, info):
+    """
+    单只股票：融合 -> 交易日对齐 -> 累积因子 -> 相关与稳健检验，保存 final 宽表
+    返回 {'stats': 统计行, 'lags': 领先-滞后表}，数据不够返回 None (可在进程池子进程里跑)
+    """
+    name = info['name']
+
+    # 1. 定义文件路径
+    guba_path = f"{DATA_DIR}/sentiment_{code}.csv"
+    bili_path = f"{DATA_DIR}/bilibili_{code}.csv"
+    market_path = f"{DATA_DIR}/market_{code}.csv"
+
+    # 检查市场数据 (必须有)
+    if not stage_exists('market', code, market_path):
+        print(f"⚠️ 跳过 {name}: 缺股价数据")
+        return None
+
+    # 2. 读取各路数据 (优先读 Parquet 数据湖，只取用得到的列)
+    with instrument.timer('processing.read'):
+        df_m = read_stage('market', code, market_path)
+
+    # 用市场模型 CAR 替换下载时算的简单 CAR (个股 - 基准)；估计窗口数据不够就保留原值
+    if info.get('event') and {'pctChg', 'bench_ret'} <= set(df_m.columns):
+        with instrument.timer('processing.event_study'):
+            car, alpha, beta = market_model_car(df_m, info['event'])
+        if car is not None:
+            df_m['CAR'] = car
+            print(f"   📐 {name} 市场模型: alpha={alpha:.5f}, beta={beta:.3f}")
         else:
-            df_guba = pd.DataFrame(columns=['guba_buzz'])
-
-        # 读取B站
-        if os.path.exists(bili_path):
-            df_bili = pd.read_csv(bili_path, index_col=0)
-            df_bili.index = pd.to_datetime(df_bili.index, errors='coerce')
-            if 'bili_buzz' in df_bili.columns:
-                df_bili = df_bili[['bili_buzz']]
-            else:
-                df_bili['bili_buzz'] = 0
+            print(f"   ⚠️ {name} 事件前数据不足，沿用简单 CAR")
+
+    # 读取股吧
+    if stage_exists('sentiment', code, guba_path):
+        df_guba = read_stage('sentiment', code, guba_path, columns=['read_count'])
+        df_guba = df_guba.rename(columns={'read_count': 'guba_buzz'})
+        # 确保列存在
+        if 'guba_buzz' in df_guba.columns:
+            df_guba = df_guba[['guba_buzz']]
         else:
-            df_bili = pd.DataFrame(columns=['bili_buzz'])
-
-        # 3. 跨平台数据融合 (Outer Join)
-        # 这一步把股吧和B站的时间轴并集，哪天没数据就填0
-        df_social = pd.merge(df_guba, df_bili, left_index=True, right_index=True, how='outer')
-        df_social = df_social.fillna(0)
-
-        # 4. 计算全网总热度
-        if 'guba_buzz' not in df_social.columns: df_social['guba_buzz'] = 0
-        if 'bili_buzz' not in df_social.columns: df_social['bili_buzz'] = 0
-
-        df_social['total_buzz'] = df_social['guba_buzz'] + df_social['bili_buzz']
-
-        print(f"\n🔨 处理 {name}: 股吧+B站 -> 融合后{len(df_social)}天")
-
-        # 5. 交易日对齐与递延 (Weekend Effect)
-        trade_days = df_m.index.sort_values()
-
-        def get_next_trade_day(d):
-            future_days = trade_days[trade_days >= d]
-            return future_days[0] if len(future_days) > 0 else pd.NaT
-
-        df_social['trade_date'] = df_social.index.to_series().apply(get_next_trade_day)
-        df_social = df_social.dropna(subset=['trade_date'])
-
-        # 按交易日聚合
-        df_social_agg = df_social.groupby('trade_date').agg({
-            'total_buzz': 'sum',
-            'guba_buzz': 'sum',
-            'bili_buzz': 'sum'
-        })
-
-        # 6. 与股价合并 【核心修复点】
-        # 这里之前写错了变量名，现在修正为 df_social_agg
-        df_final = pd.merge(df_m, df_social_agg, left_index=True, right_index=True, how='left')
-
-        df_final['total_buzz'] = df_final['total_buzz'].fillna(0)
-
-        # 7. 计算累积趋势因子 (Cumulative Trend)
-        df_final['cum_factor'] = df_final['total_buzz'].cumsum()
-
-        # 归一化 (0-100)，方便画图和APP展示，命名为 meme_heat
-        # 避免除以0
-        denom = df_final['cum_factor'].max() - df_final['cum_factor'].min()
-        if denom == 0: denom = 1
-
-        df_final['meme_heat'] = (df_final['cum_factor'] - df_final['cum_factor'].min()) / denom
-
-        # 8. 统计分析
-        valid_df = df_final.dropna(subset=['CAR', 'meme_heat'])
-
-        if len(valid_df) > 5:
-            corr, p = pearsonr(valid_df['meme_heat'], valid_df['CAR'])
-            print(f"   📊 融合后效果: R={corr:.4f} (P={p:.4e})")
-
-            # 保存最终宽表
-            df_final.to_csv(f"{DATA_DIR}/final_{code}.csv")
-
-            # 记录统计结果
-            total_buzz_sum = df_social['total_buzz'].sum() + 1
-            stats_list.append({
-                'code': code, 'name': name,
-                'r': corr, 'p': p,
-                'guba_ratio': df_social['guba_buzz'].sum() / total_buzz_sum,
-                'bili_ratio': df_social['bili_buzz'].sum() / total_buzz_sum
-            })
-
-            # 生成混合词云 (兜底)
-            wc_path = f"{DATA_DIR}/wc_{code}.png"
-            if not os.path.exists(wc_path):
-                wc = WordCloud(font_path="C:/Windows/Fonts/simhei.ttf", background_color="white", width=800, height=500)
-                wc.generate(name)
-                wc.to_file(wc_path)
+            df_guba['guba_buzz'] = 0
+    else:
+        df_guba = pd.DataFrame(columns=['guba_buzz'])
+
+    # 读取B站
+    if stage_exists('bilibili', code, bili_path):
+        df_bili = read_stage('bilibili', code, bili_path, columns=['bili_buzz'])
+        if 'bili_buzz' in df_bili.columns:
+            df_bili = df_bili[['bili_buzz']]
         else:
-            print("   ⚠️ 有效数据不足，无法回归")
-
-    # 保存统计表
-    if stats_list:
-        stat_df = pd.DataFrame(stats_list)
-        stat_df.to_csv(f"{DATA_DIR}/stats.csv", index=False)
-        print("\n✅ 全流程结束！统计结果已保存。")
+            df_bili['bili_buzz'] = 0
+    else:
+        df_bili = pd.DataFrame(columns=['bili_buzz'])
+
+    # 3. 跨平台数据融合 (Outer Join)
+    # 这一步把股吧和B站的时间轴并集，哪天没数据就填0
+    df_social = pd.merge(df_guba, df_bili, left_index=True, right_index=True, how='outer')
+    df_social = df_social.fillna(0)
+
+    # 4. 计算全网总热度
+    if 'guba_buzz' not in df_social.columns: df_social['guba_buzz'] = 0
+    if 'bili_buzz' not in df_social.columns: df_social['bili_buzz'] = 0
+
+    df_social['total_buzz'] = df_social['guba_buzz'] + df_social['bili_buzz']
+
+    print(f"\n🔨 处理 {name}: 股吧+B站 -> 融合后{len(df_social)}天")
+
+    # 5. 交易日对齐与递延 (Weekend Effect)
+    # 排序后二分查找下一个交易日，再按交易日聚合
+    with instrument.timer('processing.align'):
+        df_social_agg = aggregate_to_trade_days(df_social, df_m.index, ['total_buzz', 'guba_buzz', 'bili_buzz'])
+
+    # 6. 与股价合并 【核心修复点】
+    # 这里之前写错了变量名，现在修正为 df_social_agg
+    df_final = pd.merge(df_m, df_social_agg, left_index=True, right_index=True, how='left')
+
+    df_final['total_buzz'] = df_final['total_buzz'].fillna(0)
+
+    # 7. 计算累积趋势因子 (Cumulative Trend)
+    df_final['cum_factor'] = df_final['total_buzz'].cumsum()
+
+    # 归一化 (0-100)，方便画图和APP展示，命名为 meme_heat
+    # 避免除以0
+    denom = df_final['cum_factor'].max() - df_final['cum_factor'].min()
+    if denom == 0: denom = 1
+
+    df_final['meme_heat'] = (df_final['cum_factor'] - df_final['cum_factor'].min()) / denom
+
+    # 关键词热度因子：按日倒排索引直接查，全网阅读加权后对齐到交易日
+    terms = info.get('terms') or []
+    if terms and token_index.has_index(code):
+        with instrument.timer('processing.token_query'):
+            kw = token_index.query(code, terms, corpus='all', weighted=True)
+        kw = aggregate_to_trade_days(kw, df_m.index, terms)
+        for t in terms:
+            df_final[f'kw_{t}'] = kw[t].reindex(df_final.index).fillna(0)
+
+    # 8. 统计分析
+    valid_df = df_final.dropna(subset=['CAR', 'meme_heat'])
+
+    if len(valid_df) > 5:
+        corr, p = pearsonr(valid_df['meme_heat'], valid_df['CAR'])
+        print(f"   📊 融合后效果: R={corr:.4f} (P={p:.4e})")
+
+        # 两条都是累积趋势序列，普通 P 值不可信：日增量上做块置换 / 块自助法 + 领先-滞后扫描
+        with instrument.timer('processing.significance'):
+            sig, lag_df = significance.test_correlation(valid_df['meme_heat'], valid_df['CAR'])
+        print(f"   🎲 稳健检验: 块置换 P={sig['p_perm']:.4f} | 日增量 R={sig['r_diff']:.4f} 块自助 P={sig['p_boot']:.4f} "
+              f"95%CI [{sig['ci_low']:.3f}, {sig['ci_high']:.3f}] | "
+              f"最强滞后 {sig['best_lag']:+d} 天 R={sig['best_r']:.4f} (P={sig['p_lag']:.4f})")
+        lag_df.insert(0, 'code', code)
+
+        # 保存最终宽表
+        with instrument.timer('save'):
+            df_final.to_csv(f"{DATA_DIR}/final_{code}.csv")
+            save_frame(df_final, 'final', code)
+
+        # 记录统计结果 (普通相关 + 平台占比 + 稳健检验，一只股票一行)；平台占比按对齐交易日之前的全部帖子算
+        total_buzz_sum = df_social['total_buzz'].sum() + 1
+        stats = {
+            'code': code, 'name': name, 'market': info.get('market'), 'type': info.get('type'),
+            'r': corr, 'p': p,
+            'guba_ratio': df_social['guba_buzz'].sum() / total_buzz_sum,
+            'bili_ratio': df_social['bili_buzz'].sum() / total_buzz_sum,
+            **{k: v for k, v in sig.items() if k != 'r'}
+        }
+
+        # 生成混合词云 (兜底)
+        wc_path = f"{DATA_DIR}/wc_{code}.png"
+        if not os.path.exists(wc_path):
+            wc = WordCloud(font_path="C:/Windows/Fonts/simhei.ttf", background_color="white", width=800, height=500)
+            wc.generate(name)
+            wc.to_file(wc_path)
+        return {'stats': stats, 'lags': lag_df}
+    else:
+        print("   ⚠️ 有效数据不足，无法回归")
+        return None
+
+
+def process_final(codes=None, workers=WORKERS):
+    print("🚀 启动跨平台舆情融合引擎 (Guba + Bilibili)...")
+    stocks = universe.select(codes)
+    results = {}
+    for code, result in map_codes(process_code, stocks, workers):
+        if isinstance(result, Exception):
+            print(f"❌ {stocks[code]['name']} 失败: {result!r}")
+        elif result is not None:
+            results[code] = result
+
+    # 各股票的结果按股票池顺序合并成一张 stats 表 (visualize 直接读)；领先-滞后表另存
+    # 只替换本次成功的股票，失败的股票沿用上次的结果，不能被清掉
+    done = [code for code in stocks if code in results]
+    if done:
+        save_table(pd.DataFrame([results[c]['stats'] for c in done]), f"{DATA_DIR}/stats.csv", done)
+        save_table(pd.concat([results[c]['lags'] for c in done], ignore_index=True), f"{DATA_DIR}/stats_lags.csv", done)
+        print(f"\n✅ 全流程结束！{len(done)} 只股票的统计结果已合并保存。")
 
 
 if __name__ == "__main__":
-    process_final()
+    instrument.setup('processing')
+    with instrument.stage('processing'):
+        process_final()
@@ -0,0 +1,149 @@
+import numpy as np
+import pandas as pd
+import instrument
+
+# ===========================
+# 1. 配置：股吧原始帖子的紧凑读取 + 跨页去重
+# ===========================
+# crawl 写出的日期固定是 YYYY-MM-DD，显式给格式，不让 pandas 逐条猜
+DATE_FORMAT = '%Y-%m-%d'
+# 爬取过程中列表页会整体后移，同一帖子会在相邻页再出现一次
+# 去重键 = (标题, 日期, 阅读数) 的哈希；keep: 'first' 保留先抓到的 / 'last' 保留后抓到的 / 'none' 不去重
+KEEP = 'first'
+KEY_COLUMNS = ['title', 'date', 'read_count']
+KEEP_POLICIES = ('first', 'last', 'none')
+# 流式分块只能先到先得：'last' 要看到后面的块才知道哪条是最后一条
+STREAM_KEEP_POLICIES = ('first', 'none')
+# 流式去重只记当前块日期前后这么多天的键 (重复帖来自相邻页，日期紧挨着)，内存只跟这几天的帖子数有关
+# 代价：抓取顺序被打乱、同一帖子隔了这么多天的页才再出现时，流式模式会漏掉 (批量模式不会)
+STREAM_DEDUP_DAYS = 7
+
+INT32_MAX = np.iinfo(np.int32).max
+
+
+def _mb(df):
+    return df.memory_usage(deep=True).sum() / 1024 ** 2
+
+
+def _parse_dates(col, fmt=DATE_FORMAT):
+    """同一天的帖子成百上千条：只解析不重复的日期字符串，再按类别编码展开"""
+    cat = col.astype('category')
+    parsed = pd.to_datetime(pd.Series(cat.cat.categories), format=fmt, errors='coerce').to_numpy()
+    # codes 为 -1 (缺失) 时取到末尾追加的 NaT
+    return pd.Series(np.append(parsed, np.datetime64('NaT'))[cat.cat.codes.to_numpy()], index=col.index)
+
+
+def compact(df, date_format=DATE_FORMAT):
+    """
+    原始帖子 -> 紧凑表
+    - date: datetime64 (显式格式解析)
+    - title: category (重复标题只存一份，NLP 也只按类别算一次)
+    - read_count: int32 (缺失记 0，超出范围截断)
+    """
+    out = pd.DataFrame(index=df.index)
+    out['date'] = _parse_dates(df['date'], date_format)
+    out['title'] = df['title'].astype(str).astype('category')
+    reads = pd.to_numeric(df['read_count'], errors='coerce').fillna(0).clip(0, INT32_MAX)
+    out['read_count'] = reads.astype(np.int32)
+    return out
+
+
+def post_keys(df):
+    """每条帖子的 64 位去重键 (标题、日期、阅读数一起哈希)"""
+    return pd.util.hash_pandas_object(df[KEY_COLUMNS], index=False).to_numpy()
+
+
+def dedup_posts(df, keep=KEEP):
+    """按 (标题, 日期, 阅读数) 去重，返回 (去重后的表, 去掉的条数)"""
+    if keep not in KEEP_POLICIES: raise ValueError(f"未知去重策略: {keep} (可选 {KEEP_POLICIES})")
+    if keep == 'none' or df.empty: return df, 0
+
+    dup = pd.Series(post_keys(df)).duplicated(keep=keep).to_numpy()
+    return df[~dup], int(dup.sum())
+
+
+# ===========================
+# 2. 对外接口
+# ===========================
+def load_raw(path, keep=KEEP, date_format=DATE_FORMAT, label=""):
+    """
+    读 raw_{code}.csv：紧凑类型 + 去重 (在任何打分之前)
+    打印并记录去重条数和省下的内存
+    """
+    with instrument.timer('raw.read_csv'):
+        df = pd.read_csv(path, usecols=['date', 'title', 'read_count'])
+    return prepare_raw(df, keep, date_format, label)
+
+
+def prepare_raw(df, keep=KEEP, date_format=DATE_FORMAT, label=""):
+    """已经在内存里的原始帖子 (如 journal 拼出来的表) 走同样的紧凑化 + 去重"""
+    before = _mb(df)
+    n_in = len(df)
+
+    with instrument.timer('raw.compact'):
+        df = compact(df, date_format)
+        df, removed = dedup_posts(df, keep)
+        # 去重后删掉用不到的类别
+        df['title'] = df['title'].cat.remove_unused_categories()
+        df = df.reset_index(drop=True)
+
+    after = _mb(df)
+    bad_dates = int(df['date'].isna().sum())
+    instrument.count('raw.rows', n_in)
+    instrument.count('raw.duplicates', removed)
+    instrument.observe('raw.mem_saved_mb', before - after)
+
+    tag = f"[{label}] " if label else ""
+    print(f"   🧹 {tag}原始帖子 {n_in} 条 | 跨页重复 {removed} 条 ({removed / max(n_in, 1):.1%}, 保留 {keep})"
+          f" | 内存 {before:.1f} MB -> {after:.1f} MB (省 {before - after:.1f} MB)"
+          + (f" | 无效日期 {bad_dates} 条" if bad_dates else ""))
+    return df
+
+
+NAT_DAY = np.iinfo(np.int64).min
+
+
+class StreamDeduper:
+    """
+    流式分块读取时的跨块去重：按日期分桶记每条帖子的 64 位键 (8 字节/条)
+    键里含日期，只需查同一天的桶；离当前块日期范围超过 window_days 天的桶丢掉 (无效日期的桶一直留着)
+    keep: 'first' 先到先得 / 'none' 不去重
+    """
+
+    def __init__(self, keep=KEEP, window_days=STREAM_DEDUP_DAYS):
+        if keep not in STREAM_KEEP_POLICIES:
+            raise ValueError(f"流式模式不支持去重策略: {keep} (可选 {STREAM_KEEP_POLICIES})")
+        self.keep = keep
+        self.window_days = window_days
+        self.seen = {}
+        self.removed = 0
+        self.evicted = 0
+
+    def __len__(self):
+        return sum(len(keys) for keys in self.seen.values())
+
+    def __call__(self, chunk):
+        if self.keep == 'none' or chunk.empty: return chunk
+        keys = post_keys(chunk)
+        days = chunk['date'].to_numpy().astype('datetime64[D]').astype(np.int64)
+        uniq = np.unique(days)
+
+        # 块内重复 + 之前块里同一天见过的
+        fresh = ~pd.Series(keys).duplicated().to_numpy()
+        known = [self.seen[d] for d in uniq.tolist() if d in self.seen]
+        if known: fresh &= ~np.isin(keys, np.concatenate(known))
+        self.removed += int((~fresh).sum())
+
+        new_days, new_keys = days[fresh], keys[fresh]
+        order = np.argsort(new_days, kind='stable')
+        for part in np.split(order, np.flatnonzero(np.diff(new_days[order])) + 1):
+            if not len(part): continue
+            day = int(new_days[part[0]])
+            self.seen[day] = np.concatenate([self.seen.get(day, np.empty(0, dtype=np.uint64)), new_keys[part]])
+
+        valid = uniq[uniq != NAT_DAY]
+        if len(valid):
+            lo, hi = int(valid.min()) - self.window_days, int(valid.max()) + self.window_days
+            for day in [d for d in self.seen if d != NAT_DAY and not lo <= d <= hi]:
+                self.evicted += len(self.seen.pop(day))
+        return chunk[fresh]
@@ -0,0 +1,29 @@
+import os
+import sys
+import importlib.util
+from importlib.machinery import SourceFileLoader
+
+# ===========================
+# 加载没有 .py 后缀的脚本 (crawl / bilibili_crawl / bilibili_nlp / visualize)
+# ===========================
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_script(name):
+    """按文件名把脚本当模块导入 (只执行一次，之后从 sys.modules 取)"""
+    if name in sys.modules: return sys.modules[name]
+
+    path = os.path.join(BASE_DIR, name)
+    if not os.path.exists(path): path += ".py"
+
+    loader = SourceFileLoader(name, path)
+    spec = importlib.util.spec_from_loader(name, loader)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+def call_script(name, func, *args, **kwargs):
+    """加载脚本并调用其中的函数 (可被 pickle，进程池里用它跑无后缀脚本的函数)"""
+    return getattr(load_script(name), func)(*args, **kwargs)
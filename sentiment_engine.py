@@ -0,0 +1,144 @@
+import os
+import time
+import concurrent.futures
+import pandas as pd
+from nlp_cache import normalize_title, title_key
+import instrument
+
+# ===========================
+# 1. 配置：多进程批量打分
+# ===========================
+# 默认留一个核给主进程
+DEFAULT_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+# 每个任务块的标题条数 (太小进程通信开销大，太大负载不均)
+CHUNK_SIZE = 2000
+# 打分失败时的中性兜底分
+FALLBACK_SCORE = 0.5
+
+# 每个子进程只加载一次 SnowNLP / jieba
+_SNOW = None
+_JIEBA = None
+
+
+def _init_snow():
+    global _SNOW
+    from snownlp import SnowNLP
+    _SNOW = SnowNLP
+
+
+def _init_jieba():
+    global _JIEBA
+    import jieba
+    jieba.initialize()
+    _JIEBA = jieba
+
+
+def _score_chunk(texts):
+    if _SNOW is None: _init_snow()
+
+    scores = []
+    for text in texts:
+        try:
+            scores.append(_SNOW(text).sentiments)
+        except:
+            scores.append(FALLBACK_SCORE)
+    return scores
+
+
+def _tokenize_chunk(texts):
+    if _JIEBA is None: _init_jieba()
+    return [_JIEBA.lcut(text) for text in texts]
+
+
+def _run_chunks(func, init, texts, workers, chunk_size):
+    """把 texts 切块丢进进程池，按原顺序拼回结果，返回 (结果, 实际进程数)"""
+    chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+
+    # 数据量小时直接单进程，省掉起进程和加载模型的开销
+    if workers == 1 or len(chunks) <= 1:
+        results = [func(c) for c in chunks]
+        workers = 1
+    else:
+        workers = min(workers, len(chunks))
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=init) as executor:
+            # map 保证按提交顺序返回
+            results = list(executor.map(func, chunks))
+
+    return [r for chunk in results for r in chunk], workers
+
+
+def _batch_compute(texts, func, init, workers, chunk_size, label, cache, getter, putter):
+    """
+    去重 + 查缓存 + 只算没见过的标题，最后按输入顺序展开
+    规范化后的标题只用作去重和缓存的键；模型拿到的是原标题 (同键的第一条)，和逐条 SnowNLP(str(title)) 一致
+    """
+    index = texts.index if isinstance(texts, pd.Series) else None
+    if index is not None and isinstance(texts.dtype, pd.CategoricalDtype):
+        # 分类标题 (raw_loader 读出来的)：每个类别只转换一次，再按编码展开；编码 -1 (缺失) 取末尾的 "nan"
+        cats = [str(t) for t in texts.cat.categories] + [str(float('nan'))]
+        keys = [normalize_title(t) for t in cats]
+        codes = texts.cat.codes.tolist()
+        raw, norm = [cats[c] for c in codes], [keys[c] for c in codes]
+    else:
+        raw = [str(t) for t in texts]
+        norm = [normalize_title(t) for t in raw]
+    workers = workers or DEFAULT_WORKERS
+
+    start = time.time()
+
+    # 同一批里的重复标题只算一次
+    unique, first = {}, {}
+    for text, original in zip(norm, raw):
+        if text not in unique:
+            unique[text] = title_key(text)
+            first[text] = original
+    keys = list(unique.values())
+
+    known = getattr(cache, getter)(keys) if cache is not None else {}
+    todo = [text for text, key in unique.items() if key not in known]
+
+    used = 0
+    if todo:
+        fresh, used = _run_chunks(func, init, [first[text] for text in todo], workers, chunk_size)
+        fresh = {unique[text]: value for text, value in zip(todo, fresh)}
+        if cache is not None: getattr(cache, putter)(fresh)
+        known.update(fresh)
+
+    if cache is not None: cache.stats['dup_saved'] += len(norm) - len(unique)
+    values = [known[unique[text]] for text in norm]
+
+    cost = time.time() - start
+    speed = len(values) / cost if cost > 0 else 0
+
+    kind = getter.split('_')[-1]  # scores / tokens
+    instrument.observe(f"nlp.{kind}.sec", cost)
+    instrument.observe(f"nlp.{kind}.rows_per_sec", speed)
+    instrument.count(f"nlp.{kind}.rows", len(values))
+    instrument.count(f"nlp.{kind}.computed", len(todo))
+    print(f"   ⚡ {label}: {len(values)} 条 (去重 {len(unique)}, 新算 {len(todo)}) | {used} 进程"
+          f" | 耗时 {cost:.1f} 秒 | {speed:.0f} 条/秒")
+    return values, index
+
+
+# ===========================
+# 2. 对外接口
+# ===========================
+def batch_sentiment(texts, workers=None, chunk_size=CHUNK_SIZE, label="情感打分", cache=None):
+    """
+    批量计算情感分
+    - texts 可以是 Series 或任意可迭代对象，返回值顺序与输入一致
+    - 传入 Series 时返回同索引的 Series，否则返回 list
+    - 传入 NLPCache 时只计算缓存里没有的标题
+    """
+    scores, index = _batch_compute(texts, _score_chunk, _init_snow, workers, chunk_size, label,
+                                   cache, 'get_scores', 'put_scores')
+    if index is not None:
+        return pd.Series(scores, index=index, dtype=float)
+    return scores
+
+
+def batch_tokenize(texts, workers=None, chunk_size=CHUNK_SIZE, label="jieba 分词", cache=None):
+    """批量分词，返回与输入等长的词列表 list"""
+    tokens, _ = _batch_compute(texts, _tokenize_chunk, _init_jieba, workers, chunk_size, label,
+                               cache, 'get_tokens', 'put_tokens')
+    return tokens
@@ -0,0 +1,198 @@
+import numpy as np
+import pandas as pd
+
+# ===========================
+# 1. 配置：舆情热度 vs CAR 的稳健显著性检验
+# ===========================
+# 置换 / 自助法各重抽样这么多次
+N_RESAMPLES = 10000
+# 领先-滞后扫描范围：±MAX_LAG 个交易日
+MAX_LAG = 10
+# 块长：None 表示按 T^(1/3) 自动取 (块内保留序列的自相关和趋势)
+BLOCK = None
+# 每批最多同时展开多少条重抽样序列 (控制内存)
+BATCH = 2000
+SEED = 0
+
+
+def block_length(n, block=BLOCK):
+    return int(block) if block else max(2, int(np.ceil(n ** (1 / 3))))
+
+
+# ===========================
+# 2. 向量化相关系数
+# ===========================
+def corr_rows(x, y):
+    """逐行 Pearson 相关：x / y 形状 (B, T)，返回 (B,)；常数序列记 NaN"""
+    xc = x - x.mean(axis=-1, keepdims=True)
+    yc = y - y.mean(axis=-1, keepdims=True)
+    den = np.sqrt((xc ** 2).sum(axis=-1) * (yc ** 2).sum(axis=-1))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(den > 0, (xc * yc).sum(axis=-1) / den, np.nan)
+
+
+def xcorr_lags(x, y, max_lag=MAX_LAG):
+    """
+    一次 FFT 算出所有滞后的 Pearson 相关: r[k] = corr(x_t, y_{t+k})，k = -max_lag..max_lag
+    k > 0 表示 x (舆情) 领先 y (CAR) k 个交易日；每个 k 只用两段序列的重叠部分
+    x: (T,) 或 (B, T)；y: (T,) 或 (B, T) (批量重抽样时 x 不用复制)
+    返回 (lags, r)，r 形状 (..., 2 * max_lag + 1)
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    T = x.shape[-1]
+    max_lag = min(max_lag, T - 3)
+    lags = np.arange(-max_lag, max_lag + 1)
+
+    # 先去掉整体均值 (Pearson 对平移不变)，FFT 的舍入误差更小
+    x = x - x.mean(axis=-1, keepdims=True)
+    y = y - y.mean(axis=-1, keepdims=True)
+
+    # 补零到 >= 2T-1 避免循环卷绕：c[k] = sum_t x_t * y_{t+k}，负滞后在末尾
+    n = 1 << (2 * T - 1).bit_length()
+    c = np.fft.irfft(np.conj(np.fft.rfft(x, n)) * np.fft.rfft(y, n), n)
+    sxy = c[..., lags % n]
+
+    # 重叠段的一阶、二阶和用前缀和取：x 取 [neg, T-pos)，y 取 [pos, T-neg)
+    def prefix(a):
+        return np.concatenate([np.zeros(a.shape[:-1] + (1,)), np.cumsum(a, axis=-1)], axis=-1)
+
+    pos, neg = np.maximum(lags, 0), np.maximum(-lags, 0)
+    cx, cx2, cy, cy2 = prefix(x), prefix(x ** 2), prefix(y), prefix(y ** 2)
+    sx, sxx = cx[..., T - pos] - cx[..., neg], cx2[..., T - pos] - cx2[..., neg]
+    sy, syy = cy[..., T - neg] - cy[..., pos], cy2[..., T - neg] - cy2[..., pos]
+    N = T - np.abs(lags)
+
+    den = np.sqrt(np.clip(N * sxx - sx ** 2, 0, None) * np.clip(N * syy - sy ** 2, 0, None))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        r = np.where(den > 0, (N * sxy - sx * sy) / den, np.nan)
+    return lags, r
+
+
+# ===========================
+# 3. 重抽样下标 (整批生成，没有逐次循环)
+# ===========================
+def block_bootstrap_indices(n, size, block, rng):
+    """移动块自助法：随机起点的连续块 (首尾相接) 拼成长度 n 的序列，返回 (size, n)"""
+    n_blocks = -(-n // block)
+    starts = rng.integers(0, n, size=(size, n_blocks))
+    return (starts[:, :, None] + np.arange(block)).reshape(size, -1)[:, :n] % n
+
+
+def block_permutation_indices(n, size, block, rng):
+    """块置换：按长度 block 切块，只打乱块的顺序 (块内顺序不变)，返回 (size, n)"""
+    n_blocks = -(-n // block)
+    slots = np.arange(n_blocks * block).reshape(n_blocks, block)
+    slots[slots >= n] = -1  # 最后一块不满，用 -1 占位
+    order = np.argsort(rng.random((size, n_blocks)), axis=1)
+    idx = slots[order].reshape(size, -1)
+    return idx[idx >= 0].reshape(size, n)
+
+
+# ===========================
+# 4. 一对序列的全部检验
+# ===========================
+def recumulate(start, steps):
+    """重抽样后的日增量 (size, n-1) 从原序列起点重新累加回水平序列 (size, n)"""
+    head = np.full(steps.shape[:-1] + (1,), start)
+    return np.concatenate([head, start + np.cumsum(steps, axis=-1)], axis=-1)
+
+
+def test_correlation(x, y, n_resamples=N_RESAMPLES, max_lag=MAX_LAG, block=BLOCK, seed=SEED):
+    """
+    x = meme_heat，y = CAR (等长、无缺失)。两者都是累积、带趋势的序列，普通 Pearson 的 P 值会严重偏小；
+    直接对水平值做块重抽样也一样 (两条独立随机游走照样大半“显著”)，所以重抽样一律作用在日增量上
+    返回 (summary, lag_table)
+    - summary: n / block (日增量上的块长) / r (水平值相关) / r_diff (日增量相关)
+               p_perm            块置换检验：打乱 CAR 日增量的块顺序再累加回去，和 x 算水平相关，得到“无关的累积序列”的 r 分布
+               p_boot, ci_low/high  成对移动块自助法 (日增量) 的双侧 P 值和 r_diff 的 95% 置信区间
+               best_lag / best_r / p_lag  领先-滞后扫描中 |r| 最大的滞后，p_lag 用置换的 max|r| 分布校正多重比较
+    - lag_table: 每个滞后一行 lag / r / p_perm
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    dx, dy = np.diff(x), np.diff(y)
+    b = block_length(n - 1, block)
+    rng = np.random.default_rng(seed)
+
+    lags, r_lag = xcorr_lags(x, y, max_lag)
+    r0 = float(r_lag[lags == 0][0])
+    r_diff = float(corr_rows(dx, dy))
+    abs_lag = np.abs(r_lag)
+    best = int(np.nanargmax(abs_lag)) if not np.isnan(abs_lag).all() else int(np.flatnonzero(lags == 0)[0])
+
+    exceed = np.zeros(len(lags))
+    exceed_max = 0
+    boot = []
+    for start in range(0, n_resamples, BATCH):
+        size = min(BATCH, n_resamples - start)
+
+        # 置换：x 不动，整批打乱 y 日增量的块顺序再累加，一次 FFT 算出所有滞后
+        y_null = recumulate(y[0], dy[block_permutation_indices(n - 1, size, b, rng)])
+        _, r_perm = xcorr_lags(x, y_null, max_lag)
+        r_perm = np.nan_to_num(np.abs(r_perm), nan=0.0)
+        exceed += (r_perm >= abs_lag).sum(axis=0)
+        exceed_max += int((r_perm.max(axis=1) >= abs_lag[best]).sum())
+
+        # 自助法：(dx, dy) 成对按块重抽样
+        idx = block_bootstrap_indices(n - 1, size, b, rng)
+        boot.append(corr_rows(dx[idx], dy[idx]))
+
+    boot = np.concatenate(boot)
+    boot = boot[~np.isnan(boot)]
+    # 算不出相关 (常数序列) 的滞后，P 值也记 NaN
+    p_lag = np.where(np.isnan(r_lag), np.nan, (exceed + 1) / (n_resamples + 1))
+    has_boot = len(boot) > 0 and not np.isnan(r_diff)
+
+    summary = {
+        'n': n, 'block': b, 'r': r0, 'r_diff': r_diff,
+        'p_perm': float(p_lag[lags == 0][0]),
+        # 以 r_diff 为中心的自助分布检验 H0: r_diff = 0
+        'p_boot': float((np.sum(np.abs(boot - r_diff) >= abs(r_diff)) + 1) / (len(boot) + 1)) if has_boot else np.nan,
+        'ci_low': float(np.percentile(boot, 2.5)) if has_boot else np.nan,
+        'ci_high': float(np.percentile(boot, 97.5)) if has_boot else np.nan,
+        'best_lag': int(lags[best]), 'best_r': float(r_lag[best]),
+        'p_lag': (exceed_max + 1) / (n_resamples + 1) if not np.isnan(abs_lag[best]) else np.nan,
+    }
+    lag_table = pd.DataFrame({'lag': lags, 'r': r_lag, 'p_perm': p_lag})
+    return summary, lag_table
+
+
+# ===========================
+# 5. 零假设校准：两条独立随机游走，检验的拒绝率应该接近 alpha
+# ===========================
+def calibrate(pairs=200, T=100, alpha=0.05, n_resamples=999, seed=SEED):
+    """返回 {'p_perm': 拒绝率, 'p_boot': ..., 'p_lag': ..., 'pearson': 普通 P 值的拒绝率 (对照)}"""
+    from scipy.stats import pearsonr
+    rng = np.random.default_rng(seed)
+    hits = {'p_perm': 0, 'p_boot': 0, 'p_lag': 0, 'pearson': 0}
+    for i in range(pairs):
+        x = np.cumsum(rng.normal(size=T))
+        y = np.cumsum(rng.normal(size=T))
+        summary, _ = test_correlation(x, y, n_resamples=n_resamples, seed=seed + i + 1)
+        for k in ('p_perm', 'p_boot', 'p_lag'):
+            hits[k] += summary[k] < alpha
+        hits['pearson'] += pearsonr(x, y)[1] < alpha
+    return {k: v / pairs for k, v in hits.items()}
+
+
+def stars(p):
+    """显著性星号：*** <0.01, ** <0.05, * <0.1"""
+    if p is None or np.isnan(p): return ""
+    return "***" if p < 0.01 else "**" if p < 0.05 else "*" if p < 0.1 else ""
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="显著性检验的零假设校准 (独立随机游走的假阳性率)")
+    parser.add_argument('--pairs', type=int, default=200, help="模拟多少对独立随机游走")
+    parser.add_argument('--T', type=int, default=100, help="每条序列长度 (交易日)")
+    parser.add_argument('--alpha', type=float, default=0.05)
+    parser.add_argument('--resamples', type=int, default=999, help="每对的重抽样次数")
+    args = parser.parse_args()
+
+    rates = calibrate(args.pairs, args.T, args.alpha, args.resamples)
+    for k, rate in rates.items():
+        ok = k == 'pearson' or abs(rate - args.alpha) <= 2 * np.sqrt(args.alpha * (1 - args.alpha) / args.pairs) + 0.01
+        print(f"{'✅' if ok else '❌'} {k}: 假阳性率 {rate:.3f} (alpha={args.alpha})")
@@ -0,0 +1,76 @@
+import os
+import functools
+import concurrent.futures
+import sentiment_engine
+from script_loader import call_script
+import instrument
+
+# ===========================
+# 按股票并行：每只股票一个任务，丢进进程池
+# ===========================
+# 默认进程数 (股票多时按 CPU 数开，最多 8 个)
+WORKERS = min(8, os.cpu_count() or 1)
+# 同时在途的任务数 = 进程数 * INFLIGHT：回来一个再补一个，几百只股票也不会把任务和结果全堆在内存里
+INFLIGHT = 2
+# 每个子进程处理这么多只股票后换新进程 (模型、缓存、内存碎片不会越积越多)
+TASKS_PER_CHILD = 20
+
+
+def _init_worker(inner):
+    # 外层已经按股票并行，子进程里的情感打分进程池相应缩小，避免 N x N 个进程抢 CPU
+    sentiment_engine.DEFAULT_WORKERS = inner
+
+
+def _run_task(func, code, conf):
+    """子进程里跑一只股票：连同这个任务的埋点一起带回父进程 (否则各阶段摘要里看不到按股票的计时)"""
+    instrument.reset()
+    try:
+        result = func(code, conf)
+    except Exception as e:
+        result = e
+    return result, instrument.snapshot(samples=True)
+
+
+def script_func(name, func, *args, **kwargs):
+    """无后缀脚本里的函数 (bilibili_nlp 等)，包成可以发给子进程的可调用对象"""
+    return functools.partial(call_script, name, func, *args, **kwargs)
+
+
+def map_codes(func, stocks, workers=WORKERS, label="股票"):
+    """
+    对 stocks ({code: 配置}) 里每只股票调用 func(code, conf)，按完成顺序 yield (code, 结果)
+    某只股票抛异常时结果就是那个异常，不影响其他股票；workers <= 1 或只有一只股票时在当前进程顺序跑
+    """
+    items = list(stocks.items())
+    workers = max(1, min(workers, len(items)))
+    if workers == 1:
+        for code, conf in items:
+            try:
+                yield code, func(code, conf)
+            except Exception as e:
+                yield code, e
+        return
+
+    inner = max(1, sentiment_engine.DEFAULT_WORKERS // workers)
+    print(f"   🧵 {len(items)} 只{label}，{workers} 个进程并行 (每进程打分 {inner} 进程)")
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(inner,),
+                                                max_tasks_per_child=TASKS_PER_CHILD) as executor:
+        pending = {}
+        todo = iter(items)
+        while True:
+            for code, conf in todo:
+                pending[executor.submit(_run_task, func, code, conf)] = code
+                if len(pending) >= workers * INFLIGHT: break
+            if not pending: return
+
+            done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                code = pending.pop(future)
+                instrument.count('pool.tickers')
+                try:
+                    result, snap = future.result()
+                    instrument.merge(snap)
+                except Exception as e:
+                    # 子进程崩了 / 结果发不回来：这只股票记为失败
+                    result = e
+                yield code, result
@@ -0,0 +1,182 @@
+import os
+import re
+import sys
+import time
+import numpy as np
+import pandas as pd
+from sentiment_engine import batch_tokenize
+from nlp_cache import NLPCache
+from script_loader import load_script
+from raw_loader import load_raw
+import universe
+
+# ===========================
+# 1. 配置：按日倒排索引 (词 -> 每日帖子数 / 阅读加权数)
+# ===========================
+RAW_DIR = "./raw_data_lake"
+INDEX_DIR = "./raw_data_lake/token_index"
+
+# jieba 不一定切得出来的梗/型号，额外按子串整体建索引 (股票池里各股票的 terms 也会自动加进来)
+PHRASES = ['哈基米', '遥遥领先', '问界', '华为', '雷军', 'su7', '小米汽车']
+
+# 只保留含文字/数字的词，丢掉标点和空白
+WORD_RE = re.compile(r'\w')
+
+
+def _phrases():
+    terms = [t.lower() for conf in universe.load().values() for t in conf['terms']]
+    return list(dict.fromkeys(PHRASES + terms))
+
+
+def _index_path(corpus, code):
+    return f"{INDEX_DIR}/{corpus}_{code}.npz"
+
+
+# ===========================
+# 2. 读取语料 (统一成 date / title / weight 三列)
+# ===========================
+def load_corpus(corpus, code):
+    if corpus == 'guba':
+        path = f"{RAW_DIR}/raw_{code}.csv"
+        if not os.path.exists(path): return None
+        # 与 nlp 同一口径：跨页重复帖只算一次
+        df = load_raw(path, label=f"guba/{code}")
+        df['weight'] = df['read_count'].astype(float)
+    else:
+        path = f"{RAW_DIR}/bili_raw_{code}.csv"
+        if not os.path.exists(path): return None
+        # 复用 B站清洗逻辑，热度口径与 bilibili_nlp 一致
+        bili = load_script('bilibili_nlp')
+        df = pd.read_csv(path)
+        df['date'] = pd.to_datetime(df['raw_date'].apply(bili.clean_date), errors='coerce')
+        df['weight'] = df['raw_views'].apply(bili.clean_count) + df['raw_danmaku'].apply(bili.clean_count) * 10
+
+    df = df.dropna(subset=['date'])
+    df['title'] = df['title'].astype(str)
+    return df[['date', 'title', 'weight']].reset_index(drop=True)
+
+
+# ===========================
+# 3. 建索引
+# ===========================
+def build_index(corpus, code, cache=None):
+    """分词一次，写出紧凑的 CSR 结构：词表 + 每个词的 (日期下标, 帖子数, 阅读加权)"""
+    df = load_corpus(corpus, code)
+    if df is None or df.empty:
+        print(f"   ⚠️ 跳过 {corpus}/{code}: 无语料")
+        return None
+
+    tokens = batch_tokenize(df['title'], cache=cache, label=f"{corpus}/{code} 分词")
+
+    # 每个帖子里的词去重后展开成 (帖子, 词) 对：统计的是“提到该词的帖子数”
+    post_ids, words = [], []
+    for i, ws in enumerate(tokens):
+        for w in {w.lower() for w in ws if WORD_RE.search(w)}:
+            post_ids.append(i)
+            words.append(w)
+
+    # 短语按子串匹配 (向量化)
+    lower_titles = df['title'].str.lower()
+    for phrase in _phrases():
+        hit = np.flatnonzero(lower_titles.str.contains(phrase, regex=False).values)
+        post_ids.extend(hit.tolist())
+        words.extend([phrase] * len(hit))
+
+    pairs = pd.DataFrame({'word': words, 'post': post_ids}).drop_duplicates()
+    pairs['day'] = df['date'].values[pairs['post'].values].astype('datetime64[D]')
+    pairs['weight'] = df['weight'].values[pairs['post'].values]
+
+    agg = pairs.groupby(['word', 'day']).agg(count=('post', 'size'), weighted=('weight', 'sum')).reset_index()
+
+    # 按 numpy 的字符串顺序重排，保证每个词的记录连续、词表可二分查找
+    word_arr = np.asarray(agg['word'].tolist(), dtype=str)
+    order = np.argsort(word_arr, kind='stable')
+    agg, word_arr = agg.iloc[order], word_arr[order]
+
+    days = np.unique(agg['day'].values)
+    vocab, starts = np.unique(word_arr, return_index=True)
+    indptr = np.append(starts, len(agg)).astype(np.int64)
+
+    os.makedirs(INDEX_DIR, exist_ok=True)
+    np.savez_compressed(
+        _index_path(corpus, code),
+        vocab=vocab, days=days,
+        indptr=indptr,
+        day_idx=np.searchsorted(days, agg['day'].values).astype(np.int32),
+        counts=agg['count'].values.astype(np.int32),
+        weighted=agg['weighted'].values.astype(np.float64),
+    )
+    print(f"   ✅ {corpus}/{code}: {len(df)} 帖, 词表 {len(vocab)}, {len(days)} 天 -> {_index_path(corpus, code)}")
+    return len(vocab)
+
+
+def build_all(codes=None):
+    print("🚀 构建按日倒排索引...")
+    cache = NLPCache()
+    for code in universe.select(codes):
+        for corpus in ('guba', 'bili'):
+            build_index(corpus, code, cache=cache)
+    print(f"\n📦 {cache.summary()}")
+    cache.close()
+
+
+# ===========================
+# 4. 查询
+# ===========================
+_LOADED = {}
+
+
+def _load(corpus, code):
+    key = (corpus, code)
+    if key not in _LOADED:
+        path = _index_path(corpus, code)
+        _LOADED[key] = dict(np.load(path)) if os.path.exists(path) else None
+    return _LOADED[key]
+
+
+def has_index(code):
+    return any(os.path.exists(_index_path(c, code)) for c in ('guba', 'bili'))
+
+
+def query(code, terms, corpus='guba', weighted=False):
+    """
+    返回日度时间序列 DataFrame：index 为日期，每个词一列
+    - weighted=False: 提到该词的帖子数
+    - weighted=True:  提到该词的帖子的阅读量 (B站为播放+弹幕*10) 之和
+    corpus 可取 'guba' / 'bili' / 'all' (两者相加)
+    """
+    if isinstance(terms, str): terms = [terms]
+    if corpus == 'all':
+        parts = [query(code, terms, c, weighted) for c in ('guba', 'bili')]
+        return parts[0].add(parts[1], fill_value=0)
+
+    idx = _load(corpus, code)
+    cols = {}
+    for term in terms:
+        key = term.lower()
+        series = pd.Series(dtype=float)
+        if idx is not None:
+            pos = np.searchsorted(idx['vocab'], key)
+            if pos < len(idx['vocab']) and idx['vocab'][pos] == key:
+                lo, hi = idx['indptr'][pos], idx['indptr'][pos + 1]
+                values = idx['weighted'][lo:hi] if weighted else idx['counts'][lo:hi]
+                series = pd.Series(values.astype(float), index=pd.DatetimeIndex(idx['days'][idx['day_idx'][lo:hi]]))
+            else:
+                print(f"   ⚠️ [{corpus}/{code}] 索引中没有 '{term}' (可加入 PHRASES 后重建)")
+        cols[term] = series
+
+    out = pd.DataFrame(cols).fillna(0).sort_index()
+    out.index.name = 'date'
+    return out
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == 'build':
+        build_all()
+    elif len(sys.argv) > 3 and sys.argv[1] == 'query':
+        start = time.time()
+        res = query(sys.argv[2], sys.argv[3:])
+        print(res.tail(20))
+        print(f"⏱️ 查询耗时 {(time.time() - start) * 1000:.1f} ms")
+    else:
+        print("用法: python token_index.py build | python token_index.py query <code> <词1> [词2 ...]")
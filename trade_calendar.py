@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+
+# ===========================
+# 交易日对齐 (周末/节假日顺延到下一个交易日)
+# ===========================
+# 交易日历直接取行情数据的索引，所以 A股/港股各自的假期天然不同，不需要单独维护
+
+
+def align_to_trade_days(dates, trade_days, cutoff=None):
+    """
+    把任意日期/时间映射到 >= 它的第一个交易日，超出交易日历末尾的记为 NaT
+    - 排序后二分查找，复杂度 O(n log m)
+    - dates 可以是分钟/小时级时间戳：默认按自然日对齐
+    - cutoff 形如 '15:00'：收盘后的帖子算到下一个交易日
+    """
+    days = np.unique(pd.DatetimeIndex(trade_days).dropna().normalize().values)
+    stamps = pd.DatetimeIndex(pd.to_datetime(dates, errors='coerce'))
+
+    target = stamps.normalize()
+    if cutoff is not None:
+        after_close = (stamps - target) > pd.Timedelta(f"{cutoff}:00")
+        target = target + pd.to_timedelta(np.where(after_close, 1, 0), unit='D')
+
+    values = target.values
+    idx = np.searchsorted(days, values, side='left')
+    valid = (idx < len(days)) & ~pd.isna(values)
+
+    out = np.full(len(values), np.datetime64('NaT'), dtype=days.dtype)
+    out[valid] = days[idx[valid]]
+    return pd.DatetimeIndex(out)
+
+
+def aggregate_to_trade_days(df, trade_days, cols, cutoff=None):
+    """按交易日对齐后求和，index 为交易日 (丢掉日历之外的日期)"""
+    aligned = align_to_trade_days(df.index, trade_days, cutoff=cutoff)
+    keep = ~aligned.isna()
+    out = df.loc[keep, cols].groupby(aligned[keep]).sum()
+    out.index.name = 'trade_date'
+    return out
@@ -0,0 +1,80 @@
+import os
+import hashlib
+import datetime
+import pandas as pd
+
+# ===========================
+# 1. 配置：股票池 (所有阶段共用的唯一一份股票清单)
+# ===========================
+# 每行一只股票 / 一个事件；扩到几百只时只改这个文件 (也可以用环境变量 UNIVERSE 指向别的清单)
+UNIVERSE_PATH = os.environ.get('UNIVERSE', os.path.join(os.path.dirname(os.path.abspath(__file__)), "universe.csv"))
+
+# 多值字段 (B站关键词、关键词热度因子、词云停用词) 在单元格里用 | 分隔
+LIST_FIELDS = ['keywords', 'terms', 'stop']
+# 股吧页码 / 年份可以留空：crawl 按 window_start ~ window_end 自动定位 (page_locator)；填了就按手工的抓
+INT_FIELDS = ['start_page', 'end_page']
+# market_end 填 today 表示取到今天
+TODAY = 'today'
+
+_CACHE = {}
+
+
+# ===========================
+# 2. 读取
+# ===========================
+def _parse(row):
+    conf = {}
+    for key, value in row.items():
+        value = '' if pd.isna(value) else str(value).strip()
+        if key in LIST_FIELDS:
+            conf[key] = [v.strip() for v in value.split('|') if v.strip()]
+        elif key in INT_FIELDS:
+            conf[key] = int(float(value)) if value else None
+        else:
+            conf[key] = value or None
+    # 行情区间默认跟事件窗口一致
+    conf['market_start'] = conf.get('market_start') or conf.get('window_start')
+    conf['market_end'] = conf.get('market_end') or conf.get('window_end')
+    if conf['market_end'] == TODAY: conf['market_end'] = datetime.date.today().strftime('%Y-%m-%d')
+    conf['url_code'] = conf.get('url_code') or conf['code']
+    return conf
+
+
+def load(path=UNIVERSE_PATH):
+    """{code: 配置}，按文件里的顺序；文件没变时直接用上次读的结果"""
+    mtime = os.path.getmtime(path)
+    if _CACHE.get(path, (None,))[0] != mtime:
+        # 代码一律按字符串读，'01810' 不能变成 1810
+        df = pd.read_csv(path, dtype=str, keep_default_na=False, comment='#')
+        stocks, raw = {}, {}
+        for row in df.to_dict('records'):
+            conf = _parse(row)
+            if not conf['code']: continue
+            if conf['code'] in stocks: raise ValueError(f"股票池里 {conf['code']} 重复出现: {path}")
+            stocks[conf['code']] = conf
+            raw[conf['code']] = row
+        _CACHE[path] = (mtime, stocks, raw)
+    return _CACHE[path][1]
+
+
+def select(codes=None, need=(), path=UNIVERSE_PATH):
+    """
+    按代码筛选，并只保留 need 里各字段都填了的股票 (比如 B站阶段要 keywords，抓股吧要页码)
+    返回新的 {code: 配置}
+    """
+    return {code: conf for code, conf in load(path).items()
+            if (codes is None or code in codes) and all(conf.get(k) for k in need)}
+
+
+def codes(path=UNIVERSE_PATH):
+    return list(load(path))
+
+
+def row_hash(code, path=UNIVERSE_PATH):
+    """
+    某只股票这一行原始配置的哈希 (流水线据此判断：只改了一只股票的配置，只重跑这一只)
+    用文件里的原文而不是解析结果，market_end=today 不会让指纹每天都变
+    """
+    load(path)
+    row = _CACHE[path][2].get(code, {})
+    return hashlib.sha1(repr(sorted(row.items())).encode('utf-8')).hexdigest()